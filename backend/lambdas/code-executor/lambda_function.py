@@ -57,9 +57,17 @@ def lambda_handler(event, context):
         code_to_execute = payload.get('code_to_execute')
         input_data = payload.get('input_data') # This is already a Python dict/list/primitive
         timeout_ms = int(payload.get('timeout_ms', DEFAULT_TIMEOUT_MS))
+        # Optional: run the function once per element of input_data_batch inside a single process
+        input_data_batch = payload.get('input_data_batch')
+        # Optional: explicit function name instead of the solution/solve/answer/main lookup
+        entry_point = payload.get('entry_point')
 
         if not code_to_execute:
             raise ValueError("Missing 'code_to_execute' in payload")
+        if input_data_batch is not None and not isinstance(input_data_batch, list):
+            raise ValueError("'input_data_batch' must be a list")
+        if entry_point is not None and not (isinstance(entry_point, str) and entry_point.isidentifier()):
+            raise ValueError("'entry_point' must be a valid function name")
         # input_data can legitimately be None, 0, [], {}, etc.
 
     except (json.JSONDecodeError, ValueError, TypeError, KeyError) as e:
@@ -99,6 +107,8 @@ def lambda_handler(event, context):
         'returnValue': None, # Field for the actual return value
         'exitCode': None,
         'executionTimeMs': 0,
+        'peakMemoryKb': None, # Reported by the runner on success
+        'batchResults': None, # Per-input results when input_data_batch is used
         'timedOut': False,
         'error': None, # For errors *within* this lambda's orchestration
         'isSuccessful': False # Indicates successful *execution*, not logical correctness
@@ -118,9 +128,13 @@ import json
 import traceback
 import math # For isnan, isinf
 import base64 # For encoding return value
+import resource # For peak memory (ru_maxrss)
+import time # For per-input timing in batch mode
 
 # Special marker (must match definition in lambda_function.py)
 RETURN_VALUE_MARKER = "{RETURN_VALUE_MARKER}"
+ENTRY_POINT = {entry_point!r}
+BATCH_MODE = {input_data_batch is not None}
 
 # Add the directory of the solution file to Python's path
 sys.path.insert(0, r"{os.path.dirname(solution_file_path)}")
@@ -173,7 +187,7 @@ try:
 
     # Find the solution function
     solution_fn = None
-    func_names_to_try = ['solution', 'solve', 'answer', 'main']
+    func_names_to_try = [ENTRY_POINT] if ENTRY_POINT else ['solution', 'solve', 'answer', 'main']
     for func_name in func_names_to_try:
         if hasattr(solution_module, func_name) and callable(getattr(solution_module, func_name)):
             solution_fn = getattr(solution_module, func_name)
@@ -187,7 +201,27 @@ try:
         sys.exit(1) # Exit with error code
 
     # --- Execute the solution function ---
-    raw_result = solution_fn(actual_input_data)
+    if BATCH_MODE:
+        # One call per input; a failing input is recorded and the batch continues
+        batch_results = []
+        for batch_input in actual_input_data:
+            case_start = time.perf_counter()
+            try:
+                case_value = convert_non_json_values(solution_fn(batch_input))
+                json.dumps(case_value) # Surface serialization errors per input
+                case_error = None
+            except Exception as case_err:
+                case_value = None
+                case_error = f"{{type(case_err).__name__}}: {{str(case_err)}}"
+            batch_results.append({{
+                'result': case_value,
+                'error': case_error,
+                'timeMs': int((time.perf_counter() - case_start) * 1000)
+            }})
+        return_value_payload['batch'] = batch_results
+        raw_result = None
+    else:
+        raw_result = solution_fn(actual_input_data)
 
     # --- Prepare the return value ---
     # 1. Convert special floats (NaN, Infinity) and potentially other types
@@ -195,6 +229,8 @@ try:
 
     # 2. Prepare the payload for the marker line
     return_value_payload['result'] = processed_result
+    # Peak resident set size of this runner process (KB on Linux)
+    return_value_payload['peakMemoryKb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
 
     # 3. Serialize the payload to JSON. Catch serialization errors here.
     try:
@@ -236,7 +272,7 @@ sys.exit(0) # Explicitly exit with success code
         # 3. Execute the runner script using subprocess
         start_time = time.perf_counter()
         timeout_seconds = timeout_ms / 1000.0
-        input_for_runner = json.dumps(input_data)
+        input_for_runner = json.dumps(input_data_batch if input_data_batch is not None else input_data)
 
         process = subprocess.run(
             [sys.executable, runner_file_path], # sys.executable ensures same python version
@@ -269,6 +305,8 @@ sys.exit(0) # Explicitly exit with success code
                 # Parse JSON
                 parsed_payload = json.loads(decoded_json)
                 return_value = parsed_payload.get('result')
+                exec_result['peakMemoryKb'] = parsed_payload.get('peakMemoryKb')
+                exec_result['batchResults'] = parsed_payload.get('batch')
                 # Remove the marker line and everything after it from stdout_content
                 stdout_content = raw_stdout[:marker_pos].strip()
                 print(f"Extracted return value. Original stdout length: {len(raw_stdout)}, Final stdout length: {len(stdout_content)}")
@@ -1,10 +1,13 @@
 import json
 import boto3
+import hashlib
 import time
 import uuid
 import os
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal, ROUND_HALF_UP # Keep Decimal for comparisons
+from submission_stats import record_submission, record_accepted_performance
 
 # Initialize AWS clients outside the handler
 dynamodb = boto3.resource('dynamodb')
@@ -14,6 +17,12 @@ PROBLEMS_TABLE_NAME = os.environ.get('PROBLEMS_TABLE_NAME', 'alpaco-Problems-pro
 SUBMISSIONS_TABLE_NAME = os.environ.get('SUBMISSIONS_TABLE_NAME', 'problem-submissions')
 # Ensure this environment variable is set correctly for your deployment
 RUN_CODE_LAMBDA_NAME = os.environ.get('RUN_CODE_LAMBDA_NAME', 'alpaco-code-executor-production')
+# "inline": update stats items right after saving, "stream": leave it to submission_stats.stream_handler, "off": disabled
+STATS_UPDATE_MODE = os.environ.get('STATS_UPDATE_MODE', 'inline').lower()
+# Use of the problem's testCaseMinimization (see minimize_tests.py): "reorder" runs essential cases first,
+# "early_exit" also stops at the first failure once every essential case has run (the remaining cases
+# are skipped), "off" ignores it. The verdict is derived in caseNumber order from the cases that ran.
+TEST_CASE_MINIMIZATION_MODE = os.environ.get('TEST_CASE_MINIMIZATION_MODE', 'off').lower()
 
 ALLOWED_JUDGE_TYPES = ["equal", "unordered_equal", "float_eps"]
 DEFAULT_EPSILON = Decimal('1e-6')
@@ -111,9 +120,28 @@ def run_single_test_case(user_code, case_input, language, problem_time_limit_sec
         'input_data': case_input,
         'timeout_ms': int(float(problem_time_limit_seconds) * 1000)
     }
-    run_code_payload = {'body': json.dumps(run_code_payload_body)}
-
     print(f"Invoking runCode (func: {RUN_CODE_LAMBDA_NAME}) with input: {json.dumps(case_input)[:200]}...")
+    return invoke_run_code(run_code_payload_body)
+
+# --- Run a Batch of Inputs in One Executor Call ---
+def run_code_batch(code, inputs, timeout_ms, entry_point=None):
+    """
+    Runs `code` once per element of `inputs` inside a single runCode invocation.
+    The result carries 'batchResults': [{'result', 'error', 'timeMs'}, ...] on success.
+    """
+    run_code_payload_body = {
+        'code_to_execute': code,
+        'input_data_batch': inputs,
+        'timeout_ms': int(timeout_ms)
+    }
+    if entry_point:
+        run_code_payload_body['entry_point'] = entry_point
+    print(f"Invoking runCode (func: {RUN_CODE_LAMBDA_NAME}) with a batch of {len(inputs)} inputs...")
+    return invoke_run_code(run_code_payload_body)
+
+def invoke_run_code(run_code_payload_body):
+    """Invokes the runCode Lambda with the given body and returns the parsed execution result."""
+    run_code_payload = {'body': json.dumps(run_code_payload_body)}
 
     try:
         response = lambda_client.invoke(
@@ -173,6 +201,380 @@ def run_single_test_case(user_code, case_input, language, problem_time_limit_sec
             'timedOut': False, 'isSuccessful': False
         }
 
+# --- Problem Grading Config (parsed once per problem) ---
+def load_grading_config(problem_data):
+    """
+    Parses the judge settings of a Problems item: test cases, judge type, epsilon and time limit.
+    Raises an Exception if the test cases are missing or malformed.
+    """
+    problem_id = problem_data.get('problemId')
+
+    # Get Test Cases (judge type, time limit and epsilon come from load_judge_settings)
+    final_test_cases_str = problem_data.get('finalTestCases')
+    if not final_test_cases_str: raise Exception("No test cases found for this problem.")
+
+    # Parse finalTestCases JSON string
+    parsed_test_cases = json.loads(final_test_cases_str)
+
+    # Handle double-nested JSON structure: finalTestCases may contain a JSON string
+    # with a "finalTestCases" property that contains the actual array
+    test_cases = []
+    if isinstance(parsed_test_cases, list):
+        # Direct array case
+        test_cases = parsed_test_cases
+    elif isinstance(parsed_test_cases, dict) and 'finalTestCases' in parsed_test_cases:
+        # Nested object case: extract the finalTestCases property
+        if isinstance(parsed_test_cases['finalTestCases'], list):
+            test_cases = parsed_test_cases['finalTestCases']
+        else:
+            raise Exception("Nested finalTestCases property is not a list.")
+    else:
+        raise Exception("finalTestCases format is not recognized (expected array or object with finalTestCases property).")
+
+    if not test_cases: raise Exception("Test cases array is empty.")
+
+    return {
+        'problemId': problem_id,
+        'problemTitle': problem_data.get('title', ''),
+        'problemTitleTranslated': problem_data.get('title_translated', ''),
+        'testCases': test_cases,
+        **load_case_order(problem_data, len(test_cases)),
+        **load_judge_settings(problem_data),
+    }
+
+def load_judge_settings(problem_data):
+    """Judge type, epsilon and time limit of a Problems item, falling back to defaults on bad values."""
+    problem_id = problem_data.get('problemId')
+
+    judge_type = problem_data.get('judgeType', problem_data.get('judge_type', 'equal')) # Check both names, default 'equal'
+    if judge_type not in ALLOWED_JUDGE_TYPES:
+        print(f"Warning: Invalid judge_type '{judge_type}' for problem '{problem_id}'. Defaulting to 'equal'.")
+        judge_type = 'equal'
+
+    epsilon_val = problem_data.get('epsilon')
+    epsilon = DEFAULT_EPSILON
+    if epsilon_val is not None:
+        try: epsilon = Decimal(str(epsilon_val))
+        except Exception: print(f"Warning: Invalid epsilon value '{epsilon_val}'. Using default.")
+
+    time_limit_val = problem_data.get('timeLimitSeconds') or problem_data.get('time_limit_seconds') # Check both
+    problem_time_limit_seconds = 2.0
+    if time_limit_val is not None:
+        try: problem_time_limit_seconds = float(time_limit_val)
+        except ValueError: print(f"Warning: Invalid time limit '{time_limit_val}'. Using default 2.0s.")
+
+    return {
+        'judgeType': judge_type,
+        'epsilon': epsilon,
+        'timeLimitSeconds': problem_time_limit_seconds,
+    }
+
+def load_case_order(problem_data, case_count):
+    """
+    Execution order of the test cases (1-based case numbers) from the problem's testCaseMinimization.
+    Returns essential cases first, then redundant ones, and in early_exit mode the number of cases
+    that always run (earlyExitAfter); the minimization is ignored if it was computed for different test data.
+    """
+    default_order = {'caseOrder': list(range(1, case_count + 1))}
+    minimization = problem_data.get('testCaseMinimization')
+    if TEST_CASE_MINIMIZATION_MODE == 'off' or not minimization:
+        return default_order
+
+    final_test_cases_str = problem_data.get('finalTestCases') or ''
+    if minimization.get('testCasesHash') != hashlib.sha256(final_test_cases_str.encode('utf-8')).hexdigest():
+        print(f"Warning: testCaseMinimization of problem '{problem_data.get('problemId')}' is stale (test cases changed). Ignoring it.")
+        return default_order
+
+    essential = [int(n) for n in minimization.get('essentialCases', []) if 1 <= int(n) <= case_count]
+    redundant = [n for n in range(1, case_count + 1) if n not in essential]
+    case_order = {'caseOrder': essential + redundant}
+    if TEST_CASE_MINIMIZATION_MODE == 'early_exit':
+        case_order['earlyExitAfter'] = len(essential)
+    return case_order
+
+def fetch_grading_config(problem_id):
+    problems_table = dynamodb.Table(PROBLEMS_TABLE_NAME)
+    problem_item_response = problems_table.get_item(Key={'problemId': problem_id})
+    if 'Item' not in problem_item_response: raise Exception(f"Problem '{problem_id}' not found.")
+    return load_grading_config(problem_item_response['Item'])
+
+# --- Grade User Code Against Official Test Cases ---
+def grade_user_code(user_code, language, grading_config):
+    """
+    Runs the user code on every official test case and derives the overall verdict.
+    The cases may run in any order (caseOrder); the verdict and error message are derived in caseNumber
+    order: the status of the last failing case, the message of the first one.
+    With earlyExitAfter, the run stops at the first failure once that many cases have run; the verdict
+    then only reflects the cases that ran, and the rest are counted in casesSkipped (not in results).
+    Returns a dict with status, per-case results, max execution time / memory and the first error message.
+    """
+    judge_type = grading_config['judgeType']
+    epsilon = grading_config['epsilon']
+    problem_time_limit_seconds = grading_config['timeLimitSeconds']
+
+    max_execution_time_ms = 0
+    max_memory_kb = None
+    final_results_list = []
+    case_outcomes = {} # caseNumber -> (status, executor error message or None, stderr)
+
+    test_cases = grading_config['testCases']
+    case_order = grading_config.get('caseOrder') or list(range(1, len(test_cases) + 1))
+    early_exit_after = grading_config.get('earlyExitAfter')
+    failed = False
+
+    for run_index, case_number in enumerate(case_order):
+        if failed and early_exit_after is not None and run_index >= early_exit_after:
+            break
+        test_case_obj = test_cases[case_number - 1]
+        case_input = test_case_obj.get('input')
+        expected_output = test_case_obj.get('expected_output') # Case sensitivity matters!
+
+        case_status = "INTERNAL_ERROR" # Default for the loop iteration
+        case_exec_time_ms = 0
+        case_memory_kb = None
+        case_stderr = None
+        case_stdout = None # Capture stdout for potential debugging/display
+        actual_output = None # Initialize
+        executor_error = None
+
+        try:
+            run_code_result = run_single_test_case(user_code, case_input, language, problem_time_limit_seconds)
+
+            # Check for executor invocation errors first
+            if run_code_result.get('runCodeLambdaError'):
+                case_status = "INTERNAL_ERROR"
+                case_stderr = run_code_result.get('errorMessage', 'runCode Lambda execution error')
+                executor_error = case_stderr
+
+            # Process normal execution result
+            case_exec_time_ms = run_code_result.get('executionTimeMs', 0)
+            case_stderr = run_code_result.get('stderr') # Get stderr
+            case_stdout = run_code_result.get('stdout') # Get stdout
+            actual_output = run_code_result.get('returnValue') # <<< GET RETURN VALUE
+            max_execution_time_ms = max(max_execution_time_ms, case_exec_time_ms)
+            case_memory_kb = run_code_result.get('peakMemoryKb')
+            if case_memory_kb is not None:
+                max_memory_kb = max(max_memory_kb or 0, case_memory_kb)
+
+            if run_code_result.get('timedOut'):
+                case_status = "TIME_LIMIT_EXCEEDED"
+            elif not run_code_result.get('isSuccessful'): # Check if execution itself failed
+                case_status = "RUNTIME_ERROR"
+                # Use stderr if available, otherwise a generic message
+                if not case_stderr: case_stderr = "Execution failed with exit code {}.".format(run_code_result.get('exitCode', '?'))
+            else:
+                # Execution was successful, now compare returnValue
+                if compare_outputs(actual_output, expected_output, judge_type, epsilon):
+                    case_status = "ACCEPTED"
+                else:
+                    case_status = "WRONG_ANSWER"
+                    print(f"Case {case_number} WA: Actual={json.dumps(actual_output)}, Expected={json.dumps(expected_output)}, Judge={judge_type}")
+
+        except Exception as exec_err:
+            print(f"Error processing official test case {case_number}: {str(exec_err)}\n{traceback.format_exc()}")
+            case_status = "INTERNAL_ERROR"
+            case_stderr = f"Grader internal error: {str(exec_err)[:200]}"
+
+        # Sanitize stderr for storage
+        if case_stderr and len(case_stderr) > 500:
+            case_stderr = case_stderr[:497] + "..."
+
+        # Append results for this case
+        final_results_list.append({
+            'caseNumber': case_number,
+            'status': case_status,
+            # Store time in seconds as Decimal
+            'executionTime': Decimal(str(case_exec_time_ms / 1000.0)).quantize(Decimal('0.001'), rounding=ROUND_HALF_UP),
+            'memoryUsageKb': case_memory_kb,
+            'stdout': case_stdout[:500] if case_stdout else None, # Store partial stdout
+            'stderr': case_stderr if case_stderr else None
+        })
+
+        case_outcomes[case_number] = (case_status, executor_error, case_stderr)
+        failed = failed or case_status != "ACCEPTED"
+
+    overall_status = "ACCEPTED" # Start assuming success
+    error_message_for_submission = None
+    for case_number in sorted(case_outcomes):
+        case_status, executor_error, case_stderr = case_outcomes[case_number]
+        if executor_error is not None:
+            overall_status = "INTERNAL_ERROR"
+            if error_message_for_submission is None:
+                error_message_for_submission = f"Error executing test case {case_number}: {executor_error}"
+        # Update overall status if this case failed
+        if case_status != "ACCEPTED":
+            overall_status = case_status
+            # Set the first error message encountered
+            if error_message_for_submission is None:
+                 error_message_for_submission = f"Failed at test case {case_number}: {case_status}"
+                 if case_stderr:
+                     error_message_for_submission += f". Details: {case_stderr[:100]}"
+
+    final_results_list.sort(key=lambda res: res['caseNumber'])
+    return {
+        'status': overall_status,
+        'results': final_results_list,
+        'maxExecutionTimeMs': max_execution_time_ms,
+        'maxMemoryKb': max_memory_kb,
+        'errorMessage': error_message_for_submission,
+        'casesSkipped': len(case_order) - len(case_outcomes),
+    }
+
+def clean_results_for_dynamo(final_results_list):
+    """Converts per-case results to DynamoDB-compatible values and drops None fields."""
+    cleaned_results = []
+    for res in final_results_list:
+        cleaned_res = {k: convert_to_dynamo_compatible(v) for k, v in res.items() if v is not None}
+        cleaned_results.append(cleaned_res)
+    return cleaned_results
+
+# --- Stress Test (differential testing against the reference solution) ---
+STRESS_DEFAULT_COUNT = 100
+STRESS_MAX_COUNT = 1000
+STRESS_BATCH_SIZE = 25
+STRESS_GENERATOR_TIMEOUT_MS = 10000
+STRESS_BATCH_TIMEOUT_MS = 20000 # Must stay below the code-executor Lambda timeout (30s)
+STRESS_GENERATOR_ENTRY_POINT = '__stress_generate_inputs__'
+
+# Appended to the problem's testGeneratorCode. Reseeds `random` per round and collects
+# distinct inputs from generate_test_cases() (dict cases or (input, output) pairs).
+STRESS_GENERATOR_WRAPPER = '''
+
+def __stress_generate_inputs__(params):
+    import json as _json
+    import random as _random
+    generator_fn = None
+    for _name in ('generate_test_cases', 'generate_tests', 'generate_inputs', 'generate'):
+        if callable(globals().get(_name)):
+            generator_fn = globals()[_name]
+            break
+    if generator_fn is None:
+        raise NameError("No test generator function (e.g. generate_test_cases) found in testGeneratorCode.")
+    inputs, seen = [], set()
+    for round_index in range(params['count']):
+        _random.seed(params['seed'] + round_index)
+        added = 0
+        for case in generator_fn() or []:
+            if isinstance(case, dict) and 'input' in case:
+                case_input = case['input']
+            elif isinstance(case, (list, tuple)) and len(case) == 2:
+                case_input = case[0]
+            else:
+                case_input = case
+            key = _json.dumps(case_input, sort_keys=True, default=str)
+            if key not in seen:
+                seen.add(key)
+                inputs.append(case_input)
+                added += 1
+        if len(inputs) >= params['count'] or added == 0:
+            break  # Enough inputs, or the generator ignores the seed
+    return inputs[:params['count']]
+'''
+
+def generate_stress_inputs(test_generator_code, count, seed):
+    """Runs the problem's test generator in the executor sandbox and returns up to `count` distinct inputs."""
+    result = invoke_run_code({
+        'code_to_execute': test_generator_code + STRESS_GENERATOR_WRAPPER,
+        'input_data': {'count': count, 'seed': seed},
+        'timeout_ms': STRESS_GENERATOR_TIMEOUT_MS,
+        'entry_point': STRESS_GENERATOR_ENTRY_POINT
+    })
+    inputs = result.get('returnValue')
+    if not result.get('isSuccessful') or not isinstance(inputs, list):
+        details = result.get('stderr') or result.get('errorMessage') or 'no inputs returned'
+        raise Exception(f"Test generator failed: {details[:300]}")
+    return inputs
+
+def classify_stress_case(user_case, reference_case, judge_settings):
+    """Returns the verdict of a user run against the reference output, or None if they agree."""
+    if user_case.get('timedOut') or user_case.get('timeMs', 0) > judge_settings['timeLimitSeconds'] * 1000:
+        return "TIME_LIMIT_EXCEEDED"
+    if user_case.get('error'):
+        return "RUNTIME_ERROR"
+    if not compare_outputs(user_case.get('result'), reference_case.get('result'), judge_settings['judgeType'], judge_settings['epsilon']):
+        return "WRONG_ANSWER"
+    return None
+
+def run_stress_test(user_code, language, problem_data, count=STRESS_DEFAULT_COUNT, seed=0, batch_size=STRESS_BATCH_SIZE):
+    """
+    Generates `count` random inputs from the problem's generator and runs the user code and the
+    reference solution side by side, one batched executor call each per chunk of inputs.
+    Stops at the first chunk with a divergence and returns its smallest diverging input.
+    """
+    reference_code = problem_data.get('solutionCode')
+    generator_code = problem_data.get('testGeneratorCode')
+    if not reference_code or not generator_code:
+        raise ValueError("Problem has no solutionCode or testGeneratorCode; stress testing is unavailable.")
+
+    judge_settings = load_judge_settings(problem_data)
+    start_time = time.perf_counter()
+    inputs = generate_stress_inputs(generator_code, count, seed)
+    batch_timeout_ms = min(STRESS_BATCH_TIMEOUT_MS, max(judge_settings['timeLimitSeconds'] * 1000 * batch_size, 1000))
+    tests_run = 0
+    reference_errors = 0
+
+    def summary(status, counterexample=None):
+        return {
+            'status': status,
+            'seed': seed,
+            'inputsGenerated': len(inputs),
+            'testsRun': tests_run,
+            'referenceErrors': reference_errors,
+            'counterexample': counterexample,
+            'elapsedMs': int((time.perf_counter() - start_time) * 1000)
+        }
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        for batch_start in range(0, len(inputs), batch_size):
+            batch = inputs[batch_start:batch_start + batch_size]
+            user_future = pool.submit(run_code_batch, user_code, batch, batch_timeout_ms)
+            reference_future = pool.submit(run_code_batch, reference_code, batch, batch_timeout_ms)
+            user_run, reference_run = user_future.result(), reference_future.result()
+
+            reference_results = reference_run.get('batchResults')
+            if not reference_results:
+                details = reference_run.get('stderr') or reference_run.get('errorMessage') or 'no results'
+                raise Exception(f"Reference solution failed on a stress batch: {details[:300]}")
+
+            # If the whole user batch failed (timeout, import error, crash) fall back to one input at a time
+            user_results = user_run.get('batchResults')
+            divergences = []
+            for i, case_input in enumerate(batch):
+                reference_case = reference_results[i]
+                if reference_case.get('error'):
+                    reference_errors += 1 # Generator produced an input the reference rejects; not a user failure
+                    continue
+                if user_results is not None:
+                    user_case = user_results[i]
+                else:
+                    single = run_single_test_case(user_code, case_input, language, judge_settings['timeLimitSeconds'])
+                    user_case = {
+                        'result': single.get('returnValue'),
+                        'error': None if single.get('isSuccessful') else (single.get('stderr') or 'Execution failed'),
+                        'timeMs': single.get('executionTimeMs', 0),
+                        'timedOut': single.get('timedOut', False)
+                    }
+                tests_run += 1
+                verdict = classify_stress_case(user_case, reference_case, judge_settings)
+                if verdict:
+                    divergences.append({
+                        'input': case_input,
+                        'expectedOutput': reference_case.get('result'),
+                        'actualOutput': user_case.get('result'),
+                        'verdict': verdict,
+                        'error': (user_case.get('error') or '')[:500] or None
+                    })
+                    if user_results is None:
+                        break # Single-input fallback is expensive; stop at the first failure
+
+            if divergences:
+                # Smallest serialized input is the easiest counterexample to read and debug
+                counterexample = min(divergences, key=lambda d: len(json.dumps(d['input'], default=str)))
+                print(f"Stress test divergence after {tests_run} tests: {counterexample['verdict']}")
+                return summary("DIVERGENCE_FOUND", counterexample)
+
+    return summary("NO_DIVERGENCE")
+
 # --- Lambda Handler ---
 def lambda_handler(event, context):
     print(f"Received grading request: {json.dumps(event)}")
@@ -212,6 +614,7 @@ def lambda_handler(event, context):
         if not user_code: raise ValueError("Missing userCode")
         if execution_mode == "GRADE_SUBMISSION" and not problem_id: raise ValueError("Missing problemId for GRADE_SUBMISSION")
         if execution_mode == "RUN_CUSTOM_TESTS" and 'customTestCases' not in payload: raise ValueError("Missing customTestCases for RUN_CUSTOM_TESTS")
+        if execution_mode == "STRESS_TEST" and not problem_id: raise ValueError("Missing problemId for STRESS_TEST")
 
     except (json.JSONDecodeError, ValueError, TypeError) as e:
         print(f"Input error: {str(e)}")
@@ -280,135 +683,27 @@ def lambda_handler(event, context):
         submission_time = int(time.time())
         overall_status = "INTERNAL_ERROR" # Default
         max_execution_time_ms = 0
+        max_memory_kb = None
         final_results_list = []
         error_message_for_submission = None
+        cases_skipped = 0
         problem_title = None
         problem_title_translated = None
 
         try:
-            # Fetch Problem Data
-            problems_table = dynamodb.Table(PROBLEMS_TABLE_NAME)
-            problem_item_response = problems_table.get_item(Key={'problemId': problem_id})
-            if 'Item' not in problem_item_response: raise Exception(f"Problem '{problem_id}' not found.")
-            problem_data = problem_item_response['Item']
-
-            # Extract problem title and title_translated
-            problem_title = problem_data.get('title', '')
-            problem_title_translated = problem_data.get('title_translated', '')
-
-            # Get Test Cases, Judge Type, Time Limit, Epsilon
-            final_test_cases_str = problem_data.get('finalTestCases')
-            if not final_test_cases_str: raise Exception("No test cases found for this problem.")
-            
-            # Parse finalTestCases JSON string
-            parsed_test_cases = json.loads(final_test_cases_str)
-            
-            # Handle double-nested JSON structure: finalTestCases may contain a JSON string
-            # with a "finalTestCases" property that contains the actual array
-            test_cases = []
-            if isinstance(parsed_test_cases, list):
-                # Direct array case
-                test_cases = parsed_test_cases
-            elif isinstance(parsed_test_cases, dict) and 'finalTestCases' in parsed_test_cases:
-                # Nested object case: extract the finalTestCases property
-                if isinstance(parsed_test_cases['finalTestCases'], list):
-                    test_cases = parsed_test_cases['finalTestCases']
-                else:
-                    raise Exception("Nested finalTestCases property is not a list.")
-            else:
-                raise Exception("finalTestCases format is not recognized (expected array or object with finalTestCases property).")
-            
-            if not test_cases: raise Exception("Test cases array is empty.")
-
-            judge_type = problem_data.get('judgeType', problem_data.get('judge_type', 'equal')) # Check both names, default 'equal'
-            if judge_type not in ALLOWED_JUDGE_TYPES:
-                print(f"Warning: Invalid judge_type '{judge_type}' for problem '{problem_id}'. Defaulting to 'equal'.")
-                judge_type = 'equal'
-
-            epsilon_val = problem_data.get('epsilon')
-            epsilon = DEFAULT_EPSILON
-            if epsilon_val is not None:
-                try: epsilon = Decimal(str(epsilon_val))
-                except Exception: print(f"Warning: Invalid epsilon value '{epsilon_val}'. Using default.")
-
-            time_limit_val = problem_data.get('timeLimitSeconds') or problem_data.get('time_limit_seconds') # Check both
-            problem_time_limit_seconds = 2.0
-            if time_limit_val is not None:
-                try: problem_time_limit_seconds = float(time_limit_val)
-                except ValueError: print(f"Warning: Invalid time limit '{time_limit_val}'. Using default 2.0s.")
+            # Fetch Problem Data (test cases, judge type, epsilon, time limit)
+            grading_config = fetch_grading_config(problem_id)
+            problem_title = grading_config['problemTitle']
+            problem_title_translated = grading_config['problemTitleTranslated']
 
             # --- Process Test Cases ---
-            overall_status = "ACCEPTED" # Start assuming success
-            for i, test_case_obj in enumerate(test_cases):
-                case_number = i + 1
-                case_input = test_case_obj.get('input')
-                expected_output = test_case_obj.get('expected_output') # Case sensitivity matters!
-
-                case_status = "INTERNAL_ERROR" # Default for the loop iteration
-                case_exec_time_ms = 0
-                case_stderr = None
-                case_stdout = None # Capture stdout for potential debugging/display
-                actual_output = None # Initialize
-
-                try:
-                    run_code_result = run_single_test_case(user_code, case_input, language, problem_time_limit_seconds)
-
-                    # Check for executor invocation errors first
-                    if run_code_result.get('runCodeLambdaError'):
-                        case_status = "INTERNAL_ERROR"
-                        case_stderr = run_code_result.get('errorMessage', 'runCode Lambda execution error')
-                        overall_status = "INTERNAL_ERROR"
-                        if error_message_for_submission is None:
-                            error_message_for_submission = f"Error executing test case {case_number}: {case_stderr}"
-
-                    # Process normal execution result
-                    case_exec_time_ms = run_code_result.get('executionTimeMs', 0)
-                    case_stderr = run_code_result.get('stderr') # Get stderr
-                    case_stdout = run_code_result.get('stdout') # Get stdout
-                    actual_output = run_code_result.get('returnValue') # <<< GET RETURN VALUE
-                    max_execution_time_ms = max(max_execution_time_ms, case_exec_time_ms)
-
-                    if run_code_result.get('timedOut'):
-                        case_status = "TIME_LIMIT_EXCEEDED"
-                    elif not run_code_result.get('isSuccessful'): # Check if execution itself failed
-                        case_status = "RUNTIME_ERROR"
-                        # Use stderr if available, otherwise a generic message
-                        if not case_stderr: case_stderr = "Execution failed with exit code {}.".format(run_code_result.get('exitCode', '?'))
-                    else:
-                        # Execution was successful, now compare returnValue
-                        if compare_outputs(actual_output, expected_output, judge_type, epsilon):
-                            case_status = "ACCEPTED"
-                        else:
-                            case_status = "WRONG_ANSWER"
-                            print(f"Case {case_number} WA: Actual={json.dumps(actual_output)}, Expected={json.dumps(expected_output)}, Judge={judge_type}")
-
-                except Exception as exec_err:
-                    print(f"Error processing official test case {case_number}: {str(exec_err)}\n{traceback.format_exc()}")
-                    case_status = "INTERNAL_ERROR"
-                    case_stderr = f"Grader internal error: {str(exec_err)[:200]}"
-
-                # Sanitize stderr for storage
-                if case_stderr and len(case_stderr) > 500:
-                    case_stderr = case_stderr[:497] + "..."
-
-                # Append results for this case
-                final_results_list.append({
-                    'caseNumber': case_number,
-                    'status': case_status,
-                    # Store time in seconds as Decimal
-                    'executionTime': Decimal(str(case_exec_time_ms / 1000.0)).quantize(Decimal('0.001'), rounding=ROUND_HALF_UP),
-                    'stdout': case_stdout[:500] if case_stdout else None, # Store partial stdout
-                    'stderr': case_stderr if case_stderr else None
-                })
-
-                # Update overall status if this case failed
-                if case_status != "ACCEPTED":
-                    overall_status = case_status
-                    # Set the first error message encountered
-                    if error_message_for_submission is None:
-                         error_message_for_submission = f"Failed at test case {case_number}: {case_status}"
-                         if case_stderr:
-                             error_message_for_submission += f". Details: {case_stderr[:100]}"
+            grading = grade_user_code(user_code, language, grading_config)
+            overall_status = grading['status']
+            final_results_list = grading['results']
+            max_execution_time_ms = grading['maxExecutionTimeMs']
+            max_memory_kb = grading['maxMemoryKb']
+            error_message_for_submission = grading['errorMessage']
+            cases_skipped = grading['casesSkipped']
 
         except Exception as e:
             print(f"Major grading error: {str(e)}\n{traceback.format_exc()}")
@@ -419,10 +714,7 @@ def lambda_handler(event, context):
         # --- Save Submission to DynamoDB ---
         # Convert results to be DynamoDB compatible (especially executionTime Decimal)
         # Also handle potential None values
-        cleaned_results = []
-        for res in final_results_list:
-            cleaned_res = {k: convert_to_dynamo_compatible(v) for k, v in res.items() if v is not None}
-            cleaned_results.append(cleaned_res)
+        cleaned_results = clean_results_for_dynamo(final_results_list)
 
         submission_item = {
             'submissionId': submission_id,
@@ -434,32 +726,65 @@ def lambda_handler(event, context):
             'language': language,
             'status': overall_status,
             'executionTime': convert_to_dynamo_compatible(max_execution_time_ms / 1000.0),
+            'memoryUsageKb': max_memory_kb,
             'results': cleaned_results,
             'submissionTime': submission_time,
             'userCode': user_code[:10000], # Truncate code
             'errorMessage': error_message_for_submission if error_message_for_submission else None,
+            'casesSkipped': cases_skipped if cases_skipped else None, # Not run after an early exit
             'is_submission': IS_SUBMISSION_VALUE
         }
         # Remove top-level None values before saving
         submission_item_cleaned = {k: v for k, v in submission_item.items() if v is not None}
 
+        first_save = True # Statistics count a submissionId once, however often it is saved
         try:
             submissions_table = dynamodb.Table(SUBMISSIONS_TABLE_NAME)
-            submissions_table.put_item(Item=submission_item_cleaned)
-            print(f"Submission {submission_id} saved to DynamoDB with status: {overall_status}")
+            try:
+                submissions_table.put_item(
+                    Item=submission_item_cleaned, ConditionExpression="attribute_not_exists(submissionId)"
+                )
+            except submissions_table.meta.client.exceptions.ConditionalCheckFailedException:
+                # Re-grade of a given submissionId, or a retried invocation: overwrite, already counted
+                first_save = False
+                submissions_table.put_item(Item=submission_item_cleaned)
+            print(f"Submission {submission_id} saved to DynamoDB with status: {overall_status}"
+                  f"{'' if first_save else ' (overwritten, statistics not updated)'}")
+            submission_saved = True
         except Exception as db_err:
+            submission_saved = False
             print(f"Error saving submission {submission_id} to DynamoDB: {str(db_err)}")
             if overall_status != "INTERNAL_ERROR" and error_message_for_submission is None:
                 error_message_for_submission = f"Failed to save submission result to DB: {str(db_err)}"
 
+        # --- Update Aggregated Statistics (non-fatal) ---
+        if submission_saved and first_save and STATS_UPDATE_MODE == 'inline':
+            try:
+                record_submission(submission_item_cleaned)
+            except Exception as stats_err:
+                print(f"Warning: Failed to update statistics for submission {submission_id}: {str(stats_err)}")
+
+        # --- Percentile Ranking among Accepted Submissions (non-fatal) ---
+        performance_rank = None
+        if submission_saved and first_save and overall_status == "ACCEPTED" and STATS_UPDATE_MODE != 'off':
+            try:
+                performance_rank = record_accepted_performance(problem_id, language, max_execution_time_ms, max_memory_kb)
+            except Exception as rank_err:
+                print(f"Warning: Failed to compute percentile for submission {submission_id}: {str(rank_err)}")
+
         # --- Prepare Final Response ---
         # Use the cleaned results and error message for the response
         final_response_body = {
             'submissionId': submission_id,
             'status': overall_status,
             'executionTime': float(submission_item_cleaned['executionTime']), # Convert Decimal back to float for JSON
+            'memoryUsageKb': max_memory_kb,
+            # "Faster / lighter than X% of accepted submissions" (None if not accepted or no data)
+            'runtimePercentile': performance_rank['runtimePercentile'] if performance_rank else None,
+            'memoryPercentile': performance_rank['memoryPercentile'] if performance_rank else None,
             'results': final_results_list, # Send original list with floats/ints for time
             'errorMessage': error_message_for_submission,
+            'casesSkipped': cases_skipped,
             'executionMode': "GRADE_SUBMISSION_RESULTS",
             # Include problem title information in the response
             'problemTitle': problem_title,
@@ -472,6 +797,26 @@ def lambda_handler(event, context):
             # Use default=str for Decimal serialization, though we converted executionTime back
             'body': json.dumps(final_response_body, default=str)
         }
+    # --- STRESS TEST MODE ---
+    elif execution_mode == "STRESS_TEST":
+        try:
+            stress_count = max(1, min(int(payload.get('stressTestCount', STRESS_DEFAULT_COUNT)), STRESS_MAX_COUNT))
+            seed = int(payload.get('seed', time.time()))
+            problem_item_response = dynamodb.Table(PROBLEMS_TABLE_NAME).get_item(Key={'problemId': problem_id})
+            if 'Item' not in problem_item_response:
+                return {'statusCode': 404, 'headers': {'Content-Type': 'application/json', **CORS_HEADERS}, 'body': json.dumps({'error': f"Problem '{problem_id}' not found."})}
+            stress_result = run_stress_test(user_code, language, problem_item_response['Item'], stress_count, seed)
+        except ValueError as e:
+            return {'statusCode': 400, 'headers': {'Content-Type': 'application/json', **CORS_HEADERS}, 'body': json.dumps({'error': str(e)})}
+        except Exception as e:
+            print(f"Stress test error: {str(e)}\n{traceback.format_exc()}")
+            return {'statusCode': 500, 'headers': {'Content-Type': 'application/json', **CORS_HEADERS}, 'body': json.dumps({'error': f'Stress test failed: {str(e)}'})}
+
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', **CORS_HEADERS},
+            'body': json.dumps({'executionMode': "STRESS_TEST_RESULTS", **stress_result}, default=str)
+        }
     else:
         # Should not be reached if validation is correct
         print(f"Unknown executionMode: {execution_mode}")
@@ -0,0 +1,153 @@
+"""
+Test-set minimization from historical verdicts.
+
+Usage:
+    python minimize_tests.py --problem-id <problemId> [--min-submissions 30] [--page-size 200] [--dry-run]
+
+For every test case of a problem the past submissions are reduced to a failure signature:
+the set of (submissionId, failing status) pairs the case produced. A greedy set cover then
+picks the smallest set of cases whose signatures together reproduce every failure ever seen,
+so each historical verdict would stay the same. The result is stored on the Problems item as
+`testCaseMinimization`; with TEST_CASE_MINIMIZATION_MODE=reorder the grader runs the essential
+cases first, with early_exit it also stops at the first failure once the essential cases have run.
+Redundant cases are never dropped from accepted submissions: a past verdict history cannot prove
+that a future submission fails them the same way.
+"""
+import argparse
+import hashlib
+import json
+import time
+import boto3
+from boto3.dynamodb.conditions import Key
+
+import lambda_function as grader
+
+PROBLEM_INDEX_NAME = 'ProblemIdSubmissionTimeIndex'
+DEFAULT_MIN_SUBMISSIONS = 30
+DEFAULT_PAGE_SIZE = 200
+
+dynamodb = boto3.resource('dynamodb')
+
+
+def test_cases_fingerprint(final_test_cases_str):
+    """Hash of the stored finalTestCases string; a minimization is only valid for the exact same test data."""
+    return hashlib.sha256((final_test_cases_str or '').encode('utf-8')).hexdigest()
+
+
+# --- Signatures ---
+def collect_failure_signatures(problem_id, case_count, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Pages through all submissions of the problem and returns (signatures, analyzed) where
+    signatures[caseNumber] is the set of (submissionId, status) pairs that failed the case.
+    Submissions graded against a different number of test cases (a missing or out-of-range caseNumber),
+    or stopped early (casesSkipped), are ignored.
+    """
+    table = dynamodb.Table(grader.SUBMISSIONS_TABLE_NAME)
+    signatures = {case_number: set() for case_number in range(1, case_count + 1)}
+    analyzed = 0
+    ignored = 0
+    query_kwargs = {
+        'IndexName': PROBLEM_INDEX_NAME,
+        'KeyConditionExpression': Key('problemId').eq(problem_id),
+        'ProjectionExpression': 'submissionId, #status, results, casesSkipped',
+        'ExpressionAttributeNames': {'#status': 'status'},
+        'Limit': page_size,
+    }
+    while True:
+        response = table.query(**query_kwargs)
+        for item in response.get('Items', []):
+            results = item.get('results') or []
+            case_numbers = [res.get('caseNumber') for res in results]
+            if (item.get('status') == "INTERNAL_ERROR" or not results or item.get('casesSkipped')
+                    or any(case_number not in signatures for case_number in case_numbers)):
+                # Graded against other test data (missing or out-of-range caseNumber), partial,
+                # or no reliable verdict
+                ignored += 1
+                continue
+            analyzed += 1
+            for case_number, res in zip(case_numbers, results):
+                if res.get('status') not in ("ACCEPTED", "INTERNAL_ERROR"):
+                    signatures[case_number].add((item['submissionId'], res['status']))
+        if not response.get('LastEvaluatedKey'):
+            break
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    print(f"Analyzed {analyzed} submissions of problem {problem_id} ({ignored} ignored).")
+    return signatures, analyzed
+
+
+# --- Greedy Set Cover ---
+def greedy_minimal_cover(signatures):
+    """
+    Classic greedy set cover (ln(n)-approximation): repeatedly take the case that reproduces the
+    most not-yet-covered failures, ties broken by the lower case number. Returns the chosen case
+    numbers in selection order, so the most discriminating cases come first.
+    """
+    uncovered = set().union(*signatures.values()) if signatures else set()
+    remaining = dict(signatures)
+    chosen = []
+    while uncovered:
+        best_case = max(remaining, key=lambda case_number: (len(remaining[case_number] & uncovered), -case_number))
+        gain = remaining.pop(best_case) & uncovered
+        if not gain:
+            break
+        chosen.append(best_case)
+        uncovered -= gain
+    return chosen
+
+
+def minimize_problem(problem_id, min_submissions=DEFAULT_MIN_SUBMISSIONS, page_size=DEFAULT_PAGE_SIZE, dry_run=False):
+    problems_table = dynamodb.Table(grader.PROBLEMS_TABLE_NAME)
+    problem_item = problems_table.get_item(Key={'problemId': problem_id}).get('Item')
+    if not problem_item:
+        raise ValueError(f"Problem '{problem_id}' not found.")
+
+    case_count = len(grader.load_grading_config(problem_item)['testCases'])
+    signatures, analyzed = collect_failure_signatures(problem_id, case_count, page_size)
+    if analyzed < min_submissions:
+        # Too little history: a case nobody has failed yet may still catch the next wrong solution
+        print(f"Only {analyzed} usable submissions (< {min_submissions}); not marking any case redundant.")
+        return None
+
+    essential = greedy_minimal_cover(signatures)
+    redundant = [case_number for case_number in range(1, case_count + 1) if case_number not in essential]
+    minimization = {
+        'essentialCases': essential,
+        'redundantCases': redundant,
+        'testCaseCount': case_count,
+        'testCasesHash': test_cases_fingerprint(problem_item.get('finalTestCases')),
+        'submissionsAnalyzed': analyzed,
+        'distinctFailures': len(set().union(*signatures.values())),
+        'computedAt': int(time.time()),
+    }
+    print(f"Problem {problem_id}: {len(essential)}/{case_count} cases reproduce all "
+          f"{minimization['distinctFailures']} historical failures. Essential (in order): {essential}")
+
+    if dry_run:
+        print("[DRY RUN] Problems item not updated.")
+    else:
+        problems_table.update_item(
+            Key={'problemId': problem_id},
+            UpdateExpression="SET testCaseMinimization = :m",
+            ExpressionAttributeValues={':m': minimization},
+        )
+        print(f"Saved testCaseMinimization for problem {problem_id}.")
+    return minimization
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mark redundant test cases of a problem from past verdicts")
+    parser.add_argument("--problem-id", required=True, help="Problem to analyze")
+    parser.add_argument("--min-submissions", type=int, default=DEFAULT_MIN_SUBMISSIONS,
+                        help="Minimum usable submissions before any case may be marked redundant")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE, help="Submissions per query page")
+    parser.add_argument("--dry-run", action="store_true", help="Compute and print, but do not update the problem")
+    args = parser.parse_args()
+
+    result = minimize_problem(args.problem_id, args.min_submissions, args.page_size, args.dry_run)
+    if result:
+        print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""
+Bulk rejudge of every submission of a problem (e.g. after finalTestCases or judge settings change).
+
+Usage:
+    python rejudge.py --problem-id <problemId> [--workers 8] [--page-size 100] [--checkpoint PATH] [--dry-run]
+
+Submissions are paged through ProblemIdSubmissionTimeIndex and regraded in parallel by a
+bounded worker pool. The problem's test data is parsed once per run. Verdicts are written
+back with conditional updates, and progress is checkpointed after every page so an
+interrupted run continues where it stopped when started again with the same checkpoint.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+import boto3
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+import lambda_function as grader
+from submission_stats import recompute_problem_stats, record_verdict_change
+
+PROBLEM_INDEX_NAME = 'ProblemIdSubmissionTimeIndex'
+DEFAULT_WORKERS = 8
+DEFAULT_PAGE_SIZE = 100
+BATCH_GET_MAX_KEYS = 100  # DynamoDB BatchGetItem limit
+
+# Outcomes counted in the checkpoint
+OUTCOMES = ['unchanged', 'changed', 'skipped', 'conflict', 'failed']
+
+_thread_local = threading.local()
+
+
+def _dynamodb():
+    # boto3 resources are not thread-safe, so every worker thread gets its own
+    if not hasattr(_thread_local, 'dynamodb'):
+        _thread_local.dynamodb = boto3.session.Session().resource('dynamodb')
+    return _thread_local.dynamodb
+
+
+def _submissions_table():
+    if not hasattr(_thread_local, 'table'):
+        _thread_local.table = _dynamodb().Table(grader.SUBMISSIONS_TABLE_NAME)
+    return _thread_local.table
+
+
+# --- Checkpoint ---
+def _json_default(obj):
+    if isinstance(obj, Decimal):
+        return int(obj) if obj == obj.to_integral_value() else float(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def load_checkpoint(path, problem_id):
+    if path and os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get('problemId') != problem_id:
+            raise ValueError(f"Checkpoint {path} belongs to problem '{state.get('problemId')}', not '{problem_id}'.")
+        print(f"Resuming rejudge run {state['runId']} from checkpoint {path} ({sum(state['counts'].values())} already processed).")
+        return state
+    return {
+        'problemId': problem_id,
+        'runId': str(uuid.uuid4()),
+        'startedAt': int(time.time()),
+        'lastEvaluatedKey': None,
+        'pages': 0,
+        'counts': {outcome: 0 for outcome in OUTCOMES},
+        'completed': False,
+    }
+
+
+def save_checkpoint(path, state):
+    if not path:
+        return
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, default=_json_default, indent=2)
+    os.replace(tmp_path, path)  # Atomic, so an interrupt never leaves a half-written checkpoint
+
+
+# --- Single Submission ---
+def rejudge_submission(item, grading_config, run_id, dry_run=False):
+    """Regrades one submission and writes the new verdict. Returns one of OUTCOMES."""
+    submission_id = item.get('submissionId')
+    old_status = item.get('status')
+
+    if item.get('lastRejudgeRunId') == run_id:
+        return 'skipped'  # Already handled by this run before an interruption
+    if not item.get('userCode'):
+        print(f"Rejudge: submission {submission_id} has no stored code, skipping.")
+        return 'skipped'
+
+    try:
+        grading = grader.grade_user_code(item['userCode'], item.get('language', 'python3.12'), grading_config)
+    except Exception as e:
+        print(f"Rejudge: grading failed for {submission_id}: {str(e)}")
+        return 'failed'
+
+    new_status = grading['status']
+    if new_status == "INTERNAL_ERROR" and old_status != "INTERNAL_ERROR":
+        # Never overwrite a real verdict because of executor / infrastructure trouble
+        print(f"Rejudge: internal error while regrading {submission_id}, keeping {old_status}. {grading['errorMessage']}")
+        return 'failed'
+    if dry_run:
+        return 'changed' if new_status != old_status else 'unchanged'
+
+    set_parts = [
+        "#status = :newStatus", "executionTime = :execTime", "results = :results",
+        "lastRejudgeRunId = :runId", "rejudgedAt = :now", "previousStatus = :oldStatus",
+    ]
+    remove_parts = []
+    values = {
+        ':newStatus': new_status,
+        ':oldStatus': old_status,
+        ':execTime': grader.convert_to_dynamo_compatible(grading['maxExecutionTimeMs'] / 1000.0),
+        ':results': grader.clean_results_for_dynamo(grading['results']),
+        ':runId': run_id,
+        ':now': int(time.time()),
+    }
+    optional_attributes = (
+        ('memoryUsageKb', grading['maxMemoryKb']),
+        ('errorMessage', grading['errorMessage']),
+        ('casesSkipped', grading['casesSkipped'] or None),
+    )
+    for attr, value in optional_attributes:
+        if value is None:
+            remove_parts.append(attr)
+        else:
+            set_parts.append(f"{attr} = :{attr}")
+            values[f":{attr}"] = value
+
+    update_expression = "SET " + ", ".join(set_parts)
+    if remove_parts:
+        update_expression += " REMOVE " + ", ".join(remove_parts)
+
+    try:
+        _submissions_table().update_item(
+            Key={'submissionId': submission_id},
+            UpdateExpression=update_expression,
+            # Only overwrite the verdict we graded against, and only once per run
+            ConditionExpression="#status = :oldStatus AND (attribute_not_exists(lastRejudgeRunId) OR lastRejudgeRunId <> :runId)",
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues=values,
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            print(f"Rejudge: submission {submission_id} changed concurrently, not overwritten.")
+            return 'conflict'
+        print(f"Rejudge: failed to save {submission_id}: {str(e)}")
+        return 'failed'
+
+    if new_status == old_status:
+        return 'unchanged'
+
+    print(f"Rejudge: {submission_id} {old_status} -> {new_status}")
+    try:
+        record_verdict_change(item.get('userId'), old_status, new_status)
+    except Exception as stats_err:
+        print(f"Warning: Failed to adjust statistics for {submission_id}: {str(stats_err)}")
+    return 'changed'
+
+
+# --- Whole Problem ---
+def run_rejudge(problem_id, workers=DEFAULT_WORKERS, page_size=DEFAULT_PAGE_SIZE, checkpoint_path=None, dry_run=False):
+    state = load_checkpoint(checkpoint_path, problem_id)
+    if state.get('completed'):
+        print(f"Rejudge run {state['runId']} for problem {problem_id} is already complete.")
+        return state
+
+    # Parse test cases / judge settings once for the whole run
+    grading_config = grader.fetch_grading_config(problem_id)
+    print(f"Rejudging problem {problem_id} ({len(grading_config['testCases'])} test cases, judge={grading_config['judgeType']}) "
+          f"with {workers} workers, run {state['runId']}{' [DRY RUN]' if dry_run else ''}")
+
+    session_start = time.perf_counter()
+    session_processed = 0
+    table = _submissions_table()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            query_kwargs = {
+                'IndexName': PROBLEM_INDEX_NAME,
+                'KeyConditionExpression': Key('problemId').eq(problem_id),
+                'Limit': page_size,
+            }
+            if state['lastEvaluatedKey']:
+                query_kwargs['ExclusiveStartKey'] = state['lastEvaluatedKey']
+            response = table.query(**query_kwargs)
+            items = response.get('Items', [])
+
+            for outcome in pool.map(lambda it: rejudge_submission(it, grading_config, state['runId'], dry_run), items):
+                state['counts'][outcome] += 1
+            session_processed += len(items)
+
+            state['pages'] += 1
+            state['lastEvaluatedKey'] = response.get('LastEvaluatedKey')
+            state['completed'] = state['lastEvaluatedKey'] is None
+            save_checkpoint(checkpoint_path, state)
+
+            elapsed = time.perf_counter() - session_start
+            throughput = session_processed / elapsed if elapsed > 0 else 0.0
+            print(f"[rejudge {problem_id}] page {state['pages']}: total={sum(state['counts'].values())} "
+                  f"{json.dumps(state['counts'])} | {throughput:.1f} submissions/s")
+
+            if state['completed']:
+                break
+
+    print(f"Rejudge of problem {problem_id} finished: {json.dumps(state['counts'])} "
+          f"in {time.perf_counter() - session_start:.1f}s this session")
+    if not dry_run:
+        try:
+            # Acceptances and runtimes changed: rebuild the problem's aggregates, histograms and solve sets
+            recompute_problem_stats(problem_id, iter_problem_submissions(table, problem_id, page_size))
+        except Exception as stats_err:
+            print(f"Warning: Failed to recompute statistics for problem {problem_id}: {str(stats_err)}")
+    return state
+
+
+def iter_problem_submissions(table, problem_id, page_size=DEFAULT_PAGE_SIZE):
+    """
+    All submissions of a problem (only the attributes the statistics need). The GSI only lists the
+    submission IDs: it is eventually consistent and may still hold verdicts from before this run, so
+    the submissions themselves are read from the base table with ConsistentRead.
+    """
+    query_kwargs = {
+        'IndexName': PROBLEM_INDEX_NAME,
+        'KeyConditionExpression': Key('problemId').eq(problem_id),
+        'ProjectionExpression': "submissionId",
+        'Limit': page_size,
+    }
+    while True:
+        response = table.query(**query_kwargs)
+        keys = [{'submissionId': item['submissionId']} for item in response.get('Items', [])]
+        for start in range(0, len(keys), BATCH_GET_MAX_KEYS):
+            yield from _consistent_batch_get(table.name, keys[start:start + BATCH_GET_MAX_KEYS])
+        if 'LastEvaluatedKey' not in response:
+            return
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def _consistent_batch_get(table_name, keys):
+    request = {
+        'Keys': keys,
+        'ConsistentRead': True,
+        'ProjectionExpression': "userId, #status, #language, executionTime, memoryUsageKb, submissionTime",
+        'ExpressionAttributeNames': {'#status': 'status', '#language': 'language'},
+    }
+    attempt = 0
+    while request['Keys']:
+        response = _dynamodb().batch_get_item(RequestItems={table_name: request})
+        yield from response.get('Responses', {}).get(table_name, [])
+        request['Keys'] = response.get('UnprocessedKeys', {}).get(table_name, {}).get('Keys', [])
+        if request['Keys']:
+            attempt += 1
+            time.sleep(min(0.05 * 2 ** attempt, 2.0))  # Throttled: back off before retrying the rest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Regrade all submissions of a problem")
+    parser.add_argument("--problem-id", required=True, help="Problem to rejudge")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Parallel grading workers")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE, help="Submissions per query page")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: rejudge-<problemId>.json)")
+    parser.add_argument("--dry-run", action="store_true", help="Grade but do not write verdicts")
+    args = parser.parse_args()
+
+    # A dry run writes nothing, so it must not leave a checkpoint that a real run would resume from
+    checkpoint_path = None if args.dry_run else (args.checkpoint or f"rejudge-{args.problem_id}.json")
+    run_rejudge(args.problem_id, args.workers, args.page_size, checkpoint_path, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import bisect
+import math
+
+# Mergeable log-linear histogram (HDR-histogram style) for runtime / memory values.
+# Values are bucketed by power of two, each power split into SUB_BUCKETS linear
+# sub-buckets, so the relative error of any bucket is at most 1 / SUB_BUCKETS.
+# Only non-empty buckets are stored, which keeps the serialized form small
+# enough to live in a single DynamoDB attribute.
+
+SUB_BUCKETS = 16  # ~6% relative precision
+SERIALIZATION_VERSION = "h1"
+
+
+def bucket_index(value):
+    """Maps a non-negative value to its bucket index (monotonic in value)."""
+    if value is None or value < 1:
+        return 0
+    exponent = int(math.floor(math.log2(value)))
+    sub_bucket = int((value / (2 ** exponent) - 1) * SUB_BUCKETS)
+    return 1 + exponent * SUB_BUCKETS + min(sub_bucket, SUB_BUCKETS - 1)
+
+
+def bucket_lower_bound(index):
+    """Smallest value that falls into the bucket (inverse of bucket_index)."""
+    if index <= 0:
+        return 0
+    exponent, sub_bucket = divmod(index - 1, SUB_BUCKETS)
+    return (2 ** exponent) * (1 + sub_bucket / SUB_BUCKETS)
+
+
+class StreamingHistogram:
+    def __init__(self, counts=None):
+        self.counts = dict(counts or {})  # bucket index -> count
+        self._sorted_indices = None
+        self._prefix_counts = None
+
+    # --- Construction / Serialization ---
+    @classmethod
+    def deserialize(cls, encoded):
+        """Parses 'h1|<idx>:<count>,<idx>:<count>...' (indices and counts in base 36)."""
+        if not encoded:
+            return cls()
+        try:
+            version, _, body = encoded.partition("|")
+            if version != SERIALIZATION_VERSION:
+                print(f"Histogram: unknown serialization version '{version}', starting empty.")
+                return cls()
+            counts = {}
+            for pair in filter(None, body.split(",")):
+                idx, count = pair.split(":")
+                counts[int(idx, 36)] = int(count, 36)
+            return cls(counts)
+        except (ValueError, AttributeError) as e:
+            print(f"Histogram: failed to parse encoded histogram ({e}), starting empty.")
+            return cls()
+
+    def serialize(self):
+        body = ",".join(f"{_to_base36(idx)}:{_to_base36(self.counts[idx])}" for idx in sorted(self.counts))
+        return f"{SERIALIZATION_VERSION}|{body}"
+
+    # --- Mutation ---
+    def add(self, value, count=1):
+        idx = bucket_index(value)
+        self.counts[idx] = self.counts.get(idx, 0) + count
+        self._sorted_indices = None
+
+    def merge(self, other):
+        for idx, count in other.counts.items():
+            self.counts[idx] = self.counts.get(idx, 0) + count
+        self._sorted_indices = None
+        return self
+
+    # --- Queries ---
+    @property
+    def total(self):
+        self._ensure_index()
+        return self._prefix_counts[-1] if self._prefix_counts else 0
+
+    def _ensure_index(self):
+        if self._sorted_indices is None:
+            self._sorted_indices = sorted(self.counts)
+            self._prefix_counts = []
+            running = 0
+            for idx in self._sorted_indices:
+                running += self.counts[idx]
+                self._prefix_counts.append(running)
+
+    def fraction_greater_than(self, value):
+        """
+        Fraction of recorded values larger than `value` (binary search over buckets).
+        Values sharing the bucket of `value` count as half, so ties are split evenly.
+        """
+        self._ensure_index()
+        total = self.total
+        if total == 0:
+            return None
+        idx = bucket_index(value)
+        pos = bisect.bisect_left(self._sorted_indices, idx)
+        below = self._prefix_counts[pos - 1] if pos > 0 else 0
+        same = self.counts.get(idx, 0)
+        above = total - below - same
+        return (above + same / 2) / total
+
+    def value_at_quantile(self, quantile):
+        """Approximate value at the given quantile (0..1), reported as the bucket lower bound."""
+        self._ensure_index()
+        total = self.total
+        if total == 0:
+            return None
+        target = max(1, math.ceil(quantile * total))
+        pos = bisect.bisect_left(self._prefix_counts, target)
+        return bucket_lower_bound(self._sorted_indices[min(pos, len(self._sorted_indices) - 1)])
+
+
+def _to_base36(number):
+    digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+    if number == 0:
+        return "0"
+    out = []
+    while number:
+        number, rem = divmod(number, 36)
+        out.append(digits[rem])
+    return "".join(reversed(out))
@@ -0,0 +1,362 @@
+import os
+import time
+from decimal import Decimal
+import boto3
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+from runtime_histogram import StreamingHistogram
+
+# Incrementally maintained per-problem / per-user submission counters.
+# Dashboards read a single stats item instead of paging through
+# ProblemIdSubmissionTimeIndex / UserIdSubmissionTimeIndex.
+
+dynamodb = boto3.resource('dynamodb')
+
+STATS_TABLE_NAME = os.environ.get('STATS_TABLE_NAME', 'alpaco-SubmissionStats-production')
+
+PROBLEM_STATS_PREFIX = "PROBLEM#"
+USER_STATS_PREFIX = "USER#"
+PERFORMANCE_STATS_PREFIX = "PERF#"  # PERF#<problemId>#<language>: accepted runtime / memory histograms
+
+# Optimistic-concurrency retries for histogram read-modify-write
+HISTOGRAM_UPDATE_MAX_ATTEMPTS = 5
+
+# Upper bounds (ms) of the accepted-runtime distribution buckets. Anything slower lands in the open "inf" bucket.
+RUNTIME_BUCKET_BOUNDS_MS = [10, 50, 100, 250, 500, 1000, 2000, 5000]
+
+_deserializer = TypeDeserializer()
+
+
+def problem_stats_key(problem_id):
+    return f"{PROBLEM_STATS_PREFIX}{problem_id}"
+
+
+def user_stats_key(user_id):
+    return f"{USER_STATS_PREFIX}{user_id}"
+
+
+def performance_stats_key(problem_id, language):
+    return f"{PERFORMANCE_STATS_PREFIX}{problem_id}#{language}"
+
+
+def runtime_bucket_attribute(execution_time_seconds):
+    """Maps an execution time (seconds) to the name of its runtime bucket counter."""
+    time_ms = float(execution_time_seconds) * 1000
+    for bound in RUNTIME_BUCKET_BOUNDS_MS:
+        if time_ms <= bound:
+            return f"runtimeBucket_le{bound}ms"
+    return "runtimeBucket_inf"
+
+
+class _UpdateBuilder:
+    """Collects ADD / SET clauses with placeholder names so attribute names never clash with reserved words."""
+
+    def __init__(self):
+        self.add_parts = []
+        self.set_parts = []
+        self.names = {}
+        self.values = {}
+
+    def _placeholders(self, attr_name, value):
+        idx = len(self.names)
+        name_ph, value_ph = f"#a{idx}", f":v{idx}"
+        self.names[name_ph] = attr_name
+        self.values[value_ph] = value
+        return name_ph, value_ph
+
+    def add(self, attr_name, value):
+        name_ph, value_ph = self._placeholders(attr_name, value)
+        self.add_parts.append(f"{name_ph} {value_ph}")
+
+    def set(self, attr_name, value):
+        name_ph, value_ph = self._placeholders(attr_name, value)
+        self.set_parts.append(f"{name_ph} = {value_ph}")
+
+    def kwargs(self):
+        clauses = []
+        if self.set_parts: clauses.append("SET " + ", ".join(self.set_parts))
+        if self.add_parts: clauses.append("ADD " + ", ".join(self.add_parts))
+        return {
+            'UpdateExpression': " ".join(clauses),
+            'ExpressionAttributeNames': self.names,
+            'ExpressionAttributeValues': self.values,
+        }
+
+
+# --- Incremental Update (called once per saved submission) ---
+def record_submission(submission_item, table=None):
+    """
+    Folds one saved submission into the per-user and per-problem stats items.
+    Uses only atomic ADD/SET updates, so concurrent graders never lose counts.
+    Returns {'firstAttempt': bool, 'firstSolve': bool} for the (user, problem) pair.
+    """
+    table = table or dynamodb.Table(STATS_TABLE_NAME)
+    problem_id = submission_item.get('problemId')
+    user_id = submission_item.get('userId')
+    status = submission_item.get('status', 'INTERNAL_ERROR')
+    language = submission_item.get('language', 'unknown')
+    submission_time = int(submission_item.get('submissionTime', time.time()))
+    accepted = status == "ACCEPTED"
+
+    if not problem_id:
+        print("Stats: submission has no problemId, skipping.")
+        return {'firstAttempt': False, 'firstSolve': False}
+
+    first_attempt = False
+    first_solve = False
+
+    # 1. User item. UPDATED_OLD returns the previous problem sets, which tells us
+    #    whether this is the user's first attempt / first solve for the problem.
+    if user_id:
+        user_update = _UpdateBuilder()
+        user_update.add('submissionCount', 1)
+        user_update.add(f"statusCount_{status}", 1)
+        user_update.add('attemptedProblems', {problem_id})
+        if accepted:
+            user_update.add('acceptedCount', 1)
+            user_update.add('solvedProblems', {problem_id})
+        user_update.set('lastSubmissionTime', submission_time)
+        if submission_item.get('author'):
+            user_update.set('author', submission_item['author'])
+
+        response = table.update_item(
+            Key={'statsId': user_stats_key(user_id)},
+            ReturnValues='UPDATED_OLD',
+            **user_update.kwargs()
+        )
+        old_attrs = response.get('Attributes', {})
+        first_attempt = problem_id not in old_attrs.get('attemptedProblems', set())
+        first_solve = accepted and problem_id not in old_attrs.get('solvedProblems', set())
+
+    # 2. Problem item
+    problem_update = _UpdateBuilder()
+    problem_update.add('submissionCount', 1)
+    problem_update.add(f"statusCount_{status}", 1)
+    problem_update.add(f"languageCount_{language}", 1)
+    if accepted:
+        execution_time = Decimal(str(submission_item.get('executionTime', 0)))
+        problem_update.add('acceptedCount', 1)
+        problem_update.add('acceptedExecutionTimeTotal', execution_time)
+        problem_update.add(runtime_bucket_attribute(execution_time), 1)
+    if first_attempt:
+        problem_update.add('uniqueAttempters', 1)
+    if first_solve:
+        problem_update.add('uniqueSolvers', 1)
+    problem_update.set('lastSubmissionTime', submission_time)
+    if submission_item.get('problemTitle'):
+        problem_update.set('problemTitle', submission_item['problemTitle'])
+
+    table.update_item(Key={'statsId': problem_stats_key(problem_id)}, **problem_update.kwargs())
+    print(f"Stats updated for problem {problem_id} (status={status}, firstAttempt={first_attempt}, firstSolve={first_solve})")
+    return {'firstAttempt': first_attempt, 'firstSolve': first_solve}
+
+
+def record_verdict_change(user_id, old_status, new_status, table=None):
+    """
+    Moves one already-counted submission from old_status to new_status in the user's counters
+    (used by rejudge). Everything derived from the set of accepted submissions of the problem
+    (solve sets, runtime aggregates, histograms) is rebuilt by recompute_problem_stats after the run.
+    """
+    if old_status == new_status or not user_id:
+        return
+    table = table or dynamodb.Table(STATS_TABLE_NAME)
+    accepted_delta = (new_status == "ACCEPTED") - (old_status == "ACCEPTED")
+
+    user_update = _UpdateBuilder()
+    user_update.add(f"statusCount_{old_status}", -1)
+    user_update.add(f"statusCount_{new_status}", 1)
+    if accepted_delta:
+        user_update.add('acceptedCount', accepted_delta)
+    table.update_item(Key={'statsId': user_stats_key(user_id)}, **user_update.kwargs())
+
+
+def recompute_problem_stats(problem_id, submissions, table=None):
+    """
+    Rebuilds the problem stats item and its PERF histograms from all of the problem's submissions,
+    and makes every submitter's solvedProblems agree with whether they still have an accepted one.
+    Used after a rejudge, which can revoke or grant acceptances and change runtimes. Submissions
+    graded while this runs may be overwritten, so run it once the rejudge has finished.
+    """
+    table = table or dynamodb.Table(STATS_TABLE_NAME)
+    problem_item = {'statsId': problem_stats_key(problem_id), 'submissionCount': 0, 'acceptedCount': 0,
+                    'acceptedExecutionTimeTotal': Decimal(0)}
+    attempters, solvers = set(), set()
+    histograms = {}  # language -> (runtime histogram, memory histogram)
+
+    def increment(attr_name, value=1):
+        problem_item[attr_name] = problem_item.get(attr_name, 0) + value
+
+    for submission in submissions:
+        status = submission.get('status', 'INTERNAL_ERROR')
+        language = submission.get('language', 'unknown')
+        user_id = submission.get('userId')
+        increment('submissionCount')
+        increment(f"statusCount_{status}")
+        increment(f"languageCount_{language}")
+        problem_item['lastSubmissionTime'] = max(problem_item.get('lastSubmissionTime', 0), int(submission.get('submissionTime', 0)))
+        runtime_hist, memory_hist = histograms.setdefault(language, (StreamingHistogram(), StreamingHistogram()))
+        if user_id:
+            attempters.add(user_id)
+        if status != "ACCEPTED":
+            continue
+        execution_time = Decimal(str(submission.get('executionTime', 0)))
+        increment('acceptedCount')
+        increment('acceptedExecutionTimeTotal', execution_time)
+        increment(runtime_bucket_attribute(execution_time))
+        runtime_hist.add(float(execution_time) * 1000)
+        if submission.get('memoryUsageKb') is not None:
+            memory_hist.add(float(submission['memoryUsageKb']))
+        if user_id:
+            solvers.add(user_id)
+    problem_item['uniqueAttempters'] = len(attempters)
+    problem_item['uniqueSolvers'] = len(solvers)
+
+    existing = table.get_item(Key={'statsId': problem_item['statsId']}).get('Item', {})
+    if existing.get('problemTitle'):
+        problem_item['problemTitle'] = existing['problemTitle']
+    table.put_item(Item=problem_item)
+
+    for language, (runtime_hist, memory_hist) in histograms.items():
+        # Bumping the version makes a concurrent record_accepted_performance retry on the new histograms
+        table.update_item(
+            Key={'statsId': performance_stats_key(problem_id, language)},
+            UpdateExpression="SET runtimeHistogram = :rh, memoryHistogram = :mh, "
+                             "histogramVersion = if_not_exists(histogramVersion, :zero) + :one",
+            ExpressionAttributeValues={
+                ':rh': runtime_hist.serialize(), ':mh': memory_hist.serialize(), ':zero': 0, ':one': 1,
+            },
+        )
+
+    for user_id in attempters:
+        action = "ADD" if user_id in solvers else "DELETE"
+        table.update_item(
+            Key={'statsId': user_stats_key(user_id)},
+            UpdateExpression=f"{action} solvedProblems :problem",
+            ExpressionAttributeValues={':problem': {problem_id}},
+        )
+    print(f"Stats recomputed for problem {problem_id}: {problem_item['submissionCount']} submissions, "
+          f"{problem_item['acceptedCount']} accepted, {len(solvers)} solvers")
+    return summarize_stats(problem_item)
+
+
+# --- Accepted Runtime / Memory Percentiles ---
+def record_accepted_performance(problem_id, language, execution_time_ms, peak_memory_kb=None, table=None):
+    """
+    Ranks an accepted submission against earlier accepted submissions of the same
+    problem and language, then adds it to the histograms.
+    Returns percentiles as "faster / lighter than X% of accepted submissions".
+    """
+    table = table or dynamodb.Table(STATS_TABLE_NAME)
+    key = {'statsId': performance_stats_key(problem_id, language)}
+
+    for attempt in range(1, HISTOGRAM_UPDATE_MAX_ATTEMPTS + 1):
+        item = table.get_item(Key=key, ConsistentRead=True).get('Item', {})
+        version = int(item.get('histogramVersion', 0))
+        runtime_hist = StreamingHistogram.deserialize(item.get('runtimeHistogram'))
+        memory_hist = StreamingHistogram.deserialize(item.get('memoryHistogram'))
+
+        runtime_percentile = runtime_hist.fraction_greater_than(execution_time_ms)
+        memory_percentile = memory_hist.fraction_greater_than(peak_memory_kb) if peak_memory_kb is not None else None
+        sample_size = runtime_hist.total
+
+        runtime_hist.add(execution_time_ms)
+        if peak_memory_kb is not None:
+            memory_hist.add(peak_memory_kb)
+
+        try:
+            table.update_item(
+                Key=key,
+                UpdateExpression="SET runtimeHistogram = :rh, memoryHistogram = :mh, histogramVersion = :newVer",
+                ConditionExpression="attribute_not_exists(histogramVersion) OR histogramVersion = :oldVer",
+                ExpressionAttributeValues={
+                    ':rh': runtime_hist.serialize(),
+                    ':mh': memory_hist.serialize(),
+                    ':newVer': version + 1,
+                    ':oldVer': version,
+                },
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                print(f"Histogram update conflict for {key['statsId']} (attempt {attempt}), retrying.")
+                continue
+            raise
+
+        return {
+            'runtimePercentile': _as_percent(runtime_percentile),
+            'memoryPercentile': _as_percent(memory_percentile),
+            'sampleSize': sample_size,
+        }
+
+    print(f"Warning: Gave up updating histograms for {key['statsId']} after {HISTOGRAM_UPDATE_MAX_ATTEMPTS} attempts.")
+    return None
+
+
+def _as_percent(fraction):
+    return round(fraction * 100, 1) if fraction is not None else None
+
+
+# --- Read Helpers (for dashboards / APIs) ---
+def summarize_stats(stats_item):
+    """Derives rates and the runtime distribution from a raw stats item."""
+    if not stats_item:
+        return None
+    submission_count = int(stats_item.get('submissionCount', 0))
+    accepted_count = int(stats_item.get('acceptedCount', 0))
+    summary = {
+        'statsId': stats_item.get('statsId'),
+        'submissionCount': submission_count,
+        'acceptedCount': accepted_count,
+        'acceptanceRate': round(accepted_count / submission_count, 4) if submission_count else 0.0,
+        'statusCounts': {k[len('statusCount_'):]: int(v) for k, v in stats_item.items() if k.startswith('statusCount_')},
+        'lastSubmissionTime': int(stats_item.get('lastSubmissionTime', 0)),
+    }
+    if stats_item.get('statsId', '').startswith(PROBLEM_STATS_PREFIX):
+        total_time = float(stats_item.get('acceptedExecutionTimeTotal', 0))
+        summary['uniqueAttempters'] = int(stats_item.get('uniqueAttempters', 0))
+        summary['uniqueSolvers'] = int(stats_item.get('uniqueSolvers', 0))
+        summary['averageAcceptedExecutionTime'] = round(total_time / accepted_count, 3) if accepted_count else None
+        summary['languageCounts'] = {k[len('languageCount_'):]: int(v) for k, v in stats_item.items() if k.startswith('languageCount_')}
+        summary['runtimeDistribution'] = {
+            f"le{bound}ms": int(stats_item.get(f"runtimeBucket_le{bound}ms", 0)) for bound in RUNTIME_BUCKET_BOUNDS_MS
+        }
+        summary['runtimeDistribution']['inf'] = int(stats_item.get('runtimeBucket_inf', 0))
+    else:
+        summary['attemptedProblemCount'] = len(stats_item.get('attemptedProblems', set()))
+        summary['solvedProblemCount'] = len(stats_item.get('solvedProblems', set()))
+    return summary
+
+
+def get_problem_stats(problem_id, table=None):
+    table = table or dynamodb.Table(STATS_TABLE_NAME)
+    response = table.get_item(Key={'statsId': problem_stats_key(problem_id)})
+    return summarize_stats(response.get('Item'))
+
+
+def get_user_stats(user_id, table=None):
+    table = table or dynamodb.Table(STATS_TABLE_NAME)
+    response = table.get_item(Key={'statsId': user_stats_key(user_id)})
+    return summarize_stats(response.get('Item'))
+
+
+# --- DynamoDB Stream Consumer ---
+def stream_handler(event, context):
+    """
+    Alternative entry point: attach to the Submissions table stream (NEW_IMAGE)
+    and set STATS_UPDATE_MODE=stream on the grader so each submission is counted once.
+    """
+    processed, failed = 0, 0
+    for record in event.get('Records', []):
+        if record.get('eventName') != 'INSERT':
+            continue  # Only new submissions are counted; rejudges adjust counters themselves
+        new_image = record.get('dynamodb', {}).get('NewImage')
+        if not new_image:
+            continue
+        try:
+            submission_item = {k: _deserializer.deserialize(v) for k, v in new_image.items()}
+            record_submission(submission_item)
+            processed += 1
+        except Exception as e:
+            failed += 1
+            print(f"Stats stream: failed to process record {record.get('eventID')}: {str(e)}")
+    print(f"Stats stream batch done: processed={processed}, failed={failed}")
+    return {'processed': processed, 'failed': failed}
@@ -1,6 +1,5 @@
 # lambda_function.py
 import json
-import asyncio
 import os
 import sys
 import traceback
@@ -18,6 +17,8 @@ if str(generator_lambda_dir) not in sys.path:
 try:
     # generator 모듈 및 필요한 상수 임포트
     from generation.generator import ProblemGenerator, ALGORITHM_TYPES, DIFFICULTY_LEVELS
+    # 토큰을 프레임 단위로 모으고 응답 스트림의 배압을 따르는 전송기
+    from utils.stream_writer import StreamWriter
     # 환경 변수 로드를 위해 load_dotenv 임포트 (필요시)
     from dotenv import load_dotenv
     # .env 파일 로드 (Lambda 환경변수를 우선 사용)
@@ -63,6 +64,7 @@ def find_algorithm_type(prompt: str) -> str | None:
 async def handler(event, context):
     """ AWS Lambda 스트리밍 응답 핸들러 """
     response_stream = context.get_response_stream()
+    writer = StreamWriter(response_stream, format_stream_message) if ProblemGenerator else None
     request_body = {}
     request_id = context.aws_request_id
     # api_key = os.environ.get("GOOGLE_AI_API_KEY") # Lambda 환경 변수에서 API 키 가져오기 - 제거
@@ -89,19 +91,17 @@ async def handler(event, context):
         print(f"[{request_id}] Parsed request - Prompt: {prompt_input}, Difficulty: {difficulty}")
 
         # 상태 업데이트: 요청 분석 시작
-        response_stream.write(format_stream_message("status", f"요청 분석 시작: '{prompt_input}' ({difficulty})").encode('utf-8'))
+        await writer.send_and_drain("status", f"요청 분석 시작: '{prompt_input}' ({difficulty})")
 
         # --- 알고리즘 유형 추출 ---
         algorithm_type = find_algorithm_type(prompt_input)
         if not algorithm_type:
             # 임시: 유형을 찾지 못하면 기본값 사용 또는 오류 처리
             algorithm_type = "구현" # 또는 다른 기본값
-            response_stream.write(format_stream_message("status", f"알고리즘 유형 자동 감지 실패. '{algorithm_type}' 유형으로 진행합니다.").encode('utf-8'))
-            await asyncio.sleep(0.1)
+            await writer.send_and_drain("status", f"알고리즘 유형 자동 감지 실패. '{algorithm_type}' 유형으로 진행합니다.")
             # raise ValueError(f"Could not determine algorithm type from prompt: '{prompt_input}'")
         else:
-             response_stream.write(format_stream_message("status", f"알고리즘 유형 감지됨: '{algorithm_type}'").encode('utf-8'))
-             await asyncio.sleep(0.1)
+             await writer.send_and_drain("status", f"알고리즘 유형 감지됨: '{algorithm_type}'")
 
         # --- ProblemGenerator 인스턴스 생성 ---
         # if not api_key: # 제거
@@ -117,14 +117,15 @@ async def handler(event, context):
             difficulty=difficulty,
             response_stream=response_stream,
             format_stream_message_func=format_stream_message,
-            verbose=False # Lambda 환경에서는 False 권장
+            verbose=False, # Lambda 환경에서는 False 권장
+            stream_writer=writer,
         )
 
         # --- 최종 결과 전송 ---
-        response_stream.write(format_stream_message("result", final_problems).encode('utf-8'))
+        writer.send("result", final_problems)
 
         # --- 최종 상태 ---
-        response_stream.write(format_stream_message("status", "✅ 생성 완료!").encode('utf-8'))
+        writer.send("status", "✅ 생성 완료!")
         print(f"[{request_id}] Request processed successfully.")
 
     except ValueError as ve:
@@ -147,5 +148,11 @@ async def handler(event, context):
 
     finally:
         # --- 스트림 닫기 (필수) ---
+        if writer:
+            try:
+                await writer.close()
+            except Exception as drain_err:
+                print(f"[{request_id}] Failed to drain response stream: {drain_err}")
+            print(f"[{request_id}] Stream stats: {writer.stats()}")  # 전송 바이트/프레임 수
         response_stream.close()
         print(f"[{request_id}] Response stream closed.") 
\ No newline at end of file
@@ -0,0 +1,75 @@
+import asyncio
+import contextvars
+import os
+import time
+from contextlib import contextmanager
+from typing import List, Tuple
+
+# Batch requests: {"problems": [{"prompt": ..., "difficulty": ...}, ...]} generates a whole set in one
+# invocation. Member pipelines run concurrently in one event loop (bounded by BATCH_CONCURRENCY) and
+# share one rate limiter that spaces out LLM calls across all members. Their SSE events go out on the
+# same stream, each tagged with the member's `index` and `problemId`.
+
+BATCH_MAX_PROBLEMS = int(os.environ.get("BATCH_MAX_PROBLEMS", "10"))
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "4"))
+BATCH_LLM_MIN_INTERVAL_SECONDS = float(os.environ.get("BATCH_LLM_MIN_INTERVAL_SECONDS", "0.2"))
+
+# Set per member task; read by send_sse and before every LLM call
+_sse_tag = contextvars.ContextVar("batch_sse_tag", default=None)
+_rate_limiter = contextvars.ContextVar("batch_rate_limiter", default=None)
+
+
+class AsyncRateLimiter:
+    """Keeps at least `min_interval_seconds` between call starts across all tasks of a batch."""
+
+    def __init__(self, min_interval_seconds=BATCH_LLM_MIN_INTERVAL_SECONDS):
+        self.min_interval_seconds = min_interval_seconds
+        self._next_start = 0.0
+
+    async def wait(self):
+        # No await between reading and reserving the slot, so concurrent tasks get distinct slots
+        now = time.monotonic()
+        start_at = max(now, self._next_start)
+        self._next_start = start_at + self.min_interval_seconds
+        if start_at > now:
+            await asyncio.sleep(start_at - now)
+
+
+def parse_batch_request(problems) -> List[Tuple[str, str]]:
+    """Validates the `problems` body field. Returns [(prompt, difficulty), ...]."""
+    if not isinstance(problems, list) or not problems:
+        raise ValueError("'problems' must be a non-empty list of {prompt, difficulty} objects.")
+    if len(problems) > BATCH_MAX_PROBLEMS:
+        raise ValueError(f"A batch can contain at most {BATCH_MAX_PROBLEMS} problems (got {len(problems)}).")
+    members = []
+    for index, problem in enumerate(problems):
+        prompt = problem.get("prompt", "").strip() if isinstance(problem, dict) else ""
+        if not prompt:
+            raise ValueError(f"Batch problem {index} has no prompt.")
+        members.append((prompt, problem.get("difficulty", "Medium")))
+    return members
+
+
+@contextmanager
+def use_rate_limiter(limiter):
+    token = _rate_limiter.set(limiter)
+    try:
+        yield limiter
+    finally:
+        _rate_limiter.reset(token)
+
+
+async def wait_for_llm_slot():
+    """Waits for the batch rate limiter, if any (single-problem requests are not limited)."""
+    limiter = _rate_limiter.get()
+    if limiter is not None:
+        await limiter.wait()
+
+
+def tag_sse_events(**fields):
+    """Adds `fields` to every SSE payload sent from the current member task."""
+    _sse_tag.set({**(_sse_tag.get() or {}), **fields})
+
+
+def sse_tag():
+    return _sse_tag.get()
@@ -0,0 +1,48 @@
+import os
+import time
+
+# Invocation deadline propagated through the pipeline. Every step attempt is bounded by
+# min(its route's time budget, time left minus a reserve); the reserve keeps enough time to
+# checkpoint (final status flush) and tell the client how to resume before Lambda kills the run.
+
+DEADLINE_RESERVE_SECONDS = float(os.environ.get("DEADLINE_RESERVE_SECONDS", "20"))
+DEFAULT_INVOCATION_SECONDS = 900  # Without a Lambda context (local runs): the maximum Lambda timeout
+
+
+class DeadlineExceeded(Exception):
+    """Raised when there is not enough time left to start or finish a step. The run is resumable."""
+
+
+class Deadline:
+    def __init__(self, remaining_seconds, reserve_seconds=DEADLINE_RESERVE_SECONDS):
+        self.expires_at = time.monotonic() + remaining_seconds
+        self.reserve_seconds = reserve_seconds
+
+    @classmethod
+    def from_context(cls, context, reserve_seconds=DEADLINE_RESERVE_SECONDS):
+        """Uses context.get_remaining_time_in_millis() when invoked by Lambda."""
+        if context is not None and hasattr(context, "get_remaining_time_in_millis"):
+            remaining_seconds = context.get_remaining_time_in_millis() / 1000
+        else:
+            remaining_seconds = DEFAULT_INVOCATION_SECONDS
+        return cls(remaining_seconds, reserve_seconds)
+
+    def remaining_seconds(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def remaining_ms(self) -> int:
+        return int(self.remaining_seconds() * 1000)
+
+    def usable_seconds(self) -> float:
+        """Time that may still be spent on steps (the reserve is kept for checkpointing)."""
+        return max(0.0, self.remaining_seconds() - self.reserve_seconds)
+
+    def timeout_for(self, budget_seconds) -> float:
+        return min(budget_seconds, self.usable_seconds())
+
+    def check(self, what, min_seconds=1.0):
+        """Raises DeadlineExceeded if less than `min_seconds` of usable time is left for `what`."""
+        if self.usable_seconds() < min_seconds:
+            raise DeadlineExceeded(
+                f"Not enough time left for {what} ({self.remaining_seconds():.0f}s remaining in this invocation)."
+            )
@@ -0,0 +1,173 @@
+import contextvars
+import json
+import os
+import threading
+import time
+
+from boto3.dynamodb.conditions import Key
+
+# Short-lived per-problem log of the SSE events sent during a generation, so a client whose
+# connection dropped can reattach: it reconnects with problemId and Last-Event-ID, gets the
+# events it missed replayed, then the live ones tailed from the log until the generation ends.
+# Table layout: partition key problemId (S), sort key seq (N), TTL attribute expiresAt.
+# Event IDs count the events of each problem (1, 2, 3, ...; a resumed generation continues from
+# the last logged one). Batched writes can land out of order, so a reader only moves past an ID
+# once every earlier one is in the log. Consecutive token events are logged as one item.
+
+EVENT_LOG_TABLE_NAME = os.environ.get("EVENT_LOG_TABLE_NAME", "")
+EVENT_LOG_TTL_SECONDS = int(os.environ.get("EVENT_LOG_TTL_SECONDS", "3600"))
+EVENT_LOG_FLUSH_INTERVAL_SECONDS = float(os.environ.get("EVENT_LOG_FLUSH_INTERVAL_SECONDS", "0.5"))
+EVENT_LOG_POLL_SECONDS = float(os.environ.get("EVENT_LOG_POLL_SECONDS", "1.0"))
+# Upper bound of the token events (JSON bytes) stored in one item; DynamoDB items are limited to 400 KB
+EVENT_LOG_TOKEN_ITEM_BYTES = int(os.environ.get("EVENT_LOG_TOKEN_ITEM_BYTES", "32768"))
+# A reattached client is done once one of these was replayed for its problem
+TERMINAL_EVENTS = {"result", "error", "interrupted"}
+
+# Problem the events of the current request/task belong to (batch members set their own)
+_logged_problem_id = contextvars.ContextVar("sse_logged_problem_id", default=None)
+
+
+class EventSequence:
+    """
+    Per-problem event IDs without gaps. Hold `lock` from next() until the event is written and
+    appended to the log, so events from concurrent threads are sent and logged in ID order.
+    """
+
+    def __init__(self):
+        self._last = {}
+        self.lock = threading.RLock()
+
+    def next(self, problem_id) -> int:
+        with self.lock:
+            self._last[problem_id] = self._last.get(problem_id, 0) + 1
+            return self._last[problem_id]
+
+    def continue_from(self, problem_id, last_seq):
+        """A resumed generation: its IDs go on after the last logged event."""
+        with self.lock:
+            self._last[problem_id] = max(self._last.get(problem_id, 0), last_seq)
+
+    def clear(self):
+        with self.lock:
+            self._last.clear()
+
+
+def log_events_for(problem_id):
+    """Logs the following events of this context under `problem_id`. Returns a token for stop_logging_events."""
+    return _logged_problem_id.set(problem_id)
+
+
+def stop_logging_events(token):
+    _logged_problem_id.reset(token)
+
+
+def logged_problem_id():
+    return _logged_problem_id.get()
+
+
+class EventLog:
+    """Write-behind appender (batched on a background thread) and reader of the event log table."""
+
+    def __init__(self, table, flush_interval=EVENT_LOG_FLUSH_INTERVAL_SECONDS, ttl_seconds=EVENT_LOG_TTL_SECONDS):
+        self.table = table
+        self.flush_interval = flush_interval
+        self.ttl_seconds = ttl_seconds
+        self._pending = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="sse-event-log", daemon=True)
+        self._thread.start()
+
+    def append(self, problem_id, seq, event_type, payload):
+        """Queues one event; a token event directly following another one of the problem joins its item."""
+        data = json.dumps(payload)  # Stored as sent; avoids float/Decimal conversion
+        with self._lock:
+            if event_type == "token":
+                last = self._pending[-1] if self._pending else None
+                if (
+                    last is not None
+                    and last["problemId"] == problem_id
+                    and last["eventType"] == "token"
+                    and last["seq"] == seq - 1
+                    and len(last["data"]) + len(data) < EVENT_LOG_TOKEN_ITEM_BYTES
+                ):
+                    # data holds [[seq, payload], ...]; the item's seq is that of its last event
+                    last["data"] = f"{last['data'][:-1]}, [{seq}, {data}]]"
+                    last["seq"] = seq
+                    return
+                data = f"[[{seq}, {data}]]"
+            self._pending.append(
+                {
+                    "problemId": problem_id,
+                    "seq": seq,
+                    "eventType": event_type,
+                    "data": data,
+                    "expiresAt": int(time.time()) + self.ttl_seconds,
+                }
+            )
+
+    def flush(self):
+        """Synchronously writes everything appended so far (the invocation calls this before returning)."""
+        with self._write_lock:
+            with self._lock:
+                items, self._pending = self._pending, []
+            if not items:
+                return
+            try:
+                with self.table.batch_writer() as batch:
+                    for item in items:
+                        batch.put_item(Item=item)
+            except Exception as e:
+                # Losing the log only affects reconnects; never fail the generation for it
+                print(f"Error writing {len(items)} SSE events to the event log: {e}")
+
+    def read(self, problem_id, after_seq=0, contiguous=True):
+        """
+        Logged events of `problem_id` with seq > after_seq, oldest first: [(seq, event_type, payload)].
+        With `contiguous`, stops before the first missing ID: it may still be in a writer's batch.
+        """
+        query = {
+            "KeyConditionExpression": Key("problemId").eq(problem_id) & Key("seq").gt(after_seq),
+            "ConsistentRead": True,
+        }
+        events = []
+        while True:
+            response = self.table.query(**query)
+            for item in response.get("Items", []):
+                data = json.loads(item["data"])
+                if item["eventType"] == "token":
+                    events += [(seq, "token", payload) for seq, payload in data if seq > after_seq]
+                else:
+                    events.append((int(item["seq"]), item["eventType"], data))
+            if "LastEvaluatedKey" not in response:
+                break
+            query["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+        if contiguous:
+            for index, (seq, _, _) in enumerate(events):
+                if seq != after_seq + index + 1:
+                    return events[:index]
+        return events
+
+    def last_seq(self, problem_id):
+        """Highest logged ID of `problem_id` (0 if none)."""
+        response = self.table.query(
+            KeyConditionExpression=Key("problemId").eq(problem_id),
+            ProjectionExpression="seq",
+            ScanIndexForward=False,
+            Limit=1,
+            ConsistentRead=True,
+        )
+        items = response.get("Items", [])
+        return int(items[0]["seq"]) if items else 0
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+
+def configure_event_log(dynamodb):
+    """The EventLog of EVENT_LOG_TABLE_NAME, or None when reconnect support is not configured."""
+    if not EVENT_LOG_TABLE_NAME:
+        return None
+    return EventLog(dynamodb.Table(EVENT_LOG_TABLE_NAME))
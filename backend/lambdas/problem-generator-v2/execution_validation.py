@@ -0,0 +1,248 @@
+import json
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+
+# Step 4 validation by real execution in the code-executor sandbox (the same Lambda
+# code-grader uses). The test generator produces the inputs, the solution is run on all
+# of them in one batched call (twice, to catch non-determinism), and the agreed cases
+# become the problem's finalTestCases.
+
+RUN_CODE_LAMBDA_NAME = os.environ.get("RUN_CODE_LAMBDA_NAME")
+GENERATOR_TIMEOUT_MS = int(os.environ.get("VALIDATION_GENERATOR_TIMEOUT_MS", "10000"))
+SOLUTION_BATCH_TIMEOUT_MS = int(os.environ.get("VALIDATION_BATCH_TIMEOUT_MS", "20000"))
+# Fraction of cases where the generator's expected_output may disagree with the solution
+MAX_MISMATCH_RATIO = float(os.environ.get("VALIDATION_MAX_MISMATCH_RATIO", "0"))
+MAX_FINAL_TEST_CASES = int(os.environ.get("VALIDATION_MAX_TEST_CASES", "100"))
+FLOAT_TOLERANCE = 1e-6
+_NO_OUTPUT = object()  # Best-of-N: case where a candidate produced no usable output
+
+COLLECT_ENTRY_POINT = "__collect_test_cases__"
+
+# Appended to testGeneratorCode so the executor can call the generator like a solution function
+COLLECT_WRAPPER = '''
+
+def __collect_test_cases__(_unused_input):
+    for _name in ("generate_test_cases", "generate_tests", "generate"):
+        if callable(globals().get(_name)):
+            return globals()[_name]()
+    raise NameError("No generate_test_cases() function found in the test generator code.")
+'''
+
+lambda_client = boto3.client("lambda")
+
+
+def invoke_code_executor(body):
+    """Invokes the code-executor Lambda and returns its parsed execution result."""
+    response = lambda_client.invoke(
+        FunctionName=RUN_CODE_LAMBDA_NAME,
+        InvocationType="RequestResponse",
+        Payload=json.dumps({"body": json.dumps(body)}),
+    )
+    payload = json.loads(response["Payload"].read().decode("utf-8"))
+    if response.get("FunctionError"):
+        raise RuntimeError(f"code-executor failed: {payload.get('errorMessage', payload)}")
+    return json.loads(payload["body"])
+
+
+def _describe_failure(result):
+    if result.get("timedOut"):
+        return "timed out"
+    return (result.get("stderr") or result.get("errorMessage") or "execution failed")[:500]
+
+
+def outputs_match(actual, expected):
+    """Structural equality with a small tolerance for floats."""
+    if isinstance(actual, bool) or isinstance(expected, bool):
+        return actual == expected
+    if isinstance(actual, (int, float)) and isinstance(expected, (int, float)):
+        return math.isclose(actual, expected, rel_tol=FLOAT_TOLERANCE, abs_tol=FLOAT_TOLERANCE)
+    if isinstance(actual, (list, tuple)) and isinstance(expected, (list, tuple)):
+        return len(actual) == len(expected) and all(
+            outputs_match(a, e) for a, e in zip(actual, expected)
+        )
+    if isinstance(actual, dict) and isinstance(expected, dict):
+        return actual.keys() == expected.keys() and all(
+            outputs_match(actual[k], expected[k]) for k in actual
+        )
+    return actual == expected
+
+
+def collect_generated_cases(test_gen_code):
+    """Runs the test generator in the sandbox and returns [{'input', 'expected_output'}, ...]."""
+    result = invoke_code_executor(
+        {
+            "code_to_execute": test_gen_code + COLLECT_WRAPPER,
+            "input_data": None,
+            "timeout_ms": GENERATOR_TIMEOUT_MS,
+            "entry_point": COLLECT_ENTRY_POINT,
+        }
+    )
+    if not result.get("isSuccessful"):
+        raise ValueError(f"Test generator failed to run: {_describe_failure(result)}")
+
+    cases = []
+    for raw_case in result.get("returnValue") or []:
+        if isinstance(raw_case, dict) and "input" in raw_case:
+            cases.append({"input": raw_case["input"], "expected_output": raw_case.get("expected_output")})
+        elif isinstance(raw_case, (list, tuple)) and len(raw_case) == 2:
+            cases.append({"input": raw_case[0], "expected_output": raw_case[1]})
+
+    # Drop duplicate inputs, keep the generator's order
+    unique_cases, seen = [], set()
+    for case in cases:
+        key = json.dumps(case["input"], sort_keys=True, default=str)
+        if key not in seen:
+            seen.add(key)
+            unique_cases.append(case)
+    if not unique_cases:
+        raise ValueError("Test generator returned no usable test cases.")
+    return unique_cases[:MAX_FINAL_TEST_CASES]
+
+
+def run_solution_batch(solution_code, inputs):
+    result = invoke_code_executor(
+        {
+            "code_to_execute": solution_code,
+            "input_data_batch": inputs,
+            "timeout_ms": SOLUTION_BATCH_TIMEOUT_MS,
+        }
+    )
+    if result.get("batchResults") is None:
+        raise ValueError(f"Solution failed to run on the generated inputs: {_describe_failure(result)}")
+    return result["batchResults"]
+
+
+def validate_by_execution(solution_code, test_gen_code):
+    """
+    Returns {"status": "Pass"|"Fail", "details": str, "final_test_cases": list, "stats": dict}.
+    On Pass, final_test_cases holds the generated inputs with the solution's outputs.
+    Infrastructure errors (executor unreachable) are raised, not reported as Fail.
+    """
+    cases = collect_generated_cases(test_gen_code)
+    inputs = [case["input"] for case in cases]
+    first_run = run_solution_batch(solution_code, inputs)
+    second_run = run_solution_batch(solution_code, inputs)
+    return evaluate_runs(cases, first_run, second_run)
+
+
+def _case_outputs(first_run, second_run):
+    """Per case: the output when both runs succeeded and agreed, else _NO_OUTPUT."""
+    return [
+        first.get("result")
+        if not (first.get("error") or second.get("error")) and outputs_match(first.get("result"), second.get("result"))
+        else _NO_OUTPUT
+        for first, second in zip(first_run, second_run)
+    ]
+
+
+def _majority_output(outputs):
+    """The output most candidates agree on (earlier candidates win ties), or _NO_OUTPUT."""
+    best, best_votes = _NO_OUTPUT, 0
+    for value in outputs:
+        if value is _NO_OUTPUT:
+            continue
+        votes = sum(1 for other in outputs if other is not _NO_OUTPUT and outputs_match(value, other))
+        if votes > best_votes:
+            best, best_votes = value, votes
+    return best
+
+
+def select_solution_by_execution(solution_codes, test_gen_code):
+    """
+    Best-of-N: runs every candidate (twice, concurrently) on the same generated inputs and validates
+    the one that agrees with the per-case majority output most often, the fastest among equals.
+    Returns validate_by_execution's result plus "selected_index". Candidates that fail to run at
+    all are skipped; infrastructure errors are raised.
+    """
+    cases = collect_generated_cases(test_gen_code)
+    inputs = [case["input"] for case in cases]
+    with ThreadPoolExecutor(max_workers=2 * len(solution_codes)) as pool:
+        futures = [
+            (pool.submit(run_solution_batch, code, inputs), pool.submit(run_solution_batch, code, inputs))
+            for code in solution_codes
+        ]
+        runs = []
+        for index, (first, second) in enumerate(futures):
+            try:
+                runs.append((first.result(), second.result()))
+            except ValueError as e:  # The candidate itself is broken (e.g. syntax error)
+                print(f"Solution candidate {index} could not run: {e}")
+                runs.append(None)
+    if not any(runs):
+        return validate_by_execution(solution_codes[0], test_gen_code)  # Reports the primary's failure
+
+    outputs = [_case_outputs(*run) if run else [_NO_OUTPUT] * len(cases) for run in runs]
+    majority = [_majority_output(case_outputs) for case_outputs in zip(*outputs)]
+    agreement = [
+        sum(
+            1
+            for value, expected in zip(candidate_outputs, majority)
+            if value is not _NO_OUTPUT and expected is not _NO_OUTPUT and outputs_match(value, expected)
+        )
+        for candidate_outputs in outputs
+    ]
+    time_ms = [sum(case.get("timeMs") or 0 for case in run[0]) if run else None for run in runs]
+    selected = max(
+        (index for index, run in enumerate(runs) if run),
+        key=lambda index: (agreement[index], -time_ms[index]),
+    )
+
+    outcome = evaluate_runs(cases, *runs[selected])
+    outcome["stats"].update(
+        {
+            "candidates": len(solution_codes),
+            "selectedCandidate": selected,
+            "candidateAgreement": agreement,
+            "candidateTimeMs": time_ms,
+        }
+    )
+    outcome["selected_index"] = selected
+    return outcome
+
+
+def evaluate_runs(cases, first_run, second_run):
+    """Checks two runs of one solution over `cases` (see validate_by_execution for the result)."""
+    errors, nondeterministic, mismatches = [], [], []
+    final_test_cases = []
+    for index, (case, first, second) in enumerate(zip(cases, first_run, second_run)):
+        if first.get("error") or second.get("error"):
+            errors.append((index, first.get("error") or second.get("error")))
+            continue
+        if not outputs_match(first.get("result"), second.get("result")):
+            nondeterministic.append(index)
+            continue
+        if case["expected_output"] is not None and not outputs_match(first.get("result"), case["expected_output"]):
+            mismatches.append(index)
+        final_test_cases.append({"input": case["input"], "expected_output": first.get("result")})
+
+    stats = {
+        "generatedCases": len(cases),
+        "solutionErrors": len(errors),
+        "nondeterministicCases": len(nondeterministic),
+        "expectedOutputMismatches": len(mismatches),
+        "finalCases": len(final_test_cases),
+    }
+    problems = []
+    if errors:
+        index, message = errors[0]
+        problems.append(f"solution raised on {len(errors)} case(s), e.g. case {index + 1}: {str(message)[:200]}")
+    if nondeterministic:
+        problems.append(f"solution is non-deterministic on {len(nondeterministic)} case(s)")
+    if len(mismatches) > MAX_MISMATCH_RATIO * len(cases):
+        index = mismatches[0]
+        problems.append(
+            f"generator expected_output disagrees with the solution on {len(mismatches)} case(s), "
+            f"e.g. case {index + 1}: input={json.dumps(cases[index]['input'], default=str)[:150]}"
+        )
+
+    if problems:
+        return {"status": "Fail", "details": "; ".join(problems), "final_test_cases": [], "stats": stats}
+    return {
+        "status": "Pass",
+        "details": f"Solution ran deterministically on {len(final_test_cases)} generated cases.",
+        "final_test_cases": final_test_cases,
+        "stats": stats,
+    }
@@ -1,9 +1,16 @@
+import asyncio
+import contextvars
+import functools
 import json
 import sys
 import os
+import re
+import threading
 import time
 import uuid
 import traceback
+from contextlib import contextmanager
+from decimal import Decimal
 import boto3
 
 # from langchain_aws import BedrockLLM
@@ -13,6 +20,79 @@ from langchain_core.output_parsers import PydanticOutputParser, StrOutputParser
 from pydantic import BaseModel, Field
 from typing import List, Union
 
+# Shared LLM response cache lives in problem-generator/utils (same path setup as problem-generator-streaming)
+problem_generator_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "problem-generator")
+if problem_generator_dir not in sys.path:
+    sys.path.append(problem_generator_dir)
+try:
+    from utils.llm_cache import bypass_llm_cache, configure_llm_cache
+except ImportError as e:
+    print(f"LLM cache unavailable ({e}); continuing without it.")
+    from contextlib import nullcontext as bypass_llm_cache
+
+    configure_llm_cache = None
+try:
+    from utils.replay_llm import maybe_replay_llm
+except ImportError:
+
+    def maybe_replay_llm(create_llm):
+        return create_llm()
+
+try:
+    from utils.generation_metrics import (
+        GenerationMetrics,
+        count_retry,
+        measure_parse,
+        measure_step,
+        metrics_callbacks,
+        use_generation_metrics,
+    )
+except ImportError as e:
+    print(f"Generation metrics unavailable ({e}); continuing without them.")
+    from contextlib import nullcontext as measure_parse, nullcontext as measure_step
+    from contextlib import nullcontext as use_generation_metrics
+
+    GenerationMetrics = None
+    metrics_callbacks = list
+
+    def count_retry():
+        pass
+
+try:
+    from utils.problem_pool import PROBLEM_POOL_TARGET, configure_problem_pool, fill_pool, make_pool_key
+except ImportError as e:
+    print(f"Problem pool unavailable ({e}); continuing with live generation only.")
+    configure_problem_pool = None
+
+from batch_generation import (
+    BATCH_CONCURRENCY,
+    AsyncRateLimiter,
+    parse_batch_request,
+    sse_tag,
+    tag_sse_events,
+    use_rate_limiter,
+    wait_for_llm_slot,
+)
+from deadline import Deadline, DeadlineExceeded
+from event_log import (
+    EVENT_LOG_POLL_SECONDS,
+    TERMINAL_EVENTS,
+    EventSequence,
+    configure_event_log,
+    log_events_for,
+    logged_problem_id,
+    stop_logging_events,
+)
+from execution_validation import RUN_CODE_LAMBDA_NAME, select_solution_by_execution, validate_by_execution
+from model_routing import MODEL_TIERS, ModelRouter, candidate_variants
+from output_repair import OutputRepairError, parse_with_repair
+from pipeline_dag import PipelineError, PipelineNode, run_dag
+from prompt_budget import PromptBudget
+from prompt_index import PromptIndex, prompt_key
+from status_writer import StatusWriter
+from structured_output import build_structured_chain
+from token_stream import TokenCoalescer
+
 # Initialize AWS clients
 bedrock_runtime = boto3.client(service_name="bedrock-runtime")
 dynamodb = boto3.resource("dynamodb")
@@ -22,22 +102,66 @@ PROBLEMS_TABLE_NAME = os.environ.get("PROBLEMS_TABLE_NAME", "default-problems-ta
 BEDROCK_MODEL_ID = os.environ.get("BEDROCK_MODEL_ID")  # Get Bedrock model ID
 GOOGLE_AI_API_KEY = os.environ.get("GOOGLE_AI_API_KEY")  # Get Google API Key
 GENERATOR_VERBOSE = os.environ.get("GENERATOR_VERBOSE", "false").lower() == "true"
+# "execution": run the generator and solution in the code-executor sandbox (needs RUN_CODE_LAMBDA_NAME),
+# "llm": LLM code review only (does not produce finalTestCases)
+VALIDATION_MODE = os.environ.get("VALIDATION_MODE", "execution").lower()
+# LLM re-asks per structured step when local output repair fails
+STRUCTURED_OUTPUT_MAX_REASKS = int(os.environ.get("STRUCTURED_OUTPUT_MAX_REASKS", "1"))
+# "native": Gemini JSON mode with a response schema and compact prompts (falls back to "prompt" on error),
+# "prompt": full PydanticOutputParser format instructions in the prompt
+NATIVE_JSON_OUTPUT = os.environ.get("STRUCTURED_OUTPUT_MODE", "native").lower() == "native"
+# Stream steps 2, 3 and 6 token by token as SSE `token` events (a `token_reset` event precedes the
+# tokens of a retried attempt)
+TOKEN_STREAMING = os.environ.get("TOKEN_STREAMING", "true").lower() == "true"
+# Reuse of completed problems for equivalent prompts: "off", "exact" (same normalized prompt and
+# difficulty) or "similar" (also MinHash near-duplicates: served at PROMPT_REUSE_SERVE_SIMILARITY,
+# used as a seed for step 1 at PROMPT_REUSE_SEED_SIMILARITY)
+PROMPT_REUSE_MODE = os.environ.get("PROMPT_REUSE_MODE", "exact").lower()
+PROMPT_REUSE_SERVE_SIMILARITY = float(os.environ.get("PROMPT_REUSE_SERVE_SIMILARITY", "0.9"))
+PROMPT_REUSE_SEED_SIMILARITY = float(os.environ.get("PROMPT_REUSE_SEED_SIMILARITY", "0.6"))
+PROMPT_INDEX_REFRESH_SECONDS = int(os.environ.get("PROMPT_INDEX_REFRESH_SECONDS", "300"))
+PROMPT_INDEX_MAX_ITEMS = int(os.environ.get("PROMPT_INDEX_MAX_ITEMS", "5000"))  # Per background load
+# GSI of the Problems table on promptKey (normalized prompt + difficulty) and createdAt, for exact reuse
+PROMPT_KEY_INDEX_NAME = os.environ.get("PROMPT_KEY_INDEX_NAME", "PromptKeyIndex")
+# A generation that is not in a failed state can only be resumed once its item has not been written for
+# this long; the default is the Lambda maximum timeout, so no invocation can still be running it
+RESUME_STALE_SECONDS = int(os.environ.get("RESUME_STALE_SECONDS", "900"))
+# Pre-generated problem pool (PROBLEM_POOL_TABLE_NAME, see problem-generator/utils/problem_pool.py)
+POOL_GENERATOR_NAME = "problem-generator-v2"
+POOL_ALGORITHM_TYPES = [
+    t.strip()
+    for t in os.environ.get(
+        "POOL_ALGORITHM_TYPES",
+        "Implementation,Graph,Dynamic Programming,Greedy,Binary Search,BFS,DFS,Shortest Path,Sorting,Data Structures",
+    ).split(",")
+    if t.strip()
+]
+POOL_DIFFICULTIES = [d.strip() for d in os.environ.get("POOL_DIFFICULTIES", "Easy,Medium,Hard").split(",") if d.strip()]
+POOL_PROMPT_TEMPLATE = "Create a {difficulty} coding problem whose intended solution uses {algorithm_type}."
 
 # Constants
 DEFAULT_LANGUAGE = "python3.12"
 
+
 # Initialize LLM based on available configuration
-llm = None
+# Models are created per tier/route by the model router (see model_routing.py)
+def create_llm(model_name, temperature, max_output_tokens):
+    def create_gemini():
+        if not GOOGLE_AI_API_KEY:
+            raise ValueError("No LLM provider configured. Set the GOOGLE_AI_API_KEY environment variable.")
+        return ChatGoogleGenerativeAI(
+            model=model_name,
+            google_api_key=GOOGLE_AI_API_KEY,
+            temperature=temperature,
+            max_output_tokens=max_output_tokens,
+        )
+
+    # With LLM_REPLAY_FILE set, recorded responses are replayed instead (offline benchmarks)
+    return maybe_replay_llm(create_gemini)
+
+
 if GOOGLE_AI_API_KEY:
-    print("Using Google AI (Gemini)")
-    # Ensure langchain-google-genai is installed
-    from langchain_google_genai import ChatGoogleGenerativeAI
-
-    llm = ChatGoogleGenerativeAI(
-        model="gemini-2.5-pro-exp-03-25",  # Consider making model name configurable
-        google_api_key=GOOGLE_AI_API_KEY,
-        # Add temperature or other generation settings if needed
-    )
+    print(f"Using Google AI (Gemini): {MODEL_TIERS}")
 # elif BEDROCK_MODEL_ID:
 #     print(f"Using AWS Bedrock ({BEDROCK_MODEL_ID})")
 #     bedrock_runtime = boto3.client(service_name="bedrock-runtime")
@@ -51,6 +175,17 @@ if GOOGLE_AI_API_KEY:
 #         "No LLM provider configured. Set GOOGLE_AI_API_KEY or BEDROCK_MODEL_ID environment variables."
 #     )
 
+# Cache every chain invocation when LLM_CACHE_MODE is "disk" or "dynamodb"
+llm_cache = configure_llm_cache() if configure_llm_cache else None
+problem_pool = configure_problem_pool() if configure_problem_pool else None
+# Near-duplicate prompt lookups ("similar" reuse): loaded from the Problems table by a background
+# thread on first use and refreshed every PROMPT_INDEX_REFRESH_SECONDS
+prompt_index = PromptIndex()
+prompt_index_loading = threading.Lock()  # Held while a background load runs
+# SSE events logged per problem for reconnects (EVENT_LOG_TABLE_NAME); events of a problem get an `id:`
+event_log = configure_event_log(dynamodb)
+sse_sequence = EventSequence()
+
 # --- Pydantic Models for Structured Output ---
 
 
@@ -113,8 +248,15 @@ Valid JSON Output:
 """,
 )
 
+
 # Use LCEL
-intent_analysis_chain = intent_analysis_prompt_template | llm | intent_analysis_parser
+# Structured steps return raw JSON text, parsed with local repair in run_chain_step.
+# Chains are built per model, since each step is routed to its own model tier.
+def intent_analysis_chain(model):
+    return build_structured_chain(
+        intent_analysis_prompt_template, model, IntentAnalysisOutput, NATIVE_JSON_OUTPUT
+    )
+
 
 # Step 2: Solution Code Generation
 solution_generation_prompt_template = PromptTemplate(
@@ -139,10 +281,10 @@ Requirements:
 """,
 )
 
+
 # Use LCEL with StrOutputParser for raw string output
-solution_generation_chain = (
-    solution_generation_prompt_template | llm | StrOutputParser()
-)
+def solution_generation_chain(model):
+    return solution_generation_prompt_template | model | StrOutputParser()
 
 
 # Step 3: Test Case Generator Code Generation
@@ -172,8 +314,11 @@ Requirements:
 """,
 )
 
+
 # Use LCEL with StrOutputParser
-test_gen_chain = test_gen_prompt_template | llm | StrOutputParser()
+def test_gen_chain(model):
+    return test_gen_prompt_template | model | StrOutputParser()
+
 
 # Step 4: LLM-Based Validation
 validation_parser = PydanticOutputParser(pydantic_object=ValidationOutput)
@@ -211,8 +356,14 @@ Review Checklist:
 Valid JSON Output:
 """,
 )
+
+
 # Use LCEL
-validation_chain = validation_prompt_template | llm | validation_parser
+def validation_chain(model):
+    return build_structured_chain(
+        validation_prompt_template, model, ValidationOutput, NATIVE_JSON_OUTPUT
+    )
+
 
 # Step 5: Constraints Derivation
 constraints_derivation_parser = PydanticOutputParser(pydantic_object=ConstraintsOutput)
@@ -246,10 +397,13 @@ Valid JSON Output:
 """,
 )
 
+
 # Use LCEL
-constraints_derivation_chain = (
-    constraints_derivation_prompt_template | llm | constraints_derivation_parser
-)
+def constraints_derivation_chain(model):
+    return build_structured_chain(
+        constraints_derivation_prompt_template, model, ConstraintsOutput, NATIVE_JSON_OUTPUT
+    )
+
 
 # Step 6: Problem Description Generation
 description_generation_prompt_template = PromptTemplate(
@@ -288,21 +442,97 @@ Problem Description:
 """,
 )
 
+
 # Use LCEL with StrOutputParser
-description_generation_chain = (
-    description_generation_prompt_template | llm | StrOutputParser()
+def description_generation_chain(model):
+    return description_generation_prompt_template | model | StrOutputParser()
+
+
+# Re-ask used only when local repair of a structured output fails
+structured_output_reask_prompt_template = PromptTemplate(
+    input_variables=["error", "format_instructions", "bad_output"],
+    template="""
+The following output was supposed to be a JSON object matching the format instructions below, but it could not be parsed.
+
+Parse Error: {error}
+
+{format_instructions}
+
+Output To Fix:
+{bad_output}
+
+**CRITICAL:** Output **ONLY** the corrected JSON object, keeping the original content. No explanations or markdown.
+
+Valid JSON Output:
+""",
+)
+
+
+def structured_output_reask_chain(model):
+    return structured_output_reask_prompt_template | model | StrOutputParser()
+
+
+# Pipeline node name (or "reask") -> chain factory; models per step are set in model_routing.py
+model_router = ModelRouter(
+    create_llm,
+    {
+        "intent": intent_analysis_chain,
+        "solution": solution_generation_chain,
+        "test_generator": test_gen_chain,
+        "validation": validation_chain,
+        "constraints": constraints_derivation_chain,
+        "description": description_generation_chain,
+        "reask": structured_output_reask_chain,
+    },
 )
 
 
 # --- Helper Functions ---
-def send_sse(event_type, payload):
-    message = f"event: {event_type}\ndata: {json.dumps(payload)}\n\n"
+# Set for pool jobs, which run without a client: no SSE events and no token streaming
+_headless = contextvars.ContextVar("sse_headless", default=False)
+
+
+@contextmanager
+def headless_generation():
+    token = _headless.set(True)
+    try:
+        yield
+    finally:
+        _headless.reset(token)
+
+
+def token_streaming_enabled():
+    return TOKEN_STREAMING and not _headless.get()
+
+
+def write_sse_message(event_id, event_type, payload):
+    """Writes one SSE event; without `event_id` the client keeps its last event ID."""
+    event_id_line = f"id: {event_id}\n" if event_id is not None else ""
+    message = f"{event_id_line}event: {event_type}\ndata: {json.dumps(payload)}\n\n"
     sys.stdout.buffer.write(message.encode("utf-8"))
     sys.stdout.buffer.flush()
     if GENERATOR_VERBOSE:
         print(f"SSE Sent: {event_type} - {payload}")
 
 
+def send_sse(event_type, payload):
+    if _headless.get():
+        return  # Nobody is listening; the pool job's outcome is in its Problems item
+    tag = sse_tag()  # Batch members: index/problemId, so clients can demultiplex the stream
+    if tag:
+        payload = {**payload, **tag}
+    problem_id = (tag or {}).get("problemId") or logged_problem_id()
+    if not problem_id:
+        write_sse_message(None, event_type, payload)  # Not logged, so not resumable from
+        return
+    # IDs count the problem's events; sent and logged in ID order even from several threads
+    with sse_sequence.lock:
+        event_id = sse_sequence.next(problem_id)
+        write_sse_message(event_id, event_type, payload)
+        if event_log:
+            event_log.append(problem_id, event_id, event_type, payload)
+
+
 def update_dynamodb_status(
     table, problem_id, status=None, error_message=None, **kwargs
 ):
@@ -379,126 +609,229 @@ def clean_llm_output(output_string: str, expected_type: str = "code") -> str:
     return cleaned
 
 
-# --- Main Lambda Handler ---
-def lambda_handler(event, context):
-    # This handler is designed for AWS Lambda Function URL with RESPONSE_STREAM (SSE)
-    print("Event Received:", event)  # Log the event for debugging
-
-    # --- Write SSE Headers FIRST ---
-    # For Function URL Streaming, headers go to stdout before body goes to stdout.buffer
+# --- Generation Pipeline (dependency graph of chain nodes) ---
+async def parse_structured_output(step_num, raw_output, output_model, allow_reask=True):
+    """
+    Parses a structured step's raw text into `output_model`: local repairs first,
+    then (if `allow_reask`) at most STRUCTURED_OUTPUT_MAX_REASKS targeted re-asks of the LLM.
+    """
     try:
-        sys.stdout.write("HTTP/1.1 200 OK\r\n")
-        sys.stdout.write("Content-Type: text/event-stream\r\n")
-        sys.stdout.write("Cache-Control: no-cache\r\n")
-        sys.stdout.write("Connection: keep-alive\r\n")
-        sys.stdout.write("\r\n")  # End of headers
-        sys.stdout.flush()  # Ensure headers are sent
-        print("SSE Headers written to stdout.")
-    except Exception as header_err:
-        # If headers fail, we probably can't send a useful error response via stream
-        print(f"FATAL: Could not write headers to stdout: {header_err}")
-        return  # Exit early
+        with measure_parse():
+            parsed, repairs = parse_with_repair(raw_output, output_model)
+        if repairs:
+            print(f"Step {step_num}: output repaired locally ({', '.join(repairs)})")
+        return parsed
+    except OutputRepairError as e:
+        if not allow_reask:
+            raise
+        last_error = e
+
+    format_instructions = PydanticOutputParser(pydantic_object=output_model).get_format_instructions()
+    for attempt in range(1, STRUCTURED_OUTPUT_MAX_REASKS + 1):
+        print(f"Step {step_num}: local repair failed ({last_error}); re-asking LLM ({attempt}/{STRUCTURED_OUTPUT_MAX_REASKS})")
+        count_retry()
+        await wait_for_llm_slot()
+        with bypass_llm_cache():  # A cached answer would repeat the same mistake
+            raw_output = await model_router.chain("reask").ainvoke(
+                {
+                    "error": str(last_error)[:1000],
+                    "format_instructions": format_instructions,
+                    "bad_output": raw_output,
+                },
+                config={"callbacks": metrics_callbacks()},
+            )
+        try:
+            with measure_parse():
+                parsed, _ = parse_with_repair(raw_output, output_model)
+            return parsed
+        except OutputRepairError as e:
+            last_error = e
+    raise last_error
+
+
+async def stream_chain_text(step_num, chain, input_data, attempt=0):
+    """
+    Streams a string-output chain, forwarding coalesced chunks as SSE `token` events. Returns the full text.
+    Tokens carry the `attempt` number; a retried step starts over at attempt + 1 (see run_chain_step).
+    """
+    parts = []
+    coalescer = TokenCoalescer(
+        lambda text, seq: send_sse("token", {"step": step_num, "attempt": attempt, "seq": seq, "text": text})
+    )
+    async for chunk in chain.astream(input_data, config={"callbacks": metrics_callbacks()}):
+        parts.append(chunk)
+        coalescer.add(chunk)
+    coalescer.flush()
+    if GENERATOR_VERBOSE:
+        print(f"Step {step_num}: streamed {coalescer.chunks_in} chunks in {coalescer.events_out} token events")
+    return "".join(parts)
 
-    problem_id = None  # Initialize problem_id
-    problems_table = None  # Initialize table
 
+async def invoke_routed_chain(
+    step_num, node_name, input_data, output_model, stream_tokens, tier=None, temperature=None, attempt=0
+):
+    """Runs the node's chain on the model its route (or the retry `tier` / candidate `temperature`) selects."""
+    chain = model_router.chain(node_name, tier, temperature)
+    await wait_for_llm_slot()  # Batch requests share one rate limit across their pipelines
+    if stream_tokens and token_streaming_enabled():
+        output = await stream_chain_text(step_num, chain, input_data, attempt)
+    else:
+        output = await chain.ainvoke(input_data, config={"callbacks": metrics_callbacks()})
+    if output_model is not None:
+        # A node that can still escalate regenerates on the strong model instead of re-asking
+        allow_reask = tier is not None or not model_router.can_escalate(node_name)
+        output = await parse_structured_output(step_num, output, output_model, allow_reask)
+    return output
+
+
+async def invoke_with_budget(
+    deadline, step_num, node_name, input_data, output_model, stream_tokens, tier=None, temperature=None, attempt=0
+):
+    """invoke_routed_chain bounded by the route's time budget and the invocation deadline."""
+    deadline.check(f"step {step_num}")
+    timeout = deadline.timeout_for(model_router.route(node_name, tier).timeout_seconds)
     try:
-        # 1. Parse Input
-        body = json.loads(event.get("body", "{}"))
-        user_prompt = body.get("prompt", "")
-        difficulty = body.get("difficulty", "Medium")
-
-        if not user_prompt:
-            raise ValueError("User prompt is missing.")
-
-        problem_id = str(uuid.uuid4())
-        print(
-            f"Generating problem {problem_id} for prompt: '{user_prompt}' ({difficulty})"
+        return await asyncio.wait_for(
+            invoke_routed_chain(
+                step_num, node_name, input_data, output_model, stream_tokens, tier, temperature, attempt
+            ),
+            timeout=timeout,
+        )
+    except asyncio.TimeoutError:
+        deadline.check(f"step {step_num}")  # Cut short by the deadline rather than the step budget
+        raise asyncio.TimeoutError(
+            f"{model_router.model_name(node_name, tier)} did not finish step {step_num} within {timeout:.0f}s"
         )
 
-        # Initialize DynamoDB Table
-        problems_table = dynamodb.Table(PROBLEMS_TABLE_NAME)
 
-        # Create initial DynamoDB record
-        initial_item = {
-            "problemId": problem_id,
-            "userPrompt": user_prompt,
-            "difficulty": difficulty,
-            "generationStatus": "started",
-            "createdAt": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
-            "language": DEFAULT_LANGUAGE,
-        }
-        try:
-            problems_table.put_item(
-                Item=initial_item, ConditionExpression="attribute_not_exists(problemId)"
-            )
-            print(f"Initial DynamoDB record created for {problem_id}")
-        except Exception as e:
-            # Handle potential race condition or error if item already exists
-            print(
-                f"Warning: Could not create initial DynamoDB record for {problem_id} (maybe exists?): {e}"
-            )
-            # Attempt to update status anyway, assuming record might exist
-            update_dynamodb_status(problems_table, problem_id, status="restarted")
-
-        # Helper function for running chains and handling errors
-        def run_chain_step(
-            step_num, chain, input_data, output_key
-        ):  # Removed expected_format
-            nonlocal problems_table, problem_id  # Allow modifying outer scope vars
+async def run_chain_step(
+    status_writer,
+    deadline,
+    step_num,
+    node_name,
+    input_data,
+    output_key,
+    output_model=None,
+    stream_tokens=False,
+):
+    """
+    Invokes the chain of pipeline node `node_name` asynchronously on its routed model, within the
+    route's time budget. A failed fast-tier attempt is retried once on the strong tier, a timed-out
+    strong-tier attempt once on the fast tier. On failure marks the step failed and re-raises;
+    DeadlineExceeded is left to the handler, which checkpoints the run as resumable.
+    With `output_model` the raw text is parsed (and repaired if needed) into that Pydantic model.
+    With `stream_tokens` the text is streamed to the client while it is generated.
+    """
+    try:
+        # Wall time, time to first token, token usage, parse time and retries are recorded per node.
+        # The output will be a Pydantic model for steps 1, 4, 5
+        # or a string for steps 2, 3, 6
+        with measure_step(node_name):
             try:
-                # Invoke the LCEL chain
-                # The output will be a Pydantic model for steps 1, 4, 5
-                # or a string for steps 2, 3, 6
-                output = chain.invoke(input_data)
-
-                # Logging based on type
-                if isinstance(output, BaseModel):
-                    print(
-                        f"Step {step_num} Output ({output.__class__.__name__}): {output.dict()}"
-                    )
-                else:  # Assumed string for code/text steps
-                    print(
-                        f"Step {step_num} Output (String):\n{output[:500]}{'...' if len(output) > 500 else ''}"
-                    )  # Log preview
-
-                return output
-            # PydanticOutputParser raises OutputParserException on failure
-            except (
-                Exception
-            ) as e:  # Catch broader exceptions, including OutputParserException
-                error_msg = f"Error in Step {step_num} ({output_key}): {e}"
-                # Attempt to log raw output if available in exception context (might not always work)
-                raw_output_preview = ""
-                if hasattr(e, "llm_output"):
-                    raw_output_preview = str(e.llm_output)[:500]
-                elif hasattr(e, "args") and len(e.args) > 0:
-                    raw_output_preview = str(e.args[0])[:500]  # Generic fallback
-                print(f"Error: {error_msg}. Raw Output Preview: {raw_output_preview}")
-
-                traceback.print_exc()
-                update_dynamodb_status(
-                    problems_table,
-                    problem_id,
-                    status=f"step{step_num}_failed",
-                    errorMessage=error_msg,
+                output = await invoke_with_budget(
+                    deadline, step_num, node_name, input_data, output_model, stream_tokens
+                )
+            except (asyncio.CancelledError, DeadlineExceeded):
+                raise
+            except Exception as e:
+                retry_tier = model_router.fallback_tier(node_name, timed_out=isinstance(e, asyncio.TimeoutError))
+                if retry_tier is None:
+                    raise
+                failed_model = model_router.model_name(node_name)
+                retry_model = model_router.model_name(node_name, retry_tier)
+                escalated = model_router.can_escalate(node_name)
+                print(f"Step {step_num}: {failed_model} failed ({e}); retrying with {retry_model}")
+                count_retry()
+                send_sse(
+                    "status",
+                    {
+                        "step": step_num,
+                        "node": node_name,
+                        "state": "escalated" if escalated else "fallback",
+                        "model": retry_model,
+                        "remainingMs": deadline.remaining_ms(),
+                        "message": (
+                            f"Retrying step {step_num} with a stronger model..."
+                            if escalated
+                            else f"Step {step_num} timed out; retrying with a faster model..."
+                        ),
+                    },
+                )
+                if stream_tokens and token_streaming_enabled():
+                    # The failed attempt's tokens already reached the client; it discards them and
+                    # only shows tokens of the new attempt
+                    send_sse("token_reset", {"step": step_num, "node": node_name, "attempt": 1})
+                output = await invoke_with_budget(
+                    deadline, step_num, node_name, input_data, output_model, stream_tokens, retry_tier, attempt=1
                 )
-                send_sse("error", {"payload": error_msg})
-                raise e  # Re-raise exceptions
 
-        # == PIPELINE START ==
-        send_sse(
-            "status",
-            {"step": 1, "message": "Analyzing prompt and designing test cases..."},
+        # Logging based on type
+        if isinstance(output, BaseModel):
+            print(f"Step {step_num} Output ({output.__class__.__name__}): {output.dict()}")
+        else:  # Assumed string for code/text steps
+            print(
+                f"Step {step_num} Output (String):\n{output[:500]}{'...' if len(output) > 500 else ''}"
+            )  # Log preview
+
+        return output
+    except asyncio.CancelledError:
+        raise  # A sibling node failed; not an error of this step
+    except DeadlineExceeded:
+        raise  # Not a step failure; the handler checkpoints the run as resumable
+    except Exception as e:  # Catch broader exceptions, including OutputRepairError
+        error_msg = f"Error in Step {step_num} ({output_key}): {e}"
+        # Attempt to log raw output if available in exception context (might not always work)
+        raw_output_preview = ""
+        if hasattr(e, "llm_output"):
+            raw_output_preview = str(e.llm_output)[:500]
+        elif hasattr(e, "args") and len(e.args) > 0:
+            raw_output_preview = str(e.args[0])[:500]  # Generic fallback
+        print(f"Error: {error_msg}. Raw Output Preview: {raw_output_preview}")
+
+        traceback.print_exc()
+        status_writer.update(
+            flush=True,
+            status=f"step{step_num}_failed",
+            errorMessage=error_msg,
         )
+        send_sse("error", {"payload": error_msg})
+        raise e  # Re-raise exceptions
+
+
+def build_generation_pipeline(status_writer, deadline):
+    """
+    Declares the six generation steps as a dependency graph. After the solution exists,
+    test generator code (3) and constraints (5) run concurrently, and validation (4)
+    overlaps with constraints / description (5, 6). Every step runs within `deadline`.
+    """
+    execution_validation = VALIDATION_MODE == "execution" and bool(RUN_CODE_LAMBDA_NAME)
+    # Best-of-N solution candidates can only be told apart by running them (step 4)
+    solution_candidate_variants = candidate_variants() if execution_validation else []
+    # Large step 1 spec sets reach steps 2-5 as representative cases plus a summary
+    prompt_budget = PromptBudget()
+
+    def budgeted_input(node_name, prompt_template, state, step_input):
+        """Adds the step's (possibly compacted) test specs to `step_input` and records the tokens saved."""
+        step_input["test_specs"] = prompt_budget.spec_text(node_name, state["test_specs"])
+        prompt_budget.record(node_name, prompt_template, step_input, state["test_specs_str"])
+        status_writer.update(promptBudget=prompt_budget.report())
+        return step_input
+
+    async def analyze_intent(state):
         step1_input = {
-            "user_prompt": user_prompt,
-            "difficulty": difficulty,
+            "user_prompt": state["user_prompt"],
+            "difficulty": state["difficulty"],
             "language": DEFAULT_LANGUAGE,
         }
         # Output is IntentAnalysisOutput model
-        step1_output: IntentAnalysisOutput = run_chain_step(
-            1, intent_analysis_chain, step1_input, "Intent/Tests"
+        step1_output: IntentAnalysisOutput = await run_chain_step(
+            status_writer,
+            deadline,
+            1,
+            "intent",
+            step1_input,
+            "Intent/Tests",
+            output_model=IntentAnalysisOutput,
         )
         analyzed_intent = step1_output.analyzed_intent
         test_specs = step1_output.test_specs  # This is Union[List[dict], str]
@@ -507,114 +840,215 @@ def lambda_handler(event, context):
             raise ValueError("Step 1 failed to produce valid intent and test specs.")
         # Store test_specs as JSON string in DynamoDB
         test_specs_str = json.dumps(test_specs)
-        update_dynamodb_status(
-            problems_table,
-            problem_id,
+        status_writer.update(
+            flush=True,
             status="step1_complete",
             analyzedIntent=analyzed_intent,
             testSpecifications=test_specs_str,
         )
-
-        send_sse("status", {"step": 2, "message": "Generating solution code..."})
-        step2_input = {
+        return {
             "analyzed_intent": analyzed_intent,
-            "test_specs": test_specs_str,  # Pass JSON string representation
-            "language": DEFAULT_LANGUAGE,
+            "test_specs": test_specs,
+            "test_specs_str": test_specs_str,
         }
-        # Output is a string
-        solution_code_raw = run_chain_step(
-            2,
-            solution_generation_chain,
-            step2_input,
-            "Solution Code",
+
+    async def generate_solution(state):
+        step2_input = budgeted_input(
+            "solution",
+            solution_generation_prompt_template,
+            state,
+            {"analyzed_intent": state["analyzed_intent"], "language": DEFAULT_LANGUAGE},
         )
+        # Best-of-N: extra candidates are generated alongside the routed (primary) solution
+        extra_candidates = [
+            asyncio.ensure_future(generate_solution_candidate(index, tier, temperature, step2_input))
+            for index, (tier, temperature) in enumerate(solution_candidate_variants, start=1)
+        ]
+        try:
+            solution_code_raw = await run_chain_step(
+                status_writer,
+                deadline,
+                2,
+                "solution",
+                step2_input,
+                "Solution Code",
+                stream_tokens=True,
+            )
+        except BaseException:
+            for task in extra_candidates:
+                task.cancel()
+            raise
         # Clean the raw code output
         solution_code = clean_llm_output(solution_code_raw, expected_type="code")
-        update_dynamodb_status(
-            problems_table,
-            problem_id,
+        status_writer.update(
+            flush=True,
             status="step2_complete",
             solutionCode=solution_code,
         )
-
-        send_sse("status", {"step": 3, "message": "Generating test case code..."})
-        step3_input = {
-            "test_specs": test_specs_str,  # Pass JSON string representation
-            "solution_code": solution_code,
-            "language": DEFAULT_LANGUAGE,
-        }
-        # Output is a string
-        test_gen_code_raw = run_chain_step(
-            3, test_gen_chain, step3_input, "Test Gen Code"
+        if not extra_candidates:
+            return {"solution_code": solution_code}
+        candidates = [solution_code] + [code for code in await asyncio.gather(*extra_candidates) if code]
+        print(f"Step 2: {len(candidates)} solution candidates for execution-based selection")
+        return {"solution_code": solution_code, "solution_candidates": candidates}
+
+    async def generate_solution_candidate(index, tier, temperature, step2_input):
+        """One extra best-of-N candidate. A failed candidate is dropped (None), not a step failure."""
+        try:
+            with measure_step("solution_candidates"):
+                output = await invoke_with_budget(
+                    deadline, 2, "solution", step2_input, None, False, tier, temperature
+                )
+            return clean_llm_output(output, expected_type="code")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Step 2: solution candidate {index} ({tier}, temperature {temperature}) failed: {e}")
+            return None
+
+    async def generate_test_generator(state):
+        step3_input = budgeted_input(
+            "test_generator",
+            test_gen_prompt_template,
+            state,
+            {"solution_code": state["solution_code"], "language": DEFAULT_LANGUAGE},
+        )
+        test_gen_code_raw = await run_chain_step(
+            status_writer,
+            deadline,
+            3,
+            "test_generator",
+            step3_input,
+            "Test Gen Code",
+            stream_tokens=True,
         )
         # Clean the raw code output
         test_gen_code = clean_llm_output(test_gen_code_raw, expected_type="code")
-        update_dynamodb_status(
-            problems_table,
-            problem_id,
+        status_writer.update(
+            flush=True,
             status="step3_complete",
             testGeneratorCode=test_gen_code,
         )
+        return {"test_gen_code": test_gen_code}
+
+    async def validate(state):
+        if execution_validation:
+            return await validate_with_execution(state)
+        return await validate_with_llm(state)
+
+    async def validate_with_execution(state):
+        deadline.check("step 4")
+        candidates = state.get("solution_candidates") or [state["solution_code"]]
+        if len(candidates) > 1:
+            validate = functools.partial(select_solution_by_execution, candidates, state["test_gen_code"])
+        else:
+            validate = functools.partial(validate_by_execution, state["solution_code"], state["test_gen_code"])
+        try:
+            # The executor thread cannot be cancelled; on timeout the invocation is checkpointed anyway
+            with measure_step("validation"):
+                outcome = await asyncio.wait_for(asyncio.to_thread(validate), timeout=deadline.usable_seconds())
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded("Execution validation (step 4) did not finish before the invocation deadline.")
+        except Exception as e:
+            error_msg = f"Error in Step 4 (Execution Validation): {e}"
+            print(f"Error: {error_msg}")
+            traceback.print_exc()
+            status_writer.update(flush=True, status="step4_failed", errorMessage=error_msg)
+            send_sse("error", {"payload": error_msg})
+            raise
+        print(f"Step 4 Output (Execution Validation): {outcome['status']} {outcome['stats']}")
 
-        # Step 4: LLM-Based Validation (Interim Step)
-        send_sse(
-            "status",
-            {"step": 4, "message": "Validating generated code (LLM Review)..."},
-        )
-        step4_input = {
-            "solution_code": solution_code,
-            "test_gen_code": test_gen_code,
-            "test_specs": test_specs_str,  # Pass JSON string representation
-            "language": DEFAULT_LANGUAGE,
+        validation_result = ValidationOutput(status=outcome["status"], details=outcome["details"])
+        if outcome["status"] != "Pass":
+            error_msg = f"Execution validation failed: {outcome['details']}"
+            status_writer.update(flush=True, status="step4_failed", errorMessage=error_msg)
+            send_sse("error", {"payload": error_msg})
+            raise ValueError(error_msg)
+
+        final_test_cases_str = json.dumps(outcome["final_test_cases"])
+        updates = {
+            "validation_result": validation_result,
+            "final_test_cases_str": final_test_cases_str,
         }
+        attributes = {}
+        selected_code = candidates[outcome.get("selected_index", 0)]
+        if selected_code != state["solution_code"]:
+            print(f"Step 4: selected solution candidate {outcome['selected_index']} over the primary solution")
+            updates["solution_code"] = attributes["solutionCode"] = selected_code
+        status_writer.update(
+            flush=True,
+            status="step4_complete",
+            validationDetails=json.dumps({**validation_result.dict(), **outcome["stats"]}),
+            finalTestCases=final_test_cases_str,  # Read by code-grader
+            **attributes,
+        )
+        return updates
+
+    async def validate_with_llm(state):
+        step4_input = budgeted_input(
+            "validation",
+            validation_prompt_template,
+            state,
+            {
+                "solution_code": state["solution_code"],
+                "test_gen_code": state["test_gen_code"],
+                "language": DEFAULT_LANGUAGE,
+            },
+        )
         # Output is ValidationOutput model
-        validation_result: ValidationOutput = run_chain_step(
-            4, validation_chain, step4_input, "Validation"
+        validation_result: ValidationOutput = await run_chain_step(
+            status_writer,
+            deadline,
+            4,
+            "validation",
+            step4_input,
+            "Validation",
+            output_model=ValidationOutput,
         )
-        print(f"Step 4 Output (Validation): {validation_result.dict()}")
         if validation_result.status.lower() != "pass":
             error_msg = f"LLM Validation failed: {validation_result.details}"
-            update_dynamodb_status(
-                problems_table,
-                problem_id,
-                status="step4_failed",
-                errorMessage=error_msg,
-            )
+            status_writer.update(flush=True, status="step4_failed", errorMessage=error_msg)
             send_sse("error", {"payload": error_msg})
             raise ValueError(error_msg)
-        update_dynamodb_status(
-            problems_table,
-            problem_id,
+        status_writer.update(
+            flush=True,
             status="step4_complete",
             validationDetails=validation_result.json(),  # Store as JSON string
         )
-        send_sse("status", {"step": 4, "message": "Validation successful!"})
-
-        send_sse("status", {"step": 5, "message": "Deriving problem constraints..."})
-        step5_input = {
-            "solution_code": solution_code,
-            "test_specs": test_specs_str,  # Pass JSON string representation
-            "language": DEFAULT_LANGUAGE,
-            "difficulty": difficulty,
-        }
+        return {"validation_result": validation_result}
+
+    async def derive_constraints(state):
+        step5_input = budgeted_input(
+            "constraints",
+            constraints_derivation_prompt_template,
+            state,
+            {
+                "solution_code": state["solution_code"],
+                "language": DEFAULT_LANGUAGE,
+                "difficulty": state["difficulty"],
+            },
+        )
         # Output is ConstraintsOutput model
-        constraints: ConstraintsOutput = run_chain_step(
-            5, constraints_derivation_chain, step5_input, "Constraints"
+        constraints: ConstraintsOutput = await run_chain_step(
+            status_writer,
+            deadline,
+            5,
+            "constraints",
+            step5_input,
+            "Constraints",
+            output_model=ConstraintsOutput,
         )
-        constraints_json = (
-            constraints.json()
-        )  # Convert model to JSON string for storage/later steps
-        update_dynamodb_status(
-            problems_table,
-            problem_id,
+        constraints_json = constraints.json()  # Convert model to JSON string for storage/later steps
+        status_writer.update(
+            flush=True,
             status="step5_complete",
             constraints=constraints_json,
+            timeLimitSeconds=Decimal(str(constraints.time_limit_seconds)),  # Read by code-grader
         )
+        return {"constraints_json": constraints_json}
 
-        send_sse(
-            "status", {"step": 6, "message": "Generating final problem description..."}
-        )
+    async def generate_description(state):
         # Use a subset of original specs for examples if they were structured
+        test_specs = state["test_specs"]
         example_specs_str = "[]"
         if isinstance(test_specs, list):
             example_specs_str = json.dumps(test_specs[:2])
@@ -622,72 +1056,711 @@ def lambda_handler(event, context):
             example_specs_str = test_specs  # Use the string representation
 
         step6_input = {
-            "analyzed_intent": analyzed_intent,
-            "constraints": constraints_json,  # Pass JSON string
+            "analyzed_intent": state["analyzed_intent"],
+            "constraints": state["constraints_json"],  # Pass JSON string
             "test_specs": example_specs_str,  # Pass example JSON string
-            "difficulty": difficulty,
+            "difficulty": state["difficulty"],
             "language": DEFAULT_LANGUAGE,
         }
-        # Output is a string
-        problem_description_raw = run_chain_step(
+        problem_description_raw = await run_chain_step(
+            status_writer,
+            deadline,
             6,
-            description_generation_chain,
+            "description",
             step6_input,
             "Description",
+            stream_tokens=True,
         )
         # Clean the text output (basic strip)
-        problem_description = clean_llm_output(
-            problem_description_raw, expected_type="text"
-        )
-        update_dynamodb_status(
-            problems_table,
-            problem_id,
+        problem_description = clean_llm_output(problem_description_raw, expected_type="text")
+        status_writer.update(
+            flush=True,
             status="step6_complete",
             description=problem_description,
         )
+        return {"problem_description": problem_description}
+
+    # Steps 5 and 6 describe the stored solution: with best-of-N they wait for step 4 to pick it,
+    # otherwise step 5 runs alongside steps 3-4
+    constraints_deps = ["validation"] if solution_candidate_variants else ["solution"]
+    return [
+        PipelineNode("intent", 1, analyze_intent, [], "Analyzing prompt and designing test cases..."),
+        PipelineNode("solution", 2, generate_solution, ["intent"], "Generating solution code..."),
+        PipelineNode("test_generator", 3, generate_test_generator, ["solution"], "Generating test case code..."),
+        PipelineNode("validation", 4, validate, ["test_generator"], "Validating generated code..."),
+        PipelineNode("constraints", 5, derive_constraints, constraints_deps, "Deriving problem constraints..."),
+        PipelineNode("description", 6, generate_description, ["constraints"], "Generating final problem description..."),
+    ]
+
+
+def send_node_status(kind, node, info, deadline=None):
+    """Forwards scheduler node events to the client as SSE `status` events (with the remaining time budget)."""
+    payload = {"step": node.step, "node": node.name, "state": kind}
+    if deadline:
+        payload["remainingMs"] = deadline.remaining_ms()
+    if kind == "started":
+        payload["message"] = node.message
+    elif kind == "completed":
+        payload["message"] = f"Step {node.step} ({node.name}) complete."
+        payload["elapsedMs"] = info.get("elapsedMs")
+    else:
+        payload["message"] = f"Step {node.step} ({node.name}) failed."
+    send_sse("status", payload)
+
+
+async def run_generation_pipeline(status_writer, deadline, state, completed=None):
+    nodes = build_generation_pipeline(status_writer, deadline)
+    completed = resolve_completed_nodes(nodes, completed or [])
+
+    def on_event(kind, node, info):
+        send_node_status(kind, node, info, deadline)
 
-        send_sse("status", {"step": 7, "message": "Finalizing and saving..."})
-        # Step 7: Finalization
-        problem_title = f"Generated Problem: {analyzed_intent[:50]}... ({difficulty})"  # TODO: Improve title generation?
-        # Update final status in DynamoDB (most data already saved)
-        update_dynamodb_status(
-            problems_table,
-            problem_id,
-            status="completed",
-            title=problem_title,
-            completedAt=time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    try:
+        return await run_dag(nodes, state, on_event=on_event, completed=completed)
+    except PipelineError as e:
+        raise e.original  # Step-level status/SSE were already recorded by the node
+
+
+def finalize_generation(status_writer, state, problem_id, created_at):
+    """Step 7: marks the item completed and returns the final problem object sent to the client."""
+    analyzed_intent = state["analyzed_intent"]
+    difficulty = state["difficulty"]
+    send_sse("status", {"step": 7, "message": "Finalizing and saving..."})
+    problem_title = f"Generated Problem: {analyzed_intent[:50]}... ({difficulty})"  # TODO: Improve title generation?
+    # Update final status in DynamoDB (most data already saved)
+    completed_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    status_writer.update(
+        status="completed",
+        title=problem_title,
+        completedAt=completed_at,
+    )
+    status_writer.close()  # Final flush before the result is reported
+    print(f"Step 7: Final status updated in DynamoDB for problem {problem_id}.")
+
+    # Construct the final problem object from variables (no need to fetch again)
+    return {
+        "problemId": problem_id,
+        "title": problem_title,
+        "description": state["problem_description"],
+        "difficulty": difficulty,
+        "constraints": state["constraints_json"],  # Use JSON string
+        "solutionCode": state["solution_code"],
+        "testGeneratorCode": state["test_gen_code"],
+        "analyzedIntent": analyzed_intent,
+        "testSpecifications": state["test_specs_str"],  # Use JSON string
+        "finalTestCases": state.get("final_test_cases_str"),  # None with LLM-only validation
+        "generationStatus": "completed",
+        "language": DEFAULT_LANGUAGE,
+        "createdAt": created_at,  # Kept in memory, no re-read
+        "completedAt": completed_at,
+    }
+
+
+# --- Resume From the Last Completed Step ---
+def restore_pipeline_state(item):
+    """
+    Rebuilds the pipeline state from a Problems item written by an earlier (failed) run.
+    Returns (state, restored_node_names); a node counts as restored when all its outputs were stored.
+    """
+    state = {"user_prompt": item.get("userPrompt", ""), "difficulty": item.get("difficulty", "Medium")}
+    restored = []
+
+    if item.get("analyzedIntent") and item.get("testSpecifications"):
+        state["analyzed_intent"] = item["analyzedIntent"]
+        state["test_specs_str"] = item["testSpecifications"]
+        state["test_specs"] = json.loads(item["testSpecifications"])
+        restored.append("intent")
+    if item.get("solutionCode"):
+        state["solution_code"] = item["solutionCode"]
+        restored.append("solution")
+    if item.get("testGeneratorCode"):
+        state["test_gen_code"] = item["testGeneratorCode"]
+        restored.append("test_generator")
+    if item.get("validationDetails"):
+        details = json.loads(item["validationDetails"])
+        validation_result = ValidationOutput(status=details.get("status", ""), details=details.get("details", ""))
+        # Execution validation also stores finalTestCases; without them the step has to run again
+        needs_test_cases = VALIDATION_MODE == "execution" and bool(RUN_CODE_LAMBDA_NAME)
+        if validation_result.status.lower() == "pass" and (item.get("finalTestCases") or not needs_test_cases):
+            state["validation_result"] = validation_result
+            state["final_test_cases_str"] = item.get("finalTestCases")
+            restored.append("validation")
+    if item.get("constraints"):
+        state["constraints_json"] = item["constraints"]
+        restored.append("constraints")
+    if item.get("description"):
+        state["problem_description"] = item["description"]
+        restored.append("description")
+    return state, restored
+
+
+def resolve_completed_nodes(nodes, restored):
+    """Keeps only restored nodes whose dependencies are complete too (nodes are declared in topological order)."""
+    completed = []
+    for node in nodes:
+        if node.name in restored and all(dep in completed for dep in node.deps):
+            completed.append(node.name)
+    return completed
+
+
+def is_failed_status(status):
+    return status in ("failed", "interrupted") or bool(re.fullmatch(r"step\d+_failed", status or ""))
+
+
+def claim_problem_for_resume(problems_table, problem_id):
+    """
+    Loads a failed/interrupted generation and marks it as resuming. Raises ValueError if it cannot be resumed.
+    Any other unfinished status may belong to a generation that is still running, so it is only claimed
+    once the item has not been updated for RESUME_STALE_SECONDS (its invocation must have died).
+    """
+    item = problems_table.get_item(Key={"problemId": problem_id}).get("Item")
+    if not item:
+        raise ValueError(f"Problem {problem_id} not found.")
+    status = item.get("generationStatus")
+    if status == "completed":
+        raise ValueError(f"Problem {problem_id} is already completed.")
+    # Conditional on the status we read, so two resume requests cannot run the same problem
+    condition = "#genStatus = :current"
+    values = {":resuming": "resuming", ":current": status, ":one": 1, ":now": int(time.time())}
+    if not is_failed_status(status):
+        updated_at = item.get("updatedAt")
+        if updated_at is None or time.time() - int(updated_at) < RESUME_STALE_SECONDS:
+            raise ValueError(f"Problem {problem_id} is still generating ({status}); it cannot be resumed.")
+        # ...and on no write since, so a generation that just made progress is never taken over
+        condition += " AND updatedAt = :updatedAt"
+        values[":updatedAt"] = updated_at
+    try:
+        problems_table.update_item(
+            Key={"problemId": problem_id},
+            UpdateExpression="SET #genStatus = :resuming, updatedAt = :now ADD resumeCount :one",
+            ConditionExpression=condition,
+            ExpressionAttributeNames={"#genStatus": "generationStatus"},
+            ExpressionAttributeValues=values,
         )
-        print(f"Step 7: Final status updated in DynamoDB for problem {problem_id}.")
-
-        # Construct the final problem object from variables (no need to fetch again)
-        final_problem = {
-            "problemId": problem_id,
-            "title": problem_title,
-            "description": problem_description,
-            "difficulty": difficulty,
-            "constraints": constraints_json,  # Use JSON string
-            "solutionCode": solution_code,
-            "testGeneratorCode": test_gen_code,
-            "analyzedIntent": analyzed_intent,
-            "testSpecifications": test_specs_str,  # Use JSON string
-            "generationStatus": "completed",
-            "language": DEFAULT_LANGUAGE,
-            "createdAt": problems_table.get_item(Key={"problemId": problem_id})
-            .get("Item", {})
-            .get("createdAt"),  # Fetch createdAt if needed
-            "completedAt": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
-        }
+    except problems_table.meta.client.exceptions.ConditionalCheckFailedException:
+        raise ValueError(f"Problem {problem_id} changed concurrently (another resume?).")
+    return item
+
+
+# --- Reuse of Completed Problems ---
+def get_prompt_index(problems_table):
+    """
+    The in-memory prompt reuse index. When stale it is rebuilt by a background thread, so requests
+    never wait for the scan: until the first load finishes, lookups see an empty index.
+    """
+    stale = time.time() - prompt_index.loaded_at > PROMPT_INDEX_REFRESH_SECONDS
+    if stale and prompt_index_loading.acquire(blocking=False):
+        threading.Thread(target=load_prompt_index, args=(problems_table,), daemon=True).start()
+    return prompt_index
+
+
+def load_prompt_index(problems_table):
+    """Rebuilds the prompt reuse index (at most PROMPT_INDEX_MAX_ITEMS problems); kept as is if that fails."""
+    global prompt_index
+    try:
+        fresh_index = PromptIndex()
+        count = fresh_index.load_from_table(problems_table, max_items=PROMPT_INDEX_MAX_ITEMS)
+        prompt_index = fresh_index
+        print(f"Prompt reuse index loaded: {count} completed problems")
+    except Exception as e:
+        print(f"Warning: Could not load prompt reuse index: {e}")
+        prompt_index.loaded_at = time.time()  # Do not retry the scan on every request
+    finally:
+        prompt_index_loading.release()
+
+
+def find_problem_by_prompt_key(problems_table, user_prompt, difficulty):
+    """
+    Newest completed problem with the same normalized prompt and difficulty (PROMPT_KEY_INDEX_NAME query).
+    Falls back to the in-memory index if the query fails, e.g. before the GSI exists.
+    """
+    query_kwargs = {
+        "IndexName": PROMPT_KEY_INDEX_NAME,
+        "KeyConditionExpression": "promptKey = :key",
+        "FilterExpression": "generationStatus = :completed",
+        "ExpressionAttributeValues": {":key": prompt_key(user_prompt, difficulty), ":completed": "completed"},
+        "ScanIndexForward": False,
+    }
+    try:
+        while True:
+            response = problems_table.query(**query_kwargs)
+            if response.get("Items"):
+                return response["Items"][0]["problemId"]
+            if "LastEvaluatedKey" not in response:
+                return None
+            query_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+    except Exception as e:
+        print(f"Warning: Prompt key lookup failed, using the in-memory index: {e}")
+        return get_prompt_index(problems_table).find_exact(user_prompt, difficulty)
+
+
+def find_reusable_problem(problems_table, user_prompt, difficulty):
+    """
+    Looks up a completed problem for an equivalent prompt. Returns (item, similarity, serve):
+    `serve` means the stored problem can be returned as is, otherwise its step 1 output is a seed.
+    Returns (None, 0.0, False) when nothing matches.
+    """
+    if PROMPT_REUSE_MODE not in ("exact", "similar"):
+        return None, 0.0, False
+    problem_id, similarity = find_problem_by_prompt_key(problems_table, user_prompt, difficulty), 1.0
+    if not problem_id and PROMPT_REUSE_MODE == "similar":
+        index = get_prompt_index(problems_table)
+        match = index.find_similar(user_prompt, difficulty, PROMPT_REUSE_SEED_SIMILARITY)
+        if match:
+            problem_id, similarity = match
+    if not problem_id:
+        return None, 0.0, False
+    item = problems_table.get_item(Key={"problemId": problem_id}).get("Item")
+    if not item or item.get("generationStatus") != "completed" or item.get("algorithmType"):
+        return None, 0.0, False  # Pool problems are only handed out by claim_pooled_problem
+    return item, similarity, similarity >= PROMPT_REUSE_SERVE_SIMILARITY
+
+
+def stored_final_problem(item):
+    """The final problem object (as built by finalize_generation) of a completed Problems item."""
+    return {
+        "problemId": item["problemId"],
+        "title": item.get("title"),
+        "description": item.get("description"),
+        "difficulty": item.get("difficulty"),
+        "constraints": item.get("constraints"),
+        "solutionCode": item.get("solutionCode"),
+        "testGeneratorCode": item.get("testGeneratorCode"),
+        "analyzedIntent": item.get("analyzedIntent"),
+        "testSpecifications": item.get("testSpecifications"),
+        "finalTestCases": item.get("finalTestCases"),
+        "generationStatus": item.get("generationStatus"),
+        "language": item.get("language", DEFAULT_LANGUAGE),
+        "createdAt": item.get("createdAt"),
+        "completedAt": item.get("completedAt"),
+    }
+
+
+def create_problem_record(problems_table, user_prompt, difficulty, **attributes):
+    """Creates the initial Problems item of a new generation. Returns (problem_id, created_at)."""
+    problem_id = str(uuid.uuid4())
+    print(f"Generating problem {problem_id} for prompt: '{user_prompt}' ({difficulty})")
+
+    # Create initial DynamoDB record
+    initial_item = {
+        "problemId": problem_id,
+        "userPrompt": user_prompt,
+        "difficulty": difficulty,
+        "generationStatus": "started",
+        "createdAt": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "updatedAt": int(time.time()),  # Refreshed by every StatusWriter write (resume staleness)
+        "language": DEFAULT_LANGUAGE,
+        **attributes,
+    }
+    if "algorithmType" not in attributes:
+        # Pool problems stay out of PROMPT_KEY_INDEX_NAME (sparse GSI): they are claimed, not reused
+        initial_item["promptKey"] = prompt_key(user_prompt, difficulty)
+    try:
+        problems_table.put_item(
+            Item=initial_item, ConditionExpression="attribute_not_exists(problemId)"
+        )
+        print(f"Initial DynamoDB record created for {problem_id}")
+    except Exception as e:
+        # Handle potential race condition or error if item already exists
+        print(
+            f"Warning: Could not create initial DynamoDB record for {problem_id} (maybe exists?): {e}"
+        )
+        # Attempt to update status anyway, assuming record might exist
+        update_dynamodb_status(problems_table, problem_id, status="restarted")
+    return problem_id, initial_item["createdAt"]
+
+
+# --- Batch Generation (several problems on one SSE stream) ---
+async def generate_batch_member(problems_table, deadline, batch_id, index, user_prompt, difficulty):
+    """Runs one member pipeline of a batch. Its SSE events carry `index` and `problemId`."""
+    tag_sse_events(index=index)
+    problem_id, created_at = await asyncio.to_thread(
+        create_problem_record, problems_table, user_prompt, difficulty, batchId=batch_id
+    )
+    tag_sse_events(problemId=problem_id)
+    status_writer = StatusWriter(problems_table, problem_id, verbose=GENERATOR_VERBOSE)
+    metrics = GenerationMetrics(POOL_GENERATOR_NAME, problem_id) if GenerationMetrics else None
+    try:
+        state = {"user_prompt": user_prompt, "difficulty": difficulty}
+        with use_generation_metrics(metrics):
+            state = await run_generation_pipeline(status_writer, deadline, state)
+        if metrics:
+            status_writer.update(generationMetrics=metrics.summary())
+        # finalize_generation blocks on the final DynamoDB flush; keep the other members running
+        final_problem = await asyncio.to_thread(finalize_generation, status_writer, state, problem_id, created_at)
+        prompt_index.add(problem_id, user_prompt, difficulty)
+        result_event = {"payload": final_problem}
+        if metrics:
+            result_event["timing"] = metrics.timings()
+        send_sse("result", result_event)
+        return {"index": index, "problemId": problem_id, "status": "completed"}
+    except DeadlineExceeded as e:
+        message = f"Generation paused before the time limit: {e}"
+        if metrics:
+            status_writer.update(generationMetrics=metrics.summary())
+        status_writer.update(status="interrupted", errorMessage=message)
+        send_sse("interrupted", {"payload": message, "resumeProblemId": problem_id})
+        return {"index": index, "problemId": problem_id, "status": "interrupted"}
+    except Exception as e:
+        # One failed member does not stop the rest of the batch
+        error_message = f"Error during generation: {e}"
+        print(f"Batch member {index} ({problem_id}) failed: {error_message}")
+        if metrics:
+            status_writer.update(generationMetrics=metrics.summary())
+        status_writer.update(status="failed", errorMessage=error_message)
+        send_sse("error", {"payload": error_message})
+        return {"index": index, "problemId": problem_id, "status": "failed"}
+    finally:
+        await asyncio.to_thread(status_writer.close)
+
+
+async def generate_batch(problems_table, deadline, batch_id, members):
+    """
+    Runs the member pipelines concurrently, at most BATCH_CONCURRENCY at a time, with LLM calls of all
+    members spaced by one shared rate limiter. The batch takes about as long as its slowest member.
+    """
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def run_member(index, user_prompt, difficulty):
+        async with semaphore:
+            return await generate_batch_member(problems_table, deadline, batch_id, index, user_prompt, difficulty)
+
+    with use_rate_limiter(AsyncRateLimiter()):
+        return await asyncio.gather(
+            *(run_member(index, user_prompt, difficulty) for index, (user_prompt, difficulty) in enumerate(members))
+        )
+
 
-        send_sse("result", {"payload": final_problem})
+def handle_batch_request(problems_table, deadline, problems, use_cache):
+    members = parse_batch_request(problems)
+    batch_id = str(uuid.uuid4())
+    print(f"Batch {batch_id}: generating {len(members)} problems (concurrency {BATCH_CONCURRENCY})")
+    send_sse(
+        "batch",
+        {
+            "batchId": batch_id,
+            "count": len(members),
+            "message": f"Generating {len(members)} problems...",
+            "remainingMs": deadline.remaining_ms(),
+        },
+    )
+    with bypass_llm_cache(not use_cache):
+        outcomes = asyncio.run(generate_batch(problems_table, deadline, batch_id, members))
+    completed = sum(1 for outcome in outcomes if outcome["status"] == "completed")
+    send_sse("batch_complete", {"batchId": batch_id, "completed": completed, "problems": outcomes})
+    send_sse("status", {"step": 7, "message": f"✅ Generated {completed} of {len(members)} problems."})
+
+
+# --- Reconnect ---
+def handle_reconnect(problems_table, deadline, problem_id, last_event_id):
+    """
+    Reattaches a client to a generation: replays the logged events after `last_event_id` with their
+    original IDs, then tails the log until a terminal event was sent or the generation stopped.
+    The tail only moves past an ID once all earlier ones are logged (batched writes land in any order).
+    Events made up here reuse the ID of the last replayed event, so they never skip a logged one.
+    """
+    if not event_log:
+        raise ValueError("Reconnecting is not supported (EVENT_LOG_TABLE_NAME is not configured).")
+    try:
+        after_seq = int(last_event_id or 0)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid Last-Event-ID: {last_event_id!r}")
+    print(f"Reconnect to problem {problem_id} after event {after_seq}")
+    generation_ended = False
+    while True:
+        # Once the generation ended nothing is still being written: send what is there, gaps or not
+        events = event_log.read(problem_id, after_seq, contiguous=not generation_ended)
+        for seq, event_type, payload in events:
+            write_sse_message(seq, event_type, payload)
+            after_seq = seq
+            if event_type in TERMINAL_EVENTS:
+                return
+        if generation_ended:
+            break
+        if deadline.usable_seconds() < EVENT_LOG_POLL_SECONDS:
+            write_sse_message(
+                after_seq,
+                "interrupted",
+                {"payload": "Reconnect timed out; reconnect again to continue.", "lastEventId": after_seq},
+            )
+            return
+        time.sleep(EVENT_LOG_POLL_SECONDS)
+        if not events:
+            item = problems_table.get_item(Key={"problemId": problem_id}).get("Item")
+            if not item:
+                raise ValueError(f"Problem {problem_id} not found.")
+            # Ended: one more read picks up the events flushed while that invocation returned
+            generation_ended = item.get("generationStatus") in ("completed", "failed", "interrupted")
+
+    # The generating invocation stopped without a logged terminal event (e.g. it was killed)
+    if item.get("generationStatus") == "completed":
+        write_sse_message(after_seq, "result", {"payload": stored_final_problem(item)})
+    else:
+        message = item.get("errorMessage") or f"Generation of {problem_id} ended ({item.get('generationStatus')})."
+        write_sse_message(after_seq, "error", {"payload": message, "resumeProblemId": problem_id})
+
+
+# --- Pre-generated Problem Pool ---
+def claim_pooled_problem(algorithm_type, difficulty, claimed_by):
+    """Returns a pre-generated final problem for (algorithm_type, difficulty), or None to generate live."""
+    if not problem_pool:
+        return None
+    try:
+        return problem_pool.claim(make_pool_key(POOL_GENERATOR_NAME, algorithm_type, difficulty), claimed_by)
+    except Exception as e:
+        print(f"Problem pool claim failed, generating live: {e}")
+        return None
+
+
+def generate_pool_problem(problems_table, deadline, algorithm_type, difficulty):
+    """Runs the full pipeline without a client. Returns the final problem, or None if it failed or was interrupted."""
+    user_prompt = POOL_PROMPT_TEMPLATE.format(algorithm_type=algorithm_type, difficulty=difficulty)
+    problem_id, created_at = create_problem_record(
+        problems_table, user_prompt, difficulty, algorithmType=algorithm_type
+    )
+    status_writer = StatusWriter(problems_table, problem_id, verbose=GENERATOR_VERBOSE)
+    metrics = GenerationMetrics(POOL_GENERATOR_NAME, problem_id) if GenerationMetrics else None
+    try:
+        state = {"user_prompt": user_prompt, "difficulty": difficulty}
+        with headless_generation(), use_generation_metrics(metrics):
+            state = asyncio.run(run_generation_pipeline(status_writer, deadline, state))
+            if metrics:
+                status_writer.update(generationMetrics=metrics.summary())
+            final_problem = finalize_generation(status_writer, state, problem_id, created_at)
+        return {**final_problem, "algorithmType": algorithm_type}
+    except DeadlineExceeded as e:
+        # Completed steps are stored; the item stays resumable like an interrupted live generation
+        print(f"Pool generation of {problem_id} ({algorithm_type}, {difficulty}) paused before the time limit: {e}")
+        if metrics:
+            status_writer.update(generationMetrics=metrics.summary())
+        status_writer.update(status="interrupted", errorMessage=f"Generation paused before the time limit: {e}")
+        return None
+    except Exception as e:
+        print(f"Pool generation of {problem_id} ({algorithm_type}, {difficulty}) failed: {e}")
+        if metrics:
+            status_writer.update(generationMetrics=metrics.summary())
+        status_writer.update(status="failed", errorMessage=f"Error during pool generation: {e}")
+        return None
+    finally:
+        status_writer.close()
+
+
+def pool_fill_handler(event, context):
+    """
+    Scheduled entry point that tops up the problem pool, e.g. event
+    {"algorithmTypes": ["Graph"], "difficulties": ["Easy"], "target": 3, "concurrency": 2}.
+    Every (algorithm type, difficulty) pair is filled up to `target` validated problems.
+    """
+    if not problem_pool:
+        raise ValueError("Problem pool is not configured (PROBLEM_POOL_TABLE_NAME).")
+    event = event or {}
+    problems_table = dynamodb.Table(PROBLEMS_TABLE_NAME)
+    deadline = Deadline.from_context(context)
+    targets = [
+        (algorithm_type, difficulty)
+        for algorithm_type in event.get("algorithmTypes") or POOL_ALGORITHM_TYPES
+        for difficulty in event.get("difficulties") or POOL_DIFFICULTIES
+    ]
+    fill_kwargs = {"target_count": int(event.get("target", PROBLEM_POOL_TARGET))}
+    if "concurrency" in event:
+        fill_kwargs["concurrency"] = int(event["concurrency"])
+    return fill_pool(
+        problem_pool,
+        POOL_GENERATOR_NAME,
+        targets,
+        lambda algorithm_type, difficulty: generate_pool_problem(
+            problems_table, deadline, algorithm_type, difficulty
+        ),
+        **fill_kwargs,
+    )
+
+
+# --- Main Lambda Handler ---
+def lambda_handler(event, context):
+    # This handler is designed for AWS Lambda Function URL with RESPONSE_STREAM (SSE)
+    print("Event Received:", event)  # Log the event for debugging
+
+    # --- Write SSE Headers FIRST ---
+    # For Function URL Streaming, headers go to stdout before body goes to stdout.buffer
+    try:
+        sys.stdout.write("HTTP/1.1 200 OK\r\n")
+        sys.stdout.write("Content-Type: text/event-stream\r\n")
+        sys.stdout.write("Cache-Control: no-cache\r\n")
+        sys.stdout.write("Connection: keep-alive\r\n")
+        sys.stdout.write("\r\n")  # End of headers
+        sys.stdout.flush()  # Ensure headers are sent
+        print("SSE Headers written to stdout.")
+    except Exception as header_err:
+        # If headers fail, we probably can't send a useful error response via stream
+        print(f"FATAL: Could not write headers to stdout: {header_err}")
+        return  # Exit early
+
+    problem_id = None  # Initialize problem_id
+    problems_table = None  # Initialize table
+    status_writer = None
+    metrics = None  # Per-step timing and token usage, stored as generationMetrics
+    log_token = None  # Set once the problem is known: its events are logged for reconnects
+    seed_attributes = {}  # Step 1 outputs copied from a similar completed problem
+    # Time left in this invocation; steps stop early enough to checkpoint before Lambda times out
+    deadline = Deadline.from_context(context)
+
+    try:
+        # 1. Parse Input
+        body = json.loads(event.get("body", "{}"))
+        user_prompt = body.get("prompt", "")
+        difficulty = body.get("difficulty", "Medium")
+        resume_problem_id = body.get("resumeProblemId")  # Continue a failed generation instead
+        algorithm_type = body.get("algorithmType")  # Without a prompt: served from the problem pool if possible
+        use_pool = body.get("usePool", True)
+        use_cache = not body.get("noCache", False)  # Force fresh LLM responses
+        reuse = body.get("reuse", use_cache)  # Serve/seed from completed problems with an equivalent prompt
+        # Reattach to a running generation: ?problemId=... (EventSource) or body reconnectProblemId,
+        # resuming after the Last-Event-ID header (sent by EventSource on reconnect) or body lastEventId
+        # (IDs count per problem: a batch client passes the last ID seen on that member's events)
+        query = event.get("queryStringParameters") or {}
+        headers = {key.lower(): value for key, value in (event.get("headers") or {}).items()}
+        reconnect_problem_id = body.get("reconnectProblemId") or query.get("problemId")
+
+        # Initialize DynamoDB Table
+        problems_table = dynamodb.Table(PROBLEMS_TABLE_NAME)
+
+        if reconnect_problem_id:
+            last_event_id = headers.get("last-event-id") or body.get("lastEventId")
+            try:
+                handle_reconnect(problems_table, deadline, reconnect_problem_id, last_event_id)
+            except Exception as e:
+                print(f"Error during reconnect to {reconnect_problem_id}: {e}")
+                # Same ID as the client's resume point, so retrying the reconnect skips nothing
+                write_sse_message(last_event_id or 0, "error", {"payload": f"Error during reconnect: {e}"})
+            return "test"
+
+        if "problems" in body:
+            # Batch: every member reports its own result/error events on this stream
+            handle_batch_request(problems_table, deadline, body["problems"], use_cache)
+            return "test"
+
+        if resume_problem_id:
+            item = claim_problem_for_resume(problems_table, resume_problem_id)
+            problem_id = resume_problem_id  # Only after the claim, so a refused resume never marks it failed
+            if event_log:
+                sse_sequence.continue_from(problem_id, event_log.last_seq(problem_id))
+            log_token = log_events_for(problem_id)
+            state, restored = restore_pipeline_state(item)
+            created_at = item.get("createdAt")
+            pool_prompt = "algorithmType" in item
+            print(f"Resuming problem {problem_id}; restored steps: {restored}")
+            send_sse(
+                "status",
+                {
+                    "step": 0,
+                    "message": "Resuming generation...",
+                    "resumedSteps": restored,
+                    "remainingMs": deadline.remaining_ms(),
+                },
+            )
+        else:
+            extra_attributes = {}
+            pool_prompt = False  # Generated from POOL_PROMPT_TEMPLATE: never reused or indexed
+            if algorithm_type and not user_prompt:
+                pooled_problem = None
+                if use_pool:
+                    claimed_by = getattr(context, "aws_request_id", "local")
+                    pooled_problem = claim_pooled_problem(algorithm_type, difficulty, claimed_by)
+                if pooled_problem:
+                    # Already generated, validated and stored in Problems by the pool filler
+                    send_sse("result", {"payload": {**pooled_problem, "fromPool": True}})
+                    send_sse("status", {"step": 7, "message": "✅ Generation complete!"})
+                    return "test"
+                user_prompt = POOL_PROMPT_TEMPLATE.format(algorithm_type=algorithm_type, difficulty=difficulty)
+                extra_attributes["algorithmType"] = algorithm_type
+                pool_prompt = True
+            if not user_prompt:
+                raise ValueError("User prompt is missing.")
+
+            reused_item, similarity, serve = (None, 0.0, False)
+            # Template prompts would exact-match problems generated for the pool, which are served
+            # (once) through claims only
+            if reuse and not pool_prompt:
+                reused_item, similarity, serve = find_reusable_problem(problems_table, user_prompt, difficulty)
+            if reused_item and serve:
+                print(f"Serving completed problem {reused_item['problemId']} (similarity {similarity:.2f})")
+                send_sse(
+                    "result",
+                    {"payload": {**stored_final_problem(reused_item), "reused": True, "similarity": similarity}},
+                )
+                send_sse("status", {"step": 7, "message": "✅ Generation complete!"})
+                return "test"
+
+            problem_id, created_at = create_problem_record(
+                problems_table, user_prompt, difficulty, **extra_attributes
+            )
+            log_token = log_events_for(problem_id)
+            state = {"user_prompt": user_prompt, "difficulty": difficulty}
+            restored = []
+            if reused_item:
+                # Close match: start from its intent analysis and test design (step 1)
+                seed_state, seed_restored = restore_pipeline_state(reused_item)
+                if "intent" in seed_restored:
+                    for key in ("analyzed_intent", "test_specs", "test_specs_str"):
+                        state[key] = seed_state[key]
+                    restored = ["intent"]
+                    seed_attributes = {
+                        "analyzedIntent": state["analyzed_intent"],
+                        "testSpecifications": state["test_specs_str"],
+                        "seededFrom": reused_item["problemId"],
+                    }
+                    print(f"Seeding step 1 from problem {reused_item['problemId']} (similarity {similarity:.2f})")
+
+        # Step outputs are written behind the pipeline; close() in `finally` flushes the rest
+        status_writer = StatusWriter(problems_table, problem_id, verbose=GENERATOR_VERBOSE)
+        if seed_attributes:
+            status_writer.update(flush=True, status="step1_complete", **seed_attributes)
+
+        # == PIPELINE START ==
+        metrics = GenerationMetrics(POOL_GENERATOR_NAME, problem_id) if GenerationMetrics else None
+        with bypass_llm_cache(not use_cache), use_generation_metrics(metrics):
+            state = asyncio.run(run_generation_pipeline(status_writer, deadline, state, restored))
+        if llm_cache:
+            print(f"LLM cache stats: {llm_cache.stats()}")
+
+        if metrics:
+            status_writer.update(generationMetrics=metrics.summary())
+        final_problem = finalize_generation(status_writer, state, problem_id, created_at)
+        if not pool_prompt:
+            prompt_index.add(problem_id, state["user_prompt"], state["difficulty"])
+        result_event = {"payload": final_problem}
+        if metrics:
+            result_event["timing"] = metrics.timings()  # Per-step wall time (ms) of this invocation
+        send_sse("result", result_event)
         send_sse("status", {"step": 7, "message": "✅ Generation complete!"})
         # == PIPELINE END ==
 
+    except DeadlineExceeded as e:
+        # Completed steps are already stored; leave the item resumable instead of failed
+        message = f"Generation paused before the time limit: {e}"
+        print(message)
+        if status_writer:
+            if metrics:
+                status_writer.update(generationMetrics=metrics.summary())
+            status_writer.update(status="interrupted", errorMessage=message)
+        send_sse(
+            "interrupted",
+            {
+                "payload": message,
+                "resumeProblemId": problem_id,  # Send back as `resumeProblemId` to continue
+                "remainingMs": deadline.remaining_ms(),
+            },
+        )
     except Exception as e:
         error_message = f"Error during generation: {str(e)}"
         print(f"Error: {error_message}")
         traceback.print_exc()
         # Update DynamoDB status to 'failed'
-        if problem_id and problems_table:
+        if status_writer:
+            if metrics:
+                status_writer.update(generationMetrics=metrics.summary())  # Shows which step failed and how long it took
+            status_writer.update(status="failed", errorMessage=error_message)
+        elif problem_id and problems_table:
             update_dynamodb_status(
                 problems_table, problem_id, status="failed", errorMessage=error_message
             )
@@ -695,6 +1768,14 @@ def lambda_handler(event, context):
             send_sse("error", {"payload": error_message})
         except Exception as send_err:
             print(f"Failed to send error SSE: {send_err}")
+    finally:
+        if status_writer:
+            status_writer.close()  # Guaranteed final flush (no-op if already closed)
+        if log_token is not None:
+            stop_logging_events(log_token)
+        if event_log:
+            event_log.flush()  # Before returning: the background thread is frozen between invocations
+        sse_sequence.clear()
 
     # For Function URL Streaming, the return value is NOT used for the response body.
     # The response body is entirely what's written to sys.stdout/sys.stdout.buffer.
@@ -0,0 +1,134 @@
+import json
+import os
+from dataclasses import dataclass, replace
+from typing import Callable, Dict, List, Tuple
+
+# Per-node model routing. Reasoning-heavy nodes (intent, solution, test generator) run on the
+# strong tier; review/extraction nodes run on the fast tier and are retried once on the strong
+# tier when they fail (exception, unparseable output or timeout). A strong-tier node that times
+# out falls back to the fast tier. Model names match the entries of MODEL_NAME_MAPPING in
+# problem-generator/utils/model_manager.py.
+
+MODEL_TIERS = {
+    "fast": os.environ.get("FAST_MODEL_NAME", "gemini-2.0-flash-thinking-exp-01-21"),
+    "strong": os.environ.get("STRONG_MODEL_NAME", "gemini-2.5-pro-exp-03-25"),
+}
+ESCALATION_TIER = "strong"
+TIMEOUT_FALLBACK_TIER = "fast"
+
+# Best-of-N solutions: with SOLUTION_CANDIDATES > 1, step 2 also generates N - 1 extra candidates
+# on the tiers/temperatures of SOLUTION_CANDIDATE_VARIANTS ("tier:temperature,...", cycled), and
+# step 4 keeps the candidate that agrees with the majority on the generated tests and runs fastest.
+SOLUTION_CANDIDATES = int(os.environ.get("SOLUTION_CANDIDATES", "1"))
+SOLUTION_CANDIDATE_VARIANTS = os.environ.get("SOLUTION_CANDIDATE_VARIANTS", "strong:0.7,fast:0.4,strong:1.0")
+
+
+@dataclass(frozen=True)
+class StepRoute:
+    tier: str
+    temperature: float
+    max_output_tokens: int
+    timeout_seconds: float  # Per-attempt budget, further capped by the invocation deadline
+
+
+DEFAULT_ROUTE = StepRoute(ESCALATION_TIER, 0.2, 8192, 120)
+DEFAULT_STEP_ROUTES = {
+    "intent": StepRoute("strong", 0.7, 8192, 120),
+    "solution": StepRoute("strong", 0.2, 8192, 180),
+    "test_generator": StepRoute("strong", 0.2, 8192, 180),
+    "validation": StepRoute("fast", 0.0, 2048, 90),
+    "constraints": StepRoute("fast", 0.0, 1024, 60),
+    "description": StepRoute("fast", 0.5, 4096, 120),
+    # Not a pipeline node: re-ask of a structured output that could not be repaired locally
+    "reask": StepRoute("strong", 0.0, 8192, 60),
+}
+
+
+def load_step_routes(overrides_json=None) -> Dict[str, StepRoute]:
+    """DEFAULT_STEP_ROUTES with MODEL_ROUTES overrides, e.g. '{"constraints": {"tier": "strong"}}'."""
+    routes = dict(DEFAULT_STEP_ROUTES)
+    overrides_json = overrides_json if overrides_json is not None else os.environ.get("MODEL_ROUTES", "")
+    if not overrides_json:
+        return routes
+    try:
+        overrides = json.loads(overrides_json)
+        for node_name, fields in overrides.items():
+            base = routes.get(node_name, DEFAULT_ROUTE)
+            routes[node_name] = replace(base, **fields)
+            if routes[node_name].tier not in MODEL_TIERS:
+                raise ValueError(f"Unknown tier '{routes[node_name].tier}' for node '{node_name}'")
+    except (ValueError, TypeError) as e:
+        print(f"Warning: Ignoring invalid MODEL_ROUTES ({e}); using defaults.")
+        return dict(DEFAULT_STEP_ROUTES)
+    return routes
+
+
+def candidate_variants(count=SOLUTION_CANDIDATES, spec=SOLUTION_CANDIDATE_VARIANTS) -> List[Tuple[str, float]]:
+    """(tier, temperature) of the count - 1 extra solution candidates; empty when best-of-N is off."""
+    variants = []
+    for entry in spec.split(","):
+        tier, _, temperature = entry.strip().partition(":")
+        if tier not in MODEL_TIERS:
+            print(f"Warning: Ignoring solution candidate variant '{entry}' (unknown tier).")
+            continue
+        variants.append((tier, float(temperature or DEFAULT_STEP_ROUTES["solution"].temperature)))
+    if not variants:
+        return []
+    return [variants[index % len(variants)] for index in range(max(count - 1, 0))]
+
+
+class ModelRouter:
+    """Creates (and caches) the model and chain of every node according to its route."""
+
+    def __init__(
+        self,
+        create_llm: Callable[[str, float, int], object],
+        chain_factories: Dict[str, Callable[[object], object]],
+        routes: Dict[str, StepRoute] = None,
+    ):
+        self.create_llm = create_llm  # create_llm(model_name, temperature, max_output_tokens)
+        self.chain_factories = chain_factories
+        self.routes = routes or load_step_routes()
+        self._llms = {}
+        self._chains = {}
+
+    def route(self, node_name, tier=None, temperature=None) -> StepRoute:
+        """The node's route, optionally moved to another tier (escalation / fallback) or temperature."""
+        route = self.routes.get(node_name, DEFAULT_ROUTE)
+        if tier:
+            route = replace(route, tier=tier)
+        if temperature is not None:
+            route = replace(route, temperature=temperature)
+        return route
+
+    def model_name(self, node_name, tier=None) -> str:
+        return MODEL_TIERS[self.route(node_name, tier).tier]
+
+    def can_escalate(self, node_name) -> bool:
+        return self.route(node_name).tier != ESCALATION_TIER
+
+    def fallback_tier(self, node_name, timed_out=False):
+        """Tier for the single retry of a failed node, or None if it should not be retried."""
+        if self.can_escalate(node_name):
+            return ESCALATION_TIER
+        if timed_out and TIMEOUT_FALLBACK_TIER != ESCALATION_TIER:
+            return TIMEOUT_FALLBACK_TIER
+        return None
+
+    def llm(self, tier=ESCALATION_TIER, temperature=0.2, max_output_tokens=8192):
+        key = (MODEL_TIERS[tier], temperature, max_output_tokens)
+        if key not in self._llms:
+            self._llms[key] = self.create_llm(*key)
+        return self._llms[key]
+
+    def llms(self):
+        """Models created so far (e.g. to read replay-model stats in benchmarks)."""
+        return list(self._llms.values())
+
+    def chain(self, node_name, tier=None, temperature=None):
+        route = self.route(node_name, tier, temperature)
+        key = (node_name, route.tier, route.temperature)
+        if key not in self._chains:
+            model = self.llm(route.tier, route.temperature, route.max_output_tokens)
+            self._chains[key] = self.chain_factories[node_name](model)
+        return self._chains[key]
@@ -0,0 +1,156 @@
+import ast
+import json
+import re
+from typing import List, Tuple, Type
+
+from pydantic import BaseModel, ValidationError
+
+# Cheap local repairs for structured LLM output, tried before spending another LLM call.
+# Order: extract the JSON object from surrounding text/fences -> tolerant parsing ->
+# schema-aware coercion of field names and values.
+
+
+class OutputRepairError(ValueError):
+    """Raised when the output cannot be turned into the model locally."""
+
+
+def extract_json_block(text: str) -> str:
+    """Returns the first balanced {...} (or [...]) block, ignoring braces inside strings."""
+    cleaned = text.strip()
+    fence = re.search(r"```(?:json)?\s*(.*?)```", cleaned, re.DOTALL)
+    if fence:
+        cleaned = fence.group(1).strip()
+
+    start = next((i for i, ch in enumerate(cleaned) if ch in "{["), None)
+    if start is None:
+        return cleaned
+    opening = cleaned[start]
+    closing = "}" if opening == "{" else "]"
+    depth, in_string, escaped, quote = 0, False, False, ""
+    for index in range(start, len(cleaned)):
+        ch = cleaned[index]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == quote:
+                in_string = False
+        elif ch in "\"'":
+            in_string, quote = True, ch
+        elif ch == opening:
+            depth += 1
+        elif ch == closing:
+            depth -= 1
+            if depth == 0:
+                return cleaned[start : index + 1]
+    return cleaned[start:]  # Truncated output; tolerant parsing may still cope
+
+
+def tolerant_json_loads(text: str, repairs: List[str]):
+    """json.loads, then common LLM deviations: comments, trailing commas, Python literals."""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+
+    fixed = re.sub(r"^\s*//.*$", "", text, flags=re.MULTILINE)  # Line comments
+    fixed = re.sub(r",\s*([}\]])", r"\1", fixed)  # Trailing commas
+    try:
+        data = json.loads(fixed)
+        repairs.append("json_syntax")
+        return data
+    except json.JSONDecodeError:
+        pass
+
+    try:
+        # Single quotes, True/False/None: the output is often a Python literal
+        data = ast.literal_eval(fixed)
+        repairs.append("python_literal")
+        return data
+    except (ValueError, SyntaxError) as e:
+        raise OutputRepairError(f"Output is not valid JSON: {e}") from e
+
+
+def _field_annotation(model_cls, name):
+    field = model_cls.__fields__[name]
+    return getattr(field, "annotation", None) or getattr(field, "outer_type_", None)  # pydantic v2 / v1
+
+
+def _normalize_key(key: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", key.lower())
+
+
+def _leading_number(value):
+    if isinstance(value, (int, float)):
+        return value
+    match = re.search(r"-?\d+(?:\.\d+)?", str(value))
+    if not match:
+        raise OutputRepairError(f"No number found in {value!r}")
+    return float(match.group())
+
+
+def coerce_to_model(data, model_cls: Type[BaseModel], repairs: List[str]) -> BaseModel:
+    fields = list(model_cls.__fields__)
+
+    # {"result": {...fields...}} or [{...fields...}] wrappers
+    if isinstance(data, list) and len(data) == 1 and isinstance(data[0], dict):
+        data = data[0]
+        repairs.append("unwrap_list")
+    if isinstance(data, dict) and len(data) == 1:
+        (only_value,) = data.values()
+        if isinstance(only_value, dict) and not set(data) & set(fields):
+            data = only_value
+            repairs.append("unwrap_object")
+    if not isinstance(data, dict):
+        raise OutputRepairError(f"Expected a JSON object for {model_cls.__name__}, got {type(data).__name__}")
+
+    # camelCase / spacing / case differences in field names
+    by_normalized = {_normalize_key(name): name for name in fields}
+    renamed = {}
+    for key, value in data.items():
+        target = key if key in fields else by_normalized.get(_normalize_key(key))
+        if target and target not in renamed:
+            if target != key:
+                repairs.append(f"rename:{key}")
+            renamed[target] = value
+
+    # Value coercions by declared field type
+    for name, value in list(renamed.items()):
+        annotation = _field_annotation(model_cls, name)
+        if annotation is float and not isinstance(value, (int, float)):
+            renamed[name] = float(_leading_number(value))
+            repairs.append(f"number:{name}")
+        elif annotation is int and not isinstance(value, int):
+            renamed[name] = int(round(_leading_number(value)))
+            repairs.append(f"number:{name}")
+        elif annotation is str and isinstance(value, (list, dict)):
+            renamed[name] = "\n".join(map(str, value)) if isinstance(value, list) else json.dumps(value)
+            repairs.append(f"string:{name}")
+
+    # Model-specific normalizations
+    if "status" in renamed and "details" in fields:
+        status = str(renamed["status"]).strip().lower()
+        normalized = "Pass" if status in ("pass", "passed", "true", "ok", "success") else "Fail"
+        if normalized != renamed["status"]:
+            renamed["status"] = normalized
+            repairs.append("status")
+    if "test_specs" in renamed and isinstance(renamed["test_specs"], dict):
+        nested = next((v for v in renamed["test_specs"].values() if isinstance(v, list)), None)
+        renamed["test_specs"] = nested if nested is not None else [renamed["test_specs"]]
+        repairs.append("test_specs_list")
+
+    try:
+        return model_cls.parse_obj(renamed)
+    except ValidationError as e:
+        raise OutputRepairError(f"Output does not match {model_cls.__name__}: {e}") from e
+
+
+def parse_with_repair(raw_output: str, model_cls: Type[BaseModel]) -> Tuple[BaseModel, List[str]]:
+    """Parses raw LLM text into `model_cls`, applying local repairs. Returns (model, repairs_applied)."""
+    repairs: List[str] = []
+    block = extract_json_block(raw_output)
+    if block != raw_output.strip():
+        repairs.append("extract_block")
+    data = tolerant_json_loads(block, repairs)
+    return coerce_to_model(data, model_cls, repairs), repairs
@@ -0,0 +1,106 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional
+
+
+@dataclass
+class PipelineNode:
+    """One unit of the generation pipeline (usually a single LLM chain call)."""
+
+    name: str
+    step: int
+    run: Callable[[dict], Awaitable[Optional[dict]]]  # Receives the shared state, returns updates to it
+    deps: List[str] = field(default_factory=list)
+    message: str = ""  # Shown to the user when the node starts
+
+
+class PipelineError(Exception):
+    """Raised when a node fails; carries the failing node so the caller can record it."""
+
+    def __init__(self, node: PipelineNode, original: BaseException):
+        super().__init__(f"Node '{node.name}' (step {node.step}) failed: {original}")
+        self.node = node
+        self.original = original
+
+
+def _validate(nodes: List[PipelineNode]) -> Dict[str, PipelineNode]:
+    by_name = {node.name: node for node in nodes}
+    if len(by_name) != len(nodes):
+        raise ValueError("Pipeline node names must be unique.")
+    for node in nodes:
+        missing = [dep for dep in node.deps if dep not in by_name]
+        if missing:
+            raise ValueError(f"Node '{node.name}' depends on unknown node(s): {missing}")
+
+    # Kahn's algorithm, only to reject cycles before anything runs
+    indegree = {node.name: len(node.deps) for node in nodes}
+    ready = [name for name, degree in indegree.items() if degree == 0]
+    visited = 0
+    while ready:
+        current = ready.pop()
+        visited += 1
+        for node in nodes:
+            if current in node.deps:
+                indegree[node.name] -= 1
+                if indegree[node.name] == 0:
+                    ready.append(node.name)
+    if visited != len(nodes):
+        raise ValueError("Pipeline graph contains a cycle.")
+    return by_name
+
+
+async def run_dag(
+    nodes: List[PipelineNode],
+    state: dict,
+    on_event: Optional[Callable[[str, PipelineNode, dict], None]] = None,
+    completed: Optional[List[str]] = None,
+) -> dict:
+    """
+    Runs the nodes as soon as all of their dependencies finished, independent nodes concurrently.
+    `state` is shared: each node's returned dict is merged into it before its dependents start.
+    `on_event(kind, node, info)` is called with kind "started", "completed" or "failed".
+    Nodes listed in `completed` are treated as already done (their outputs must be in `state`).
+    On the first failure all running nodes are cancelled and PipelineError is raised.
+    """
+    by_name = _validate(nodes)
+    done = set(completed or [])
+    running: Dict[asyncio.Task, PipelineNode] = {}
+    started_at: Dict[str, float] = {}
+
+    def emit(kind, node, info=None):
+        if on_event:
+            on_event(kind, node, info or {})
+
+    def start_ready_nodes():
+        scheduled = {node.name for node in running.values()}
+        for node in nodes:
+            if node.name in done or node.name in scheduled:
+                continue
+            if all(dep in done for dep in node.deps):
+                started_at[node.name] = time.perf_counter()
+                emit("started", node)
+                running[asyncio.ensure_future(node.run(state))] = node
+
+    start_ready_nodes()
+    while running:
+        finished, _ = await asyncio.wait(list(running), return_when=asyncio.FIRST_COMPLETED)
+        for task in finished:
+            node = running.pop(task)
+            elapsed_ms = int((time.perf_counter() - started_at[node.name]) * 1000)
+            error = task.exception()
+            if error is not None:
+                emit("failed", node, {"elapsedMs": elapsed_ms, "error": str(error)})
+                for other in running:
+                    other.cancel()
+                await asyncio.gather(*running, return_exceptions=True)
+                raise PipelineError(node, error) from error
+            state.update(task.result() or {})
+            done.add(node.name)
+            emit("completed", node, {"elapsedMs": elapsed_ms})
+        start_ready_nodes()
+
+    not_run = [name for name in by_name if name not in done]
+    if not_run:
+        raise RuntimeError(f"Pipeline finished with unscheduled nodes: {not_run}")
+    return state
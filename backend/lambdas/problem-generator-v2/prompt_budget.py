@@ -0,0 +1,140 @@
+import json
+import os
+import threading
+from typing import Any, Dict, List, Union
+
+# Prompt budget for the test specifications that step 1 hands to steps 2-5. A spec set that fits
+# the step's token budget is passed as is; a larger one is replaced by a compact representation:
+# a capped number of representative cases plus a textual summary of all of them (count, categories,
+# value ranges of the input fields). Rendered prompt sizes with the full and the passed specs are
+# recorded per step, so the savings can be reported.
+
+CHARS_PER_TOKEN = 4  # Rough estimate; counting exactly would cost a model API call per prompt
+SPEC_TOKEN_BUDGETS = {
+    "solution": int(os.environ.get("SPEC_TOKEN_BUDGET_SOLUTION", "2000")),
+    "test_generator": int(os.environ.get("SPEC_TOKEN_BUDGET_TEST_GENERATOR", "3000")),
+    "validation": int(os.environ.get("SPEC_TOKEN_BUDGET_VALIDATION", "1500")),
+    "constraints": int(os.environ.get("SPEC_TOKEN_BUDGET_CONSTRAINTS", "1000")),
+}
+DEFAULT_SPEC_TOKEN_BUDGET = 1500
+MIN_REPRESENTATIVE_CASES = 2
+CATEGORY_FIELDS = ("category", "type", "description", "name", "case")
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN
+
+
+def _case_size(case) -> int:
+    return len(json.dumps(case.get("input") if isinstance(case, dict) else case, default=str))
+
+
+def _category(case):
+    if isinstance(case, dict):
+        for field in CATEGORY_FIELDS:
+            if isinstance(case.get(field), str):
+                return case[field]
+    return None
+
+
+def representative_cases(test_specs: List[Any], max_cases: int) -> List[Any]:
+    """
+    Up to `max_cases` cases in their original order: the smallest and largest inputs, one case per
+    category, then cases spread evenly over the input sizes.
+    """
+    if len(test_specs) <= max_cases:
+        return list(test_specs)
+    by_size = sorted(range(len(test_specs)), key=lambda index: _case_size(test_specs[index]))
+    chosen = [by_size[0], by_size[-1]]
+    seen_categories = set()
+    for index, case in enumerate(test_specs):
+        category = _category(case)
+        if category and category not in seen_categories:
+            seen_categories.add(category)
+            chosen.append(index)
+    step = len(by_size) / max_cases
+    chosen += [by_size[int(position * step)] for position in range(max_cases)]
+    selected = list(dict.fromkeys(chosen))[:max_cases]
+    return [test_specs[index] for index in sorted(selected)]
+
+
+def _describe_values(values) -> str:
+    if all(isinstance(value, bool) for value in values):
+        return "bool"
+    if all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in values):
+        kind = "int" if all(isinstance(value, int) for value in values) else "number"
+        return f"{kind} in [{min(values)}, {max(values)}]"
+    if all(isinstance(value, (str, list)) for value in values):
+        kind = "string" if all(isinstance(value, str) for value in values) else "list"
+        lengths = [len(value) for value in values]
+        return f"{kind} of length {min(lengths)}..{max(lengths)}"
+    return "mixed"
+
+
+def summarize_specs(test_specs: List[Any], shown: int) -> str:
+    """One-paragraph summary of the whole spec set (what the omitted cases covered)."""
+    lines = [f"{len(test_specs)} test cases in total; {shown} representative cases are shown above."]
+    categories = [category for category in map(_category, test_specs) if category]
+    if categories:
+        unique = list(dict.fromkeys(categories))
+        more = f" (+{len(unique) - 20} more)" if len(unique) > 20 else ""
+        lines.append("Cases cover: " + "; ".join(unique[:20]) + more + ".")
+    inputs = [case.get("input") for case in test_specs if isinstance(case, dict)]
+    if inputs and all(isinstance(value, dict) for value in inputs):
+        fields = list(dict.fromkeys(key for value in inputs for key in value))
+        ranges = [
+            f"{field}: {_describe_values([value[field] for value in inputs if field in value])}"
+            for field in fields
+        ]
+        lines.append("Input fields across all cases: " + ", ".join(ranges) + ".")
+    elif inputs:
+        lines.append(f"Inputs across all cases: {_describe_values(inputs)}.")
+    return "\n".join(lines)
+
+
+def compact_specs(test_specs: Union[List[Any], str], token_budget: int) -> str:
+    """The spec text for a prompt: the full JSON if it fits `token_budget`, otherwise a compact form."""
+    full_text = test_specs if isinstance(test_specs, str) else json.dumps(test_specs)
+    if estimate_tokens(full_text) <= token_budget:
+        return full_text
+    if isinstance(test_specs, str):
+        cut = token_budget * CHARS_PER_TOKEN
+        return f"{full_text[:cut]}\n... ({len(full_text) - cut} more characters of specifications omitted)"
+    max_cases = len(test_specs)
+    while True:
+        max_cases = max(max_cases // 2, MIN_REPRESENTATIVE_CASES)
+        cases = representative_cases(test_specs, max_cases)
+        text = f"{json.dumps(cases)}\n\nSummary:\n{summarize_specs(test_specs, len(cases))}"
+        if estimate_tokens(text) <= token_budget or max_cases == MIN_REPRESENTATIVE_CASES:
+            return text
+
+
+class PromptBudget:
+    """Per pipeline run: compact spec text per step and the measured prompt sizes (thread-safe)."""
+
+    def __init__(self, budgets=None):
+        self.budgets = budgets or SPEC_TOKEN_BUDGETS
+        self.steps: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def spec_text(self, node_name, test_specs) -> str:
+        return compact_specs(test_specs, self.budgets.get(node_name, DEFAULT_SPEC_TOKEN_BUDGET))
+
+    def record(self, node_name, prompt_template, step_input, full_specs_text):
+        """Renders the step's prompt with the passed and with the full specs and records both sizes."""
+        prompt_tokens = estimate_tokens(prompt_template.format(**step_input))
+        full_tokens = estimate_tokens(prompt_template.format(**{**step_input, "test_specs": full_specs_text}))
+        with self._lock:
+            self.steps[node_name] = {
+                "promptTokens": prompt_tokens,
+                "fullPromptTokens": full_tokens,
+                "savedTokens": full_tokens - prompt_tokens,
+            }
+        if full_tokens > prompt_tokens:
+            print(f"Prompt budget ({node_name}): {full_tokens} -> {prompt_tokens} estimated tokens")
+        return self.steps[node_name]
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            steps = dict(self.steps)
+        return {"savedTokens": sum(step["savedTokens"] for step in steps.values()), "steps": steps}
@@ -0,0 +1,182 @@
+import hashlib
+import re
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+# Reuse index of completed generations, keyed by a normalized form of userPrompt + difficulty.
+# Normalization: case folding, synonym phrases mapped to one token ("dynamic programming" -> dp),
+# stopwords dropped, tokens sorted. Exact lookups use the normalized key; near-duplicates are found
+# with MinHash signatures over the normalized token set, bucketed by LSH bands.
+
+STOPWORDS = {
+    # English
+    "a", "an", "the", "and", "or", "of", "for", "to", "in", "on", "with", "using", "use", "that",
+    "which", "is", "are", "be", "about", "please", "create", "generate", "make", "write", "give",
+    "me", "i", "want", "need", "problem", "problems", "question", "challenge", "coding", "level",
+    "difficulty", "task", "some", "one",
+    # Korean
+    "문제", "만들어", "만들어줘", "만들어주세요", "생성", "생성해줘", "주세요", "관련", "하는", "난이도", "알고리즘",
+}
+
+# Phrases first (longest match wins), mapped to a single canonical token
+SYNONYMS = {
+    "dynamic programming": "dp",
+    "다이나믹 프로그래밍": "dp",
+    "동적 계획법": "dp",
+    "breadth first search": "bfs",
+    "breadth-first search": "bfs",
+    "너비 우선 탐색": "bfs",
+    "depth first search": "dfs",
+    "depth-first search": "dfs",
+    "깊이 우선 탐색": "dfs",
+    "binary search": "binary_search",
+    "이분 탐색": "binary_search",
+    "이진 탐색": "binary_search",
+    "shortest path": "shortest_path",
+    "최단 경로": "shortest_path",
+    "dijkstra": "shortest_path",
+    "다익스트라": "shortest_path",
+    "그리디": "greedy",
+    "탐욕": "greedy",
+    "그래프": "graph",
+    "graphs": "graph",
+    "정렬": "sort",
+    "sorting": "sort",
+    "배낭": "knapsack",
+    "구현": "implementation",
+    "자료구조": "data_structure",
+    "data structure": "data_structure",
+    "data structures": "data_structure",
+    "쉬움": "easy",
+    "보통": "medium",
+    "mid": "medium",
+    "어려움": "hard",
+    "difficult": "hard",
+}
+# English phrases only match whole words ("mid" must not hit "middle"); Korean phrases also match
+# with attached particles ("그래프를")
+_SYNONYM_PATTERN = re.compile(
+    "|".join(
+        rf"\b{re.escape(phrase)}\b" if phrase.isascii() else re.escape(phrase)
+        for phrase in sorted(SYNONYMS, key=len, reverse=True)
+    )
+)
+
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 16  # 16 bands x 4 rows: pairs with Jaccard >= ~0.5 are very likely to share a bucket
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+def _permutation_params(count):
+    params = []
+    for index in range(count):
+        digest = hashlib.sha256(f"minhash-{index}".encode("utf-8")).digest()
+        a = int.from_bytes(digest[:8], "big") % _MERSENNE_PRIME or 1
+        b = int.from_bytes(digest[8:16], "big") % _MERSENNE_PRIME
+        params.append((a, b))
+    return params
+
+
+_PERMUTATIONS = _permutation_params(NUM_PERMUTATIONS)
+
+
+def normalize_tokens(prompt: str) -> List[str]:
+    text = _SYNONYM_PATTERN.sub(lambda m: f" {SYNONYMS[m.group(0)]} ", prompt.casefold())
+    tokens = re.findall(r"\w+", text)
+    return [SYNONYMS.get(token, token) for token in tokens if token not in STOPWORDS]
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Order-insensitive canonical form: 'Knapsack problem using DP' == 'dp knapsack'."""
+    return " ".join(sorted(set(normalize_tokens(prompt))))
+
+
+def prompt_key(prompt: str, difficulty: str) -> str:
+    return f"{(difficulty or '').casefold()}|{normalize_prompt(prompt)}"
+
+
+def minhash_signature(tokens: List[str]) -> Optional[Tuple[int, ...]]:
+    """MinHash of the token set; None when nothing is left after normalization."""
+    if not tokens:
+        return None
+    hashes = [zlib.crc32(token.encode("utf-8")) for token in set(tokens)]
+    return tuple(min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def estimate_similarity(sig_a, sig_b) -> float:
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / NUM_PERMUTATIONS
+
+
+class PromptIndex:
+    """In-memory index of completed problems. Thread-safe; rebuilt from the Problems table periodically."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._exact: Dict[str, str] = {}  # prompt_key -> problemId
+        self._signatures: Dict[str, Tuple[str, Tuple[int, ...]]] = {}  # problemId -> (difficulty, signature)
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], set] = {}
+        self.loaded_at = 0.0
+
+    def __len__(self):
+        return len(self._exact)
+
+    def add(self, problem_id, prompt, difficulty):
+        difficulty = (difficulty or "").casefold()
+        signature = minhash_signature(normalize_tokens(prompt))
+        rows = NUM_PERMUTATIONS // LSH_BANDS
+        with self._lock:
+            self._exact[prompt_key(prompt, difficulty)] = problem_id
+            if signature is None:
+                return
+            self._signatures[problem_id] = (difficulty, signature)
+            for band in range(LSH_BANDS):
+                self._buckets.setdefault((band, signature[band * rows : (band + 1) * rows]), set()).add(problem_id)
+
+    def find_exact(self, prompt, difficulty) -> Optional[str]:
+        with self._lock:
+            return self._exact.get(prompt_key(prompt, difficulty))
+
+    def find_similar(self, prompt, difficulty, threshold=0.5) -> Optional[Tuple[str, float]]:
+        """Best (problemId, estimated Jaccard similarity) with the same difficulty above `threshold`."""
+        difficulty = (difficulty or "").casefold()
+        signature = minhash_signature(normalize_tokens(prompt))
+        if signature is None:
+            return None
+        rows = NUM_PERMUTATIONS // LSH_BANDS
+        with self._lock:
+            candidates = set()
+            for band in range(LSH_BANDS):
+                candidates |= self._buckets.get((band, signature[band * rows : (band + 1) * rows]), set())
+            scored = [
+                (problem_id, estimate_similarity(signature, self._signatures[problem_id][1]))
+                for problem_id in candidates
+                if self._signatures[problem_id][0] == difficulty
+            ]
+        scored = [match for match in scored if match[1] >= threshold]
+        return max(scored, key=lambda match: match[1]) if scored else None
+
+    def load_from_table(self, table, max_items=None):
+        """
+        Adds the completed problems of the Problems table (paginated scan, prompt fields only), stopping
+        after `max_items` of them.
+        Problems generated for the pool (with algorithmType) are left out: they are claimed, not reused.
+        """
+        scan_kwargs = {
+            "ProjectionExpression": "problemId, userPrompt, difficulty",
+            "FilterExpression": "generationStatus = :completed AND attribute_not_exists(algorithmType)",
+            "ExpressionAttributeValues": {":completed": "completed"},
+        }
+        count = 0
+        while True:
+            response = table.scan(**scan_kwargs)
+            for item in response.get("Items", []):
+                if item.get("userPrompt"):
+                    self.add(item["problemId"], item["userPrompt"], item.get("difficulty", ""))
+                    count += 1
+            if "LastEvaluatedKey" not in response or (max_items and count >= max_items):
+                break
+            scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+        self.loaded_at = time.time()
+        return count
@@ -0,0 +1,105 @@
+import os
+import threading
+import time
+
+# Write-behind buffer for the Problems item attributes written during generation.
+# Pipeline nodes call update() and continue immediately; a background thread coalesces
+# everything buffered so far into one update_item, either on a timer or as soon as a
+# flush is requested (step boundaries). close() always performs a final synchronous flush.
+
+FLUSH_INTERVAL_SECONDS = float(os.environ.get("STATUS_FLUSH_INTERVAL_SECONDS", "2.0"))
+MAX_WRITE_ATTEMPTS = 3
+
+
+class StatusWriter:
+    def __init__(self, table, problem_id, flush_interval=FLUSH_INTERVAL_SECONDS, verbose=False):
+        self.table = table
+        self.problem_id = problem_id
+        self.flush_interval = flush_interval
+        self.verbose = verbose
+        self.writes = 0  # update_item calls actually made
+        self.updates = 0  # update() calls coalesced into them
+        self._pending = {}
+        self._lock = threading.Lock()  # Guards _pending
+        self._write_lock = threading.Lock()  # Keeps writes ordered
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=f"status-writer-{problem_id}", daemon=True)
+        self._thread.start()
+
+    # --- Public API ---
+    def update(self, status=None, flush=False, **attributes):
+        """Buffers attribute updates (`status` maps to generationStatus). Later values win."""
+        if status:
+            attributes["generationStatus"] = status
+        if not attributes:
+            return
+        with self._lock:
+            self._pending.update(attributes)
+            self.updates += 1
+            closed = self._closed
+        if closed:
+            self.flush()  # Background thread is gone, write through
+        elif flush:
+            self._wakeup.set()
+
+    def flush(self):
+        """Synchronously writes everything buffered so far."""
+        with self._write_lock:
+            with self._lock:
+                attributes, self._pending = self._pending, {}
+            if not attributes:
+                return
+            try:
+                self._write(attributes)
+            except Exception as e:
+                print(f"Error updating DynamoDB for {self.problem_id}: {e}")
+                with self._lock:
+                    # Put the attributes back under anything newer so the next flush retries them
+                    self._pending = {**attributes, **self._pending}
+
+    def close(self):
+        """Stops the background thread and performs the guaranteed final flush."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._wakeup.set()
+        self._thread.join()
+        self.flush()
+        if self._pending:
+            print(f"Error: {len(self._pending)} attribute(s) of {self.problem_id} could not be written: {list(self._pending)}")
+        print(f"StatusWriter for {self.problem_id}: {self.updates} updates coalesced into {self.writes} writes.")
+
+    # --- Internals ---
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if not self._closed:
+                self.flush()
+
+    def _write(self, attributes):
+        attributes = {**attributes, "updatedAt": int(time.time())}  # Lets resume tell a live generation from a dead one
+        names, values, parts = {}, {}, []
+        for index, (key, value) in enumerate(attributes.items()):
+            names[f"#a{index}"] = key
+            values[f":v{index}"] = value
+            parts.append(f"#a{index} = :v{index}")
+
+        for attempt in range(1, MAX_WRITE_ATTEMPTS + 1):
+            try:
+                self.table.update_item(
+                    Key={"problemId": self.problem_id},
+                    UpdateExpression="SET " + ", ".join(parts),
+                    ExpressionAttributeNames=names,
+                    ExpressionAttributeValues=values,
+                )
+                self.writes += 1
+                if self.verbose:
+                    print(f"DynamoDB updated for {self.problem_id}: {list(attributes)}")
+                return
+            except Exception:
+                if attempt == MAX_WRITE_ATTEMPTS:
+                    raise
+                time.sleep(0.1 * 2 ** attempt)
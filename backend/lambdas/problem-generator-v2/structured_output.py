@@ -0,0 +1,92 @@
+from typing import Optional, Type
+
+from langchain_core.output_parsers import StrOutputParser
+from pydantic import BaseModel
+
+# Native JSON-mode structured output for Gemini. The model is bound to
+# response_mime_type=application/json (plus a response schema when the Pydantic schema can be
+# expressed in Gemini's OpenAPI subset), so the prompt only needs a one-line field list instead
+# of PydanticOutputParser's long format instructions. If the provider rejects the config, the
+# chain falls back to the original prompt with full format instructions.
+
+
+def _model_json_schema(model_cls: Type[BaseModel]) -> dict:
+    if hasattr(model_cls, "model_json_schema"):
+        return model_cls.model_json_schema()  # pydantic v2
+    return model_cls.schema()
+
+
+def gemini_response_schema(model_cls: Type[BaseModel]) -> Optional[dict]:
+    """
+    Converts a Pydantic model's JSON schema to Gemini's response_schema format.
+    Returns None when the schema uses something Gemini cannot enforce (unions,
+    free-form objects); JSON mode is then used without a schema.
+    """
+    schema = _model_json_schema(model_cls)
+    definitions = schema.get("$defs") or schema.get("definitions") or {}
+
+    def convert(node):
+        if "$ref" in node:
+            node = definitions.get(node["$ref"].split("/")[-1], {})
+        if "anyOf" in node or "oneOf" in node or "allOf" in node:
+            return None
+        node_type = node.get("type")
+        if node_type not in ("object", "array", "string", "number", "integer", "boolean"):
+            return None
+        converted = {"type": node_type}
+        if node.get("description"):
+            converted["description"] = node["description"]
+        if node_type == "object":
+            properties = node.get("properties")
+            if not properties:
+                return None
+            converted["properties"] = {}
+            for name, child in properties.items():
+                child_schema = convert(child)
+                if child_schema is None:
+                    return None
+                converted["properties"][name] = child_schema
+            converted["required"] = node.get("required", list(properties))
+        elif node_type == "array":
+            items = convert(node.get("items", {}))
+            if items is None:
+                return None
+            converted["items"] = items
+        return converted
+
+    return convert(schema)
+
+
+def compact_format_instructions(model_cls: Type[BaseModel]) -> str:
+    """Short replacement for get_format_instructions(): one line per field."""
+    properties = _model_json_schema(model_cls).get("properties", {})
+    lines = [
+        f'- "{name}": {prop.get("description", prop.get("title", name))}'
+        for name, prop in properties.items()
+    ]
+    return "Respond with a single JSON object with these keys:\n" + "\n".join(lines)
+
+
+def json_generation_config(model_cls: Type[BaseModel]) -> dict:
+    config = {"response_mime_type": "application/json"}
+    response_schema = gemini_response_schema(model_cls)
+    if response_schema is not None:
+        config["response_schema"] = response_schema
+    return config
+
+
+def build_structured_chain(prompt_template, llm, output_model: Type[BaseModel], native_json: bool = True):
+    """
+    Chain returning raw JSON text for `output_model` (parsed later with local repair).
+    `prompt_template` must carry full format instructions as its `format_instructions` partial;
+    they are only used by the prompt-based path.
+    """
+    prompt_chain = prompt_template | llm | StrOutputParser()
+    if not native_json:
+        return prompt_chain
+
+    compact_prompt = prompt_template.partial(format_instructions=compact_format_instructions(output_model))
+    native_llm = llm.bind(generation_config=json_generation_config(output_model))
+    native_chain = compact_prompt | native_llm | StrOutputParser()
+    return native_chain.with_fallbacks([prompt_chain])
+
@@ -0,0 +1,49 @@
+import os
+import time
+from typing import Callable
+
+# Coalesces streamed LLM token chunks into larger SSE `token` events. A single Gemini
+# chunk is often a few characters; sending each as its own event costs a JSON encode, a
+# write and a flush. Chunks are buffered until either the byte or the time window is hit.
+
+TOKEN_FLUSH_BYTES = int(os.environ.get("TOKEN_FLUSH_BYTES", "256"))
+TOKEN_FLUSH_INTERVAL_SECONDS = float(os.environ.get("TOKEN_FLUSH_INTERVAL_SECONDS", "0.1"))
+
+
+class TokenCoalescer:
+    def __init__(
+        self,
+        emit: Callable[[str, int], None],
+        max_bytes: int = TOKEN_FLUSH_BYTES,
+        max_interval: float = TOKEN_FLUSH_INTERVAL_SECONDS,
+    ):
+        self.emit = emit  # emit(text, sequence_number)
+        self.max_bytes = max_bytes
+        self.max_interval = max_interval
+        self.chunks_in = 0
+        self.events_out = 0
+        self._buffer = []
+        self._buffered_bytes = 0
+        self._last_emit = time.monotonic()
+
+    def add(self, text: str):
+        if not text:
+            return
+        self.chunks_in += 1
+        self._buffer.append(text)
+        self._buffered_bytes += len(text.encode("utf-8"))
+        if (
+            self._buffered_bytes >= self.max_bytes
+            or time.monotonic() - self._last_emit >= self.max_interval
+        ):
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        text = "".join(self._buffer)
+        self._buffer = []
+        self._buffered_bytes = 0
+        self._last_emit = time.monotonic()
+        self.emit(text, self.events_out)
+        self.events_out += 1
@@ -0,0 +1,401 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+# 오프라인 파이프라인 벤치마크.
+# LLM은 utils/replay_llm.py의 ReplayChatModel(녹화 응답 또는 아래 합성 응답)으로, DynamoDB는 호출 수와
+# 지연을 기록하는 메모리 테이블로 대체해 네트워크 없이 다음 세 경로를 측정합니다.
+#   v2      : problem-generator-v2 lambda_handler (단계별 시간, 파싱 시간, DynamoDB/SSE 쓰기 비용)
+#   generate: ProblemGenerator.generate_problem
+#   stream  : ProblemGenerator.generate_problem_stream
+# 기본값(지연 0, 토큰 속도 무제한)에서는 측정된 시간이 모두 파이프라인 자체의 오버헤드입니다.
+# --compare로 이전 결과와 비교하면 중앙값 종단 지연이 --max-regression 이상 늘었을 때 종료 코드 1을 반환합니다 (CI용).
+
+PROBLEM_GENERATOR_DIR = Path(__file__).parent
+V2_DIR = PROBLEM_GENERATOR_DIR.parent / "problem-generator-v2"
+for path in (PROBLEM_GENERATOR_DIR, V2_DIR):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+# 측정을 왜곡하거나 네트워크를 쓰는 기능은 끔 (모듈 import 전에 설정해야 함)
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")  # v2는 import 시 boto3 클라이언트를 생성
+os.environ["LLM_CACHE_MODE"] = "off"
+os.environ["PROMPT_REUSE_MODE"] = "off"
+os.environ["VALIDATION_MODE"] = "llm"
+os.environ.pop("PROBLEM_POOL_TABLE_NAME", None)
+
+from utils.replay_llm import configure_replay  # noqa: E402
+
+PIPELINES = ["v2", "generate", "stream"]
+
+# --- 합성 응답 (녹화에 없는 프롬프트용) ---
+SYNTHETIC_SOLUTION = """import sys
+
+def solve(weights, values, capacity):
+    dp = [0] * (capacity + 1)
+    for weight, value in zip(weights, values):
+        for c in range(capacity, weight - 1, -1):
+            dp[c] = max(dp[c], dp[c - weight] + value)
+    return dp[capacity]
+""" * 4
+SYNTHETIC_TEST_GENERATOR = """import random
+
+def generate_test_cases():
+    cases = []
+    for n in range(1, 20):
+        weights = [random.randint(1, 10) for _ in range(n)]
+        values = [random.randint(1, 100) for _ in range(n)]
+        cases.append({"input": {"weights": weights, "values": values, "capacity": 25}, "expected_output": None})
+    return cases
+""" * 3
+SYNTHETIC_DESCRIPTION = (
+    "### Problem\nA thief wants to pack the most valuable items into a bag of limited capacity.\n\n"
+    "### Input Format\nThe first line contains N and W. Each of the next N lines contains a weight and a value.\n\n"
+    "### Output Format\nPrint the maximum total value.\n\n"
+    "### Constraints\n1 <= N <= 100, 1 <= W <= 100000\n\n"
+    "### Examples\nInput:\n3 5\n1 10\n2 20\n3 30\nOutput:\n50\n"
+) * 4
+SYNTHETIC_RESPONSES = [
+    # problem-generator-v2
+    ("Analyze the following user request", json.dumps({
+        "analyzed_intent": "0/1 knapsack with dynamic programming over capacity.",
+        "test_specs": [{"input": {"weights": [1, 2, 3], "values": [10, 20, 30], "capacity": 5}, "expected_output": 50}] * 8,
+    })),
+    ("Generate the solution code in", SYNTHETIC_SOLUTION),
+    ("code for a test case generator", SYNTHETIC_TEST_GENERATOR),
+    ("Review the provided solution code", json.dumps({"status": "Pass", "details": "Consistent."})),
+    ("derive appropriate constraints", json.dumps({
+        "time_limit_seconds": 1.0, "memory_limit_mb": 256, "input_constraints": "1 <= N <= 100, 1 <= W <= 100000",
+    })),
+    ("Generate a user-facing problem description", SYNTHETIC_DESCRIPTION),
+    # ProblemGenerator
+    ("다음 템플릿 코드를 분석하고", "핵심 아이디어: 배낭 문제의 용량별 DP. 변형 계획: 변수명과 상수 변경.\n" * 10),
+    ("**최소한으로 변형**", f"```python\n{SYNTHETIC_SOLUTION}```"),
+    ("문제 설명을 JSON 형식으로", json.dumps({
+        "problem_title": "도둑의 배낭", "description": SYNTHETIC_DESCRIPTION, "input_format": "N W",
+        "output_format": "최대 가치", "constraints": "1 <= N <= 100",
+    }, ensure_ascii=False)),
+    ("테스트 케이스 생성 코드와 예제를", json.dumps({
+        "test_case_generation_code": SYNTHETIC_TEST_GENERATOR,
+        "generated_examples": [{"input": "3 5\n1 10\n2 20\n3 30", "output": "50"}] * 3,
+    }, ensure_ascii=False)),
+]
+
+
+def synthetic_response(prompt: str) -> str:
+    for marker, response in SYNTHETIC_RESPONSES:
+        if marker in prompt:
+            return response
+    raise KeyError(f"No synthetic response for prompt: {prompt[:120]!r}")
+
+
+# --- 측정용 대역 ---
+class Timings:
+    """이름별 소요 시간(초) 목록 (스레드 안전)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.samples.setdefault(name, []).append(seconds)
+
+    def total(self, name):
+        return sum(self.samples.get(name, []))
+
+    def count(self, name):
+        return len(self.samples.get(name, []))
+
+
+class TimedTable:
+    """DynamoDB Table 대역: 호출 수와 소요 시간을 기록하고 설정된 지연만큼 대기"""
+
+    def __init__(self, timings, latency_seconds=0.0):
+        self.timings = timings
+        self.latency_seconds = latency_seconds
+        self.items = {}
+
+    def _call(self, operation):
+        start = time.perf_counter()
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        self.timings.add(f"dynamodb.{operation}", time.perf_counter() - start)
+
+    def put_item(self, Item, **kwargs):
+        self._call("put_item")
+        self.items[Item["problemId"]] = dict(Item)
+        return {}
+
+    def update_item(self, Key, **kwargs):
+        self._call("update_item")
+        return {}
+
+    def get_item(self, Key, **kwargs):
+        self._call("get_item")
+        return {"Item": self.items.get(Key["problemId"])}
+
+    def scan(self, **kwargs):
+        self._call("scan")
+        return {"Items": []}
+
+
+class TimedResource:
+    def __init__(self, table):
+        self.table = table
+
+    def Table(self, name):
+        return self.table
+
+
+class FakeLambdaContext:
+    aws_request_id = "benchmark"
+
+    def get_remaining_time_in_millis(self):
+        return 900_000
+
+
+class CountingStream:
+    """Lambda 응답 스트림 대역 (generate_problem_stream용): 쓰기 횟수, 바이트, 시간 기록"""
+
+    def __init__(self, timings):
+        self.timings = timings
+        self.bytes = 0
+        self.marks = []  # (시각, 메시지 종류) - 단계 구분용
+
+    def write(self, data: bytes):
+        start = time.perf_counter()
+        self.bytes += len(data)
+        message_type = json.loads(data.decode("utf-8")).get("type")
+        self.marks.append((start, message_type))
+        self.timings.add("stream.write", time.perf_counter() - start)
+
+
+def format_stream_message(msg_type, payload):
+    """problem-generator-streaming의 format_stream_message와 같은 형식 (JSON Lines)"""
+    return json.dumps({"type": msg_type, "payload": payload}) + "\n"
+
+
+# --- 파이프라인별 실행 ---
+def run_v2(args, timings):
+    import lambda_function as v2
+
+    table = TimedTable(timings, args.dynamodb_latency_ms / 1000)
+    v2.dynamodb = TimedResource(table)
+    step_ms = {}
+    original_send_sse = v2.send_sse
+    original_parse = v2.parse_structured_output
+    sse_sink = io.TextIOWrapper(io.BytesIO(), encoding="utf-8")
+
+    def timed_send_sse(event_type, payload):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(sse_sink):
+            original_send_sse(event_type, payload)
+        timings.add("sse.write", time.perf_counter() - start)
+
+    def record_node_status(kind, node, info, deadline=None):
+        if kind == "completed":
+            step_ms[node.name] = info.get("elapsedMs")
+        v2.send_sse("status", {"step": node.step, "node": node.name, "state": kind})
+
+    async def timed_parse(*parse_args, **parse_kwargs):
+        start = time.perf_counter()
+        try:
+            return await original_parse(*parse_args, **parse_kwargs)
+        finally:
+            timings.add("parse", time.perf_counter() - start)
+
+    def simulated_llm_seconds():  # 모델은 라우터에 캐시되어 실행 간에 재사용되므로 차이로 계산
+        return sum(llm.stats["simulated_seconds"] for llm in v2.model_router.llms() if hasattr(llm, "stats"))
+
+    simulated_before = simulated_llm_seconds()
+    v2.send_sse, v2.send_node_status, v2.parse_structured_output = timed_send_sse, record_node_status, timed_parse
+    try:
+        event = {"body": json.dumps({"prompt": args.prompt, "difficulty": "Medium", "noCache": True})}
+        start = time.perf_counter()
+        v2.lambda_handler(event, FakeLambdaContext())
+        elapsed = time.perf_counter() - start
+    finally:
+        v2.send_sse, v2.send_node_status, v2.parse_structured_output = original_send_sse, v2.send_node_status, original_parse
+    if len(step_ms) != 6:
+        raise RuntimeError(f"v2 pipeline did not complete (finished steps: {sorted(step_ms)})")
+    for name, ms in step_ms.items():
+        timings.add(f"step.{name}", ms / 1000)
+    return elapsed, simulated_llm_seconds() - simulated_before
+
+
+def make_generator():
+    from generation.generator import ProblemGenerator
+
+    return ProblemGenerator(api_key="replay", verbose=False)  # 재생 모드에서는 키를 쓰지 않음
+
+
+def record_progress_steps(generator, timings):
+    """show_progress 호출 시각으로 generate_problem의 단계별 시간을 기록"""
+    marks = []
+    original = generator.show_progress
+
+    def show_progress(step, total_steps=6, message=""):
+        marks.append((time.perf_counter(), step))
+        original(step, total_steps, message)
+
+    generator.show_progress = show_progress
+    return marks
+
+
+def run_generate(args, timings, algorithm_type, difficulty):
+    generator = make_generator()
+    marks = record_progress_steps(generator, timings)
+    start = time.perf_counter()
+    result = generator.generate_problem(algorithm_type, difficulty, use_pool=False)
+    elapsed = time.perf_counter() - start
+    if "error" in result:
+        raise RuntimeError(f"generate_problem failed: {result['error']}")
+    for (t0, step), (t1, _) in zip(marks, marks[1:]):
+        timings.add(f"step.{step}", t1 - t0)
+    return elapsed, generator.model.stats["simulated_seconds"]
+
+
+def run_stream(args, timings, algorithm_type, difficulty):
+    generator = make_generator()
+    stream = CountingStream(timings)
+    start = time.perf_counter()
+    asyncio.run(generator.generate_problem_stream(algorithm_type, difficulty, stream, format_stream_message, verbose=False))
+    elapsed = time.perf_counter() - start
+    status_marks = [mark for mark in stream.marks if mark[1] == "status"] + [(start + elapsed, "end")]
+    for index, ((t0, _), (t1, _)) in enumerate(zip(status_marks, status_marks[1:])):
+        timings.add(f"step.{index}", t1 - t0)
+    timings.add("stream.bytes", stream.bytes)
+    return elapsed, generator.model.stats["simulated_seconds"]
+
+
+# --- 집계/비교 ---
+def summarize(values):
+    ordered = sorted(values)
+    return {
+        "median": round(statistics.median(ordered) * 1000, 3),
+        "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+        "max": round(ordered[-1] * 1000, 3),
+    }
+
+
+def benchmark(pipeline, args):
+    from generation.generator import ALGORITHM_TYPES, DIFFICULTY_LEVELS
+
+    algorithm_type, difficulty = ALGORITHM_TYPES[2], DIFFICULTY_LEVELS[2]  # 다이나믹 프로그래밍 / 보통
+    timings = Timings()
+    end_to_end, simulated = [], []
+    with contextlib.ExitStack() as stack:
+        if not args.verbose:
+            stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+        for iteration in range(args.warmup + args.iterations):
+            run_timings = Timings()
+            if pipeline == "v2":
+                elapsed, llm_seconds = run_v2(args, run_timings)
+            elif pipeline == "generate":
+                elapsed, llm_seconds = run_generate(args, run_timings, algorithm_type, difficulty)
+            else:
+                elapsed, llm_seconds = run_stream(args, run_timings, algorithm_type, difficulty)
+            if iteration < args.warmup:
+                continue
+            end_to_end.append(elapsed)
+            simulated.append(llm_seconds)
+            for name, values in run_timings.samples.items():
+                timings.add(name, sum(values))
+                timings.add(f"{name}#count", len(values))
+
+    report = {
+        "iterations": args.iterations,
+        "endToEndMs": summarize(end_to_end),
+        "simulatedLlmMs": summarize(simulated),
+        "steps": {},
+        "costs": {},
+    }
+    for name, values in sorted(timings.samples.items()):
+        if name.endswith("#count"):
+            continue
+        calls = statistics.median(timings.samples.get(f"{name}#count", [0]))
+        if name.startswith("step."):
+            report["steps"][name[5:]] = summarize(values)
+        elif name == "stream.bytes":
+            report["costs"]["stream.bytes"] = statistics.median(values)
+        else:
+            report["costs"][name] = {**summarize(values), "callsPerRun": calls}
+    return report
+
+
+def compare(report, baseline, max_regression):
+    """중앙값 종단 지연이 기준보다 max_regression 비율 이상 늘어난 파이프라인 목록"""
+    regressions = []
+    for pipeline, result in report.items():
+        base = baseline.get(pipeline)
+        if not base:
+            continue
+        before, after = base["endToEndMs"]["median"], result["endToEndMs"]["median"]
+        if before > 0 and (after - before) / before > max_regression:
+            regressions.append(f"{pipeline}: {before:.1f}ms -> {after:.1f}ms")
+    return regressions
+
+
+def print_report(report):
+    for pipeline, result in report.items():
+        e2e = result["endToEndMs"]
+        print(f"\n== {pipeline} ({result['iterations']}회) 종단 지연 median {e2e['median']}ms, p95 {e2e['p95']}ms"
+              f" (모의 LLM 시간 median {result['simulatedLlmMs']['median']}ms)")
+        for step, stats in result["steps"].items():
+            print(f"   단계 {step:<16} median {stats['median']:>9}ms  p95 {stats['p95']:>9}ms")
+        for name, stats in result["costs"].items():
+            if isinstance(stats, dict):
+                print(f"   {name:<21} median {stats['median']:>9}ms  호출 {stats['callsPerRun']}회/실행")
+            else:
+                print(f"   {name:<21} {stats}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="문제 생성 파이프라인 오프라인 벤치마크 (녹화/합성 LLM 응답 사용)")
+    parser.add_argument("-p", "--pipeline", action="append", choices=PIPELINES, help="측정할 파이프라인 (기본값: 전체)")
+    parser.add_argument("-n", "--iterations", type=int, default=5, help="측정 반복 횟수")
+    parser.add_argument("--warmup", type=int, default=1, help="측정에서 제외할 초기 실행 횟수")
+    parser.add_argument("--recordings", type=str, default="", help="녹화 응답 파일 (LLM_REPLAY_FILE 형식, 없으면 합성 응답만 사용)")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="LLM 호출별 첫 토큰 지연 (ms)")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="LLM 출력 속도 (0이면 즉시)")
+    parser.add_argument("--dynamodb-latency-ms", type=float, default=0.0, help="v2 DynamoDB 호출별 지연 (ms)")
+    parser.add_argument("--prompt", type=str, default="0/1 knapsack with dynamic programming", help="v2 사용자 프롬프트")
+    parser.add_argument("-o", "--output", type=str, help="결과 JSON 저장 경로")
+    parser.add_argument("--compare", type=str, help="비교할 이전 결과 JSON")
+    parser.add_argument("--max-regression", type=float, default=0.25, help="허용하는 종단 지연 증가 비율")
+    parser.add_argument("-v", "--verbose", action="store_true", help="파이프라인 로그 출력")
+    args = parser.parse_args()
+
+    configure_replay(
+        path=args.recordings,
+        mode="replay",
+        latency_seconds=args.latency_ms / 1000,
+        tokens_per_second=args.tokens_per_second,
+        responder=synthetic_response,
+    )
+    report = {pipeline: benchmark(pipeline, args) for pipeline in (args.pipeline or PIPELINES)}
+    print_report(report)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"\n결과가 {args.output} 파일에 저장되었습니다.")
+    if args.compare:
+        regressions = compare(report, json.loads(Path(args.compare).read_text(encoding="utf-8")), args.max_regression)
+        if regressions:
+            print("\n성능 저하 감지:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("\n기준 대비 성능 저하 없음.")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,7 +11,6 @@ import subprocess
 import importlib.util
 import textwrap
 from typing import List, Dict, Any, Union
-import asyncio
 import traceback
 
 # langchain 관련 import 추가
@@ -30,6 +29,13 @@ if str(problem_generator_dir) not in sys.path:
 
 # Now import using the package structure relative to problem_generator_dir
 from utils.model_manager import get_llm # create_chain, create_json_chain 불필요
+from utils.generation_metrics import (
+    GenerationMetrics, measure_parse, measure_step, metrics_callbacks, use_generation_metrics
+)
+from utils.llm_cache import bypass_llm_cache, configure_llm_cache
+from utils.problem_pool import configure_problem_pool, make_pool_key
+from utils.stream_writer import StreamWriter
+from generation.problem_assembly import assemble_problem
 
 # Load environment variables from .env file
 load_dotenv()
@@ -41,6 +47,9 @@ ALGORITHM_TYPES = [
 ]
 DIFFICULTY_LEVELS = ["튜토리얼", "쉬움", "보통", "어려움"]
 
+# 문제 풀(utils/problem_pool.py)에서 이 생성기의 문제를 구분하는 이름
+POOL_GENERATOR_NAME = "problem-generator"
+
 # Difficulty descriptions for prompt generation
 DIFFICULTY_DESCRIPTIONS = {
     "튜토리얼": """
@@ -158,6 +167,10 @@ class ProblemGenerator:
 
         self.model = get_llm(api_key=self.api_key, model_type="thinking")
         self.verbose = verbose
+        # LLM_CACHE_MODE(off | disk | dynamodb)에 따라 모든 체인 호출에 응답 캐시 적용
+        self.llm_cache = configure_llm_cache()
+        # PROBLEM_POOL_TABLE_NAME 설정 시 미리 생성된 문제를 먼저 사용
+        self.problem_pool = configure_problem_pool()
 
         # --- Pre-build Parsers, Lambda, Bound Model --- 
         self.json_parser = JsonOutputParser()
@@ -245,6 +258,7 @@ class ProblemGenerator:
                 - `input_format`: 명확하고 상세한 입력 형식 설명
                 - `output_format`: 명확하고 상세한 출력 형식 설명
                 - `constraints`: 입력 크기, 값의 범위 등 난이도에 맞는 제약 조건
+                - `algorithm_hint`: 난이도가 "튜토리얼"일 경우 알고리즘 설명 및 적용 방식, 아닐 경우 빈 문자열 ""
 
                 지정된 스타일({{style_desc}})과 난이도 요구사항({{difficulty_desc}})을 준수하여 명확하고 논리적인 설명을 각 필드에 맞게 작성해주세요.
                 다른 텍스트 없이, 위 필드들을 포함하는 JSON 객체만 반환해야 합니다.
@@ -277,41 +291,6 @@ class ProblemGenerator:
             ''')
         )
 
-        # 5. Integration Prompt (Simplified & template_file input added)
-        self.integration_prompt = PromptTemplate.from_template(
-            textwrap.dedent(f'''\
-                당신은 알고리즘 문제 생성 전문가입니다. 지금까지 생성된 모든 구성 요소를 통합하여 최종 문제 결과물을 JSON 형식으로 완성해주세요.
-
-                ## 문제 기본 정보
-                - 알고리즘 유형: {{algorithm_type}}
-                - 난이도 수준: {{difficulty}}
-                - 사용된 템플릿 파일: {{template_file}}
-
-                ## 생성된 구성 요소
-                1. 문제 설명 (JSON): {{problem_description}} # 주의: 이 입력은 dict
-                2. 테스트 케이스 (JSON): {{test_cases}} # 주의: 이 입력은 dict
-                3. 변형된 코드 (문자열):
-                   ```python
-                   {{transformed_code}}
-                   ```
-
-                ## 최종 결과물 필드 생성 지침
-                - `problem_title`: `problem_description`의 `problem_title` 사용.
-                - `description`: `problem_description`의 `description` 사용.
-                - `input_format`: `problem_description`의 `input_format` 사용.
-                - `output_format`: `problem_description`의 `output_format` 사용.
-                - `constraints`: `problem_description`의 `constraints` 사용.
-                - `example_input`: `test_cases`의 `generated_examples` 리스트가 비어있지 않으면 첫 번째 요소의 `input` 사용, 비어있으면 빈 문자열 "" 사용.
-                - `example_output`: `test_cases`의 `generated_examples` 리스트가 비어있지 않으면 첫 번째 요소의 `output` 사용, 비어있으면 빈 문자열 "" 사용.
-                - `algorithm_hint`: 난이도가 "튜토리얼"일 경우 알고리즘 설명 및 적용 방식 서술, 아닐 경우 빈 문자열 "" 사용.
-                - `solution_code`: `transformed_code` 문자열 사용.
-                - `test_case_generation_code`: `test_cases`의 `test_case_generation_code` 사용.
-                - `template_source`: 입력으로 받은 `template_file` 문자열 사용.
-
-                다른 어떤 텍스트도 포함하지 말고, 위의 지침에 따라 각 필드를 채운 최종 JSON 객체 하나만 생성하여 반환하세요.
-            ''')
-        )
-
     def show_progress(self, step, total_steps=6, message=""): # 총 단계 수를 6으로 조정
         """Display progress information for the current step"""
         if not self.verbose:
@@ -330,8 +309,27 @@ class ProblemGenerator:
         if step == total_steps:
             sys.stdout.write('\n')
 
-    def generate_problem(self, algorithm_type, difficulty):
+    def claim_pooled_problem(self, algorithm_type, difficulty):
+        """미리 생성된 문제를 풀에서 가져옵니다. 풀이 없거나 비어 있으면 None."""
+        if not self.problem_pool:
+            return None
+        try:
+            pooled = self.problem_pool.claim(make_pool_key(POOL_GENERATOR_NAME, algorithm_type, difficulty))
+        except Exception as e:
+            print(f"문제 풀 조회 실패, 실시간 생성으로 진행합니다: {e}")
+            return None
+        if pooled is None:
+            return None
+        return {**pooled, "from_pool": True}
+
+    def generate_problem(self, algorithm_type, difficulty, use_pool=True):
         """Generate a problem using LCEL pipeline (using pre-built components)."""
+        if use_pool:
+            pooled = self.claim_pooled_problem(algorithm_type, difficulty)
+            if pooled:
+                if self.verbose:
+                    print(f"\n{algorithm_type} 유형의 {difficulty} 난이도 문제를 문제 풀에서 가져왔습니다.")
+                return pooled
         if self.verbose:
             print(f"\n{algorithm_type} 유형의 {difficulty} 난이도 문제 생성을 시작합니다...\n")
         start_time = time.time()
@@ -356,32 +354,44 @@ class ProblemGenerator:
             "style_desc": style_desc,
             "difficulty_desc": difficulty_desc
         }
-        def wrap_with_progress(step, message, runnable):
+        def assemble(state):
+            # 최종 통합은 LLM 없이 필드만 옮겨 담음 (generate_problem_stream과 같은 함수)
+            return assemble_problem(
+                algorithm_type, difficulty, template_file,
+                state["problem_description"], state["test_cases"], state["transformed_code"],
+            )
+        clean_code = RunnableLambda(lambda message: self._clean_llm_code_output(getattr(message, "content", str(message))))
+
+        def wrap_with_progress(step, name, message, runnable):
             def update_and_run(inputs):
                 self.show_progress(step, 6, message)
-                return runnable.invoke(inputs)
+                # 단계별 소요 시간/토큰 사용량 기록 (generation_metrics)
+                with measure_step(name):
+                    return runnable.invoke(inputs, config={"callbacks": metrics_callbacks()})
             return update_and_run
 
         # self의 속성을 사용하여 파이프라인 정의
         pipeline = (
             RunnablePassthrough.assign(
-                template_analysis=wrap_with_progress(2, "템플릿 분석 중...", self.template_analysis_prompt | self.model)
+                template_analysis=wrap_with_progress(2, "template_analysis", "템플릿 분석 중...", self.template_analysis_prompt | self.model)
             )
             | RunnablePassthrough.assign(
-                transformed_code=wrap_with_progress(3, "코드 변형 중...", self.code_transform_prompt | self.model)
+                transformed_code=wrap_with_progress(3, "code_transform", "코드 변형 중...", self.code_transform_prompt | self.model | clean_code)
             )
             | RunnablePassthrough.assign(
-                problem_description=wrap_with_progress(4, "문제 설명 생성 중...", self.description_prompt | self.json_mode_model | self.json_parser)
+                problem_description=wrap_with_progress(4, "description", "문제 설명 생성 중...", self.description_prompt | self.json_mode_model | self.json_parser)
             )
             | RunnablePassthrough.assign(
-                test_cases=wrap_with_progress(5, "테스트 케이스 생성 중...", self.test_cases_prompt | self.json_mode_model | self.json_parser)
+                test_cases=wrap_with_progress(5, "test_cases", "테스트 케이스 생성 중...", self.test_cases_prompt | self.json_mode_model | self.json_parser | self.ensure_structure_lambda)
             )
-            | wrap_with_progress(6, "최종 결과 통합 중...", self.integration_prompt | self.json_mode_model | self.json_parser)
+            | wrap_with_progress(6, "integration", "최종 결과 통합 중...", RunnableLambda(assemble))
         )
 
-        # --- 파이프라인 실행 및 결과 반환 (변경 없음) ---
+        # --- 파이프라인 실행 및 결과 반환 ---
+        metrics = GenerationMetrics(POOL_GENERATOR_NAME)
         try:
-            result = pipeline.invoke(initial_state)
+            with use_generation_metrics(metrics):
+                result = pipeline.invoke(initial_state)
             end_time = time.time()
             elapsed_time = end_time - start_time
             self.show_progress(6, 6, f"완료! (소요 시간: {elapsed_time:.1f}초)")
@@ -390,12 +400,13 @@ class ProblemGenerator:
                 "difficulty": difficulty,
                 "template_used": template_file,
                 "generated_problem_json": result,
-                "generation_time": elapsed_time
+                "generation_time": elapsed_time,
+                "generation_metrics": metrics.summary(),
             }
         except Exception as e:
             print(f"\n파이프라인 실행 중 오류 발생: {e}")
             self.show_progress(6, 6, "오류 발생으로 중단")
-            return {"error": f"파이프라인 실행 실패: {e}"}
+            return {"error": f"파이프라인 실행 실패: {e}", "generation_metrics": metrics.summary()}
 
     def _clean_llm_code_output(self, code_str: str) -> str:
         """Removes markdown code blocks (```) from LLM string output."""
@@ -414,20 +425,25 @@ class ProblemGenerator:
         difficulty: str,
         response_stream,
         format_stream_message_func,
-        verbose: bool = True
+        verbose: bool = True,
+        stream_writer: StreamWriter = None,
     ):
-        """문제 생성을 스트리밍 방식으로 처리 (using pre-built components, refactored)."""
+        """
+        문제 생성을 스트리밍 방식으로 처리 (using pre-built components, refactored).
+        stream_writer를 넘기면 호출자와 같은 전송기(프레임/바이트 집계)를 사용합니다.
+        """
         request_id = getattr(response_stream, 'context', None)
         request_id = getattr(request_id, 'aws_request_id', "local") if request_id else "local"
         if verbose: print(f"[{request_id}] 스트리밍 문제 생성 시작: {algorithm_type} ({difficulty})")
         start_time = time.time()
         final_payload = []
+        metrics = GenerationMetrics(POOL_GENERATOR_NAME, request_id)
+        writer = stream_writer or StreamWriter(response_stream, format_stream_message_func)
 
         try:
             # --- 0. 템플릿 로드 ---
             if verbose: print(f"[{request_id}] 단계 0: 템플릿 로드 중...")
-            response_stream.write(format_stream_message_func("status", "템플릿 파일 불러오는 중...").encode('utf-8'))
-            await asyncio.sleep(0.1)
+            await writer.send_and_drain("status", "템플릿 파일 불러오는 중...")
             try:
                 template_code, template_file = load_template(algorithm_type, difficulty)
             except (ValueError, FileNotFoundError) as e:
@@ -447,17 +463,23 @@ class ProblemGenerator:
 
             # --- 1. 템플릿 분석 ---
             if verbose: print(f"[{request_id}] 단계 1: 템플릿 분석 중...")
-            response_stream.write(format_stream_message_func("status", "템플릿 코드 분석 중...").encode('utf-8'))
-            await asyncio.sleep(0.1)
-            analysis_result = await analysis_chain.ainvoke({"algorithm_type": algorithm_type, "difficulty": difficulty, "template_code": template_code})
+            await writer.send_and_drain("status", "템플릿 코드 분석 중...")
+            with use_generation_metrics(metrics), measure_step("template_analysis"):
+                analysis_result = await analysis_chain.ainvoke(
+                    {"algorithm_type": algorithm_type, "difficulty": difficulty, "template_code": template_code},
+                    config={"callbacks": metrics_callbacks()},
+                )
             intermediate_results["template_analysis"] = analysis_result.content if hasattr(analysis_result, 'content') else str(analysis_result)
             if verbose: print(f"[{request_id}] 템플릿 분석 완료.")
 
             # --- 2. 코드 변형 ---
             if verbose: print(f"[{request_id}] 단계 2: 코드 변형 중...")
-            response_stream.write(format_stream_message_func("status", "코드 변형 중...").encode('utf-8'))
-            await asyncio.sleep(0.1)
-            transformed_code_result = await transform_chain.ainvoke({"template_analysis": intermediate_results["template_analysis"], "template_code": template_code})
+            await writer.send_and_drain("status", "코드 변형 중...")
+            with use_generation_metrics(metrics), measure_step("code_transform"):
+                transformed_code_result = await transform_chain.ainvoke(
+                    {"template_analysis": intermediate_results["template_analysis"], "template_code": template_code},
+                    config={"callbacks": metrics_callbacks()},
+                )
             transformed_code_str = transformed_code_result.content if hasattr(transformed_code_result, 'content') else str(transformed_code_result)
             # Use helper method to clean code output
             intermediate_results["transformed_code"] = self._clean_llm_code_output(transformed_code_str)
@@ -465,58 +487,54 @@ class ProblemGenerator:
 
             # --- 3. 문제 설명 생성 (스트리밍) ---
             if verbose: print(f"[{request_id}] 단계 3: 문제 설명 생성 스트리밍 시작...")
-            response_stream.write(format_stream_message_func("status", "문제 설명 생성 스트리밍 시작...").encode('utf-8'))
-            await asyncio.sleep(0.1)
+            await writer.send_and_drain("status", "문제 설명 생성 스트리밍 시작...")
             full_llm_description = ""
-            async for chunk in description_chain.astream({
-                "algorithm_type": algorithm_type, "difficulty": difficulty,
-                "style_desc": style_desc, "difficulty_desc": difficulty_desc,
-                "transformed_code": intermediate_results["transformed_code"],
-            }):
-                token_payload = chunk.content if hasattr(chunk, 'content') else str(chunk)
-                full_llm_description += token_payload
-                response_stream.write(format_stream_message_func("token", token_payload).encode('utf-8'))
-                await asyncio.sleep(0.02)
-            try:
-                intermediate_results["problem_description"] = self.json_parser.parse(full_llm_description)
-            except Exception as parse_err:
-                 raise ValueError(f"문제 설명 JSON 파싱 실패: {parse_err}\n원본 응답: {full_llm_description[:500]}...")
+            with use_generation_metrics(metrics), measure_step("description"):
+                async for chunk in description_chain.astream({
+                    "algorithm_type": algorithm_type, "difficulty": difficulty,
+                    "style_desc": style_desc, "difficulty_desc": difficulty_desc,
+                    "transformed_code": intermediate_results["transformed_code"],
+                }, config={"callbacks": metrics_callbacks()}):
+                    token_payload = chunk.content if hasattr(chunk, 'content') else str(chunk)
+                    full_llm_description += token_payload
+                    await writer.add_token(token_payload)  # 크기/시간 창 단위로 모아서 전송
+                writer.flush_tokens()
+                try:
+                    with measure_parse():
+                        intermediate_results["problem_description"] = self.json_parser.parse(full_llm_description)
+                except Exception as parse_err:
+                     raise ValueError(f"문제 설명 JSON 파싱 실패: {parse_err}\n원본 응답: {full_llm_description[:500]}...")
             if not isinstance(intermediate_results["problem_description"], dict):
                  raise ValueError(f"문제 설명이 유효한 JSON 객체가 아님: {type(intermediate_results['problem_description'])}")
             if verbose: print(f"[{request_id}] 문제 설명 생성 스트리밍 완료.")
 
             # --- 4. 테스트 케이스 생성 ---
             if verbose: print(f"[{request_id}] 단계 4: 테스트 케이스 생성 중...")
-            response_stream.write(format_stream_message_func("status", "테스트 케이스 생성 중...").encode('utf-8'))
-            await asyncio.sleep(0.1)
-            intermediate_results["test_cases"] = await test_cases_chain.ainvoke({
-                "problem_description": intermediate_results["problem_description"],
-                "transformed_code": intermediate_results["transformed_code"]
-            })
+            await writer.send_and_drain("status", "테스트 케이스 생성 중...")
+            with use_generation_metrics(metrics), measure_step("test_cases"):
+                intermediate_results["test_cases"] = await test_cases_chain.ainvoke({
+                    "problem_description": intermediate_results["problem_description"],
+                    "transformed_code": intermediate_results["transformed_code"]
+                }, config={"callbacks": metrics_callbacks()})
             if verbose: print(f"[{request_id}] 테스트 케이스 생성 완료.")
 
             # --- 5. 최종 결과 통합 (Python 로직) ---
             if verbose: print(f"[{request_id}] 단계 5: 최종 결과 통합 중...")
-            response_stream.write(format_stream_message_func("status", "최종 결과 통합 및 포맷팅 중...").encode('utf-8'))
-            await asyncio.sleep(0.1)
-            desc_data = intermediate_results["problem_description"]
-            test_data = intermediate_results["test_cases"]
-            examples = test_data.get("generated_examples", [])
+            await writer.send_and_drain("status", "최종 결과 통합 및 포맷팅 중...")
             final_result_json = {
                 "id": hash(intermediate_results["transformed_code"] + str(time.time())) % 100000,
-                "title": desc_data.get("problem_title", f"{algorithm_type} {difficulty} 문제"),
-                "description": desc_data.get("description", ""), "difficulty": difficulty,
-                "input_format": desc_data.get("input_format", ""), "output_format": desc_data.get("output_format", ""),
-                "constraints": desc_data.get("constraints", ""),
-                "example_input": examples[0].get("input", "") if examples else "", "example_output": examples[0].get("output", "") if examples else "",
-                "solution_code": intermediate_results["transformed_code"],
-                "test_case_generation_code": test_data.get("test_case_generation_code", ""),
-                "template_source": template_file
+                **assemble_problem(
+                    algorithm_type, difficulty, template_file,
+                    intermediate_results["problem_description"], intermediate_results["test_cases"],
+                    intermediate_results["transformed_code"],
+                ),
+                "generation_metrics": metrics.summary(),  # 단계별 소요 시간(ms)/토큰 사용량
             }
             final_payload = [final_result_json]
             elapsed_time = time.time() - start_time
             if verbose: print(f"[{request_id}] 최종 결과 통합 완료.")
             if verbose: print(f"[{request_id}] 스트리밍 문제 생성 완료! (소요 시간: {elapsed_time:.1f}초)")
+            print(f"[{request_id}] 스트림 전송: {writer.stats()}")
 
             return final_payload
         except Exception as e:
@@ -524,16 +542,20 @@ class ProblemGenerator:
             error_message = f"스트리밍 문제 생성 중 오류 발생 ({elapsed_time:.1f}초 경과): {str(e)}"
             print(f"[{request_id}] {error_message}\n{traceback.format_exc()}")
             try:
-                response_stream.write(format_stream_message_func("error", error_message).encode('utf-8'))
-                response_stream.write(format_stream_message_func("status", "❌ 오류 발생").encode('utf-8'))
+                writer.send("error", error_message)
+                writer.send("status", "❌ 오류 발생")
             except Exception as write_err: print(f"[{request_id}] 오류 메시지 스트림 전송 실패: {write_err}")
             raise e
 
 
 # Helper function (if used externally) - 이 부분은 유지하거나 필요에 맞게 수정
-def generate_problem(api_key, algorithm_type, difficulty, verbose=True):
+def generate_problem(api_key, algorithm_type, difficulty, verbose=True, use_cache=True, use_pool=True):
     generator = ProblemGenerator(api_key=api_key, verbose=verbose)
-    return generator.generate_problem(algorithm_type, difficulty)
+    with bypass_llm_cache(not use_cache):
+        result = generator.generate_problem(algorithm_type, difficulty, use_pool=use_pool)
+    if generator.llm_cache:
+        print(f"LLM 캐시 통계: {generator.llm_cache.stats()}")
+    return result
 
 # Main execution part (if run as script) - 이 부분은 유지하거나 필요에 맞게 수정
 def main():
@@ -544,6 +566,8 @@ def main():
                         help="생성할 문제의 난이도")
     parser.add_argument("-o", "--output", type=str, help="생성된 문제를 저장할 JSON 파일 경로")
     parser.add_argument("-q", "--quiet", action="store_true", help="진행 상황 메시지 숨김")
+    parser.add_argument("--no-cache", action="store_true", help="LLM 응답 캐시를 사용하지 않음 (LLM_CACHE_MODE 설정 시)")
+    parser.add_argument("--no-pool", action="store_true", help="문제 풀을 사용하지 않고 항상 새로 생성 (PROBLEM_POOL_TABLE_NAME 설정 시)")
 
     args = parser.parse_args()
 
@@ -552,7 +576,8 @@ def main():
         print("오류: GOOGLE_AI_API_KEY 환경 변수가 설정되지 않았습니다.")
         sys.exit(1)
 
-    result = generate_problem(api_key, args.type, args.difficulty, verbose=not args.quiet)
+    result = generate_problem(api_key, args.type, args.difficulty, verbose=not args.quiet, use_cache=not args.no_cache,
+                              use_pool=not args.no_pool)
 
     if "error" in result:
         print(f"\n문제 생성 실패: {result['error']}")
@@ -0,0 +1,65 @@
+import argparse
+import os
+import sys
+from pathlib import Path
+
+# generator.py와 같은 방식으로 'problem-generator' 디렉토리를 import 경로에 추가
+problem_generator_dir = Path(__file__).parent.parent
+if str(problem_generator_dir) not in sys.path:
+    sys.path.insert(0, str(problem_generator_dir))
+
+from generation.generator import ALGORITHM_TYPES, DIFFICULTY_LEVELS, POOL_GENERATOR_NAME, ProblemGenerator
+from utils.problem_pool import (
+    PROBLEM_POOL_CONCURRENCY,
+    PROBLEM_POOL_MIN_INTERVAL_SECONDS,
+    PROBLEM_POOL_TARGET,
+    configure_problem_pool,
+    fill_pool,
+)
+
+
+def fill_problem_pool(api_key=None, algorithm_types=None, difficulties=None, target_count=PROBLEM_POOL_TARGET,
+                      concurrency=PROBLEM_POOL_CONCURRENCY, min_interval_seconds=PROBLEM_POOL_MIN_INTERVAL_SECONDS):
+    """(알고리즘 유형 x 난이도) 조합마다 문제 풀 재고를 target_count까지 채웁니다."""
+    pool = configure_problem_pool()
+    if pool is None:
+        raise ValueError("PROBLEM_POOL_TABLE_NAME 환경 변수가 설정되지 않았습니다.")
+    generator = ProblemGenerator(api_key=api_key, verbose=False)
+
+    def generate(algorithm_type, difficulty):
+        result = generator.generate_problem(algorithm_type, difficulty, use_pool=False)
+        # 파이프라인이 끝까지 성공한 문제만 풀에 넣음
+        if "error" in result or not result.get("generated_problem_json"):
+            print(f"[Problem pool] {algorithm_type}/{difficulty} 생성 실패: {result.get('error', '결과 없음')}")
+            return None
+        return result
+
+    targets = [(t, d) for t in (algorithm_types or ALGORITHM_TYPES) for d in (difficulties or DIFFICULTY_LEVELS)]
+    return fill_pool(pool, POOL_GENERATOR_NAME, targets, generate, target_count=target_count,
+                     concurrency=concurrency, min_interval_seconds=min_interval_seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="문제 풀 채우기 (미리 생성된 문제 재고 유지)")
+    parser.add_argument("-t", "--type", type=str, action="append", choices=ALGORITHM_TYPES,
+                        help="채울 알고리즘 유형 (여러 번 지정 가능, 기본값: 전체)")
+    parser.add_argument("-d", "--difficulty", type=str, action="append", choices=DIFFICULTY_LEVELS,
+                        help="채울 난이도 (여러 번 지정 가능, 기본값: 전체)")
+    parser.add_argument("--target", type=int, default=PROBLEM_POOL_TARGET, help="조합별 목표 재고")
+    parser.add_argument("--concurrency", type=int, default=PROBLEM_POOL_CONCURRENCY, help="동시 생성 수")
+    parser.add_argument("--min-interval", type=float, default=PROBLEM_POOL_MIN_INTERVAL_SECONDS,
+                        help="생성 시작 사이의 최소 간격(초)")
+    args = parser.parse_args()
+
+    api_key = os.getenv("GOOGLE_AI_API_KEY")
+    if not api_key:
+        print("오류: GOOGLE_AI_API_KEY 환경 변수가 설정되지 않았습니다.")
+        sys.exit(1)
+
+    stats = fill_problem_pool(api_key, args.type, args.difficulty, target_count=args.target,
+                              concurrency=args.concurrency, min_interval_seconds=args.min_interval)
+    print(f"\n문제 풀 채우기 완료: 요청 {stats['requested']}개, 추가 {stats['added']}개, 실패 {stats['failed']}개")
+
+
+if __name__ == "__main__":
+    main()
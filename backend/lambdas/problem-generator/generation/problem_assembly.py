@@ -0,0 +1,75 @@
+import json
+from typing import Any, Dict
+
+from pydantic import BaseModel, Field, ValidationError
+
+# 최종 문제 조립: 문제 설명(JSON)과 테스트 케이스(JSON), 변형된 코드에서 필드를 옮겨 담기만 하면 되므로
+# LLM을 거치지 않고 Python으로 합칩니다. generate_problem과 generate_problem_stream이 같은 함수를 사용하며,
+# 결과는 FinalProblem 스키마로 검증합니다.
+
+
+class FinalProblem(BaseModel):
+    """생성된 문제의 최종 형태 (generated_problem_json / 스트리밍 result)"""
+
+    title: str = Field(min_length=1)
+    description: str = Field(min_length=1)
+    difficulty: str
+    input_format: str = ""
+    output_format: str = ""
+    constraints: str = ""
+    example_input: str = ""
+    example_output: str = ""
+    algorithm_hint: str = ""  # 튜토리얼 난이도에서만 채워짐
+    solution_code: str = Field(min_length=1)
+    test_case_generation_code: str = ""
+    template_source: str = ""
+
+
+class ProblemAssemblyError(ValueError):
+    """앞 단계 결과로 최종 문제를 만들 수 없음 (필수 필드 누락 등)"""
+
+
+def _text(value: Any) -> str:
+    """LLM이 문자열 대신 돌려준 리스트/딕셔너리 값을 문자열로 변환"""
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, list) and all(isinstance(item, str) for item in value):
+        return "\n".join(value)
+    return json.dumps(value, ensure_ascii=False)
+
+
+def assemble_problem(
+    algorithm_type: str,
+    difficulty: str,
+    template_file: str,
+    problem_description: Dict[str, Any],
+    test_cases: Dict[str, Any],
+    transformed_code: str,
+) -> Dict[str, Any]:
+    """앞 단계 결과를 최종 문제 딕셔너리로 합칩니다. 스키마에 맞지 않으면 ProblemAssemblyError."""
+    if not isinstance(problem_description, dict):
+        raise ProblemAssemblyError(f"문제 설명이 유효한 JSON 객체가 아님: {type(problem_description)}")
+    test_cases = test_cases if isinstance(test_cases, dict) else {}
+    examples = test_cases.get("generated_examples")
+    first_example = examples[0] if isinstance(examples, list) and examples and isinstance(examples[0], dict) else {}
+    try:
+        problem = FinalProblem(
+            title=_text(problem_description.get("problem_title")) or f"{algorithm_type} {difficulty} 문제",
+            description=_text(problem_description.get("description")),
+            difficulty=difficulty,
+            input_format=_text(problem_description.get("input_format")),
+            output_format=_text(problem_description.get("output_format")),
+            constraints=_text(problem_description.get("constraints")),
+            example_input=_text(first_example.get("input")),
+            example_output=_text(first_example.get("output")),
+            algorithm_hint=_text(problem_description.get("algorithm_hint")),
+            solution_code=transformed_code or "",
+            test_case_generation_code=_text(test_cases.get("test_case_generation_code")),
+            template_source=template_file or "",
+        )
+    except ValidationError as e:
+        fields = ", ".join(".".join(map(str, error["loc"])) for error in e.errors())
+        raise ProblemAssemblyError(f"최종 문제 조립 실패 (필드: {fields})") from e
+    return problem.model_dump()
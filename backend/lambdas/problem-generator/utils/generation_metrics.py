@@ -0,0 +1,236 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+# 생성 단계별 계측: 벽시계 시간, 첫 토큰까지의 시간(TTFT), 토큰 사용량, 파싱 시간, 재시도 횟수.
+# 생성 요청마다 GenerationMetrics를 만들고 use_generation_metrics()로 활성화하면, 그 안에서
+# measure_step()으로 감싼 단계의 LLM 호출이 metrics_callbacks()의 콜백을 통해 집계됩니다.
+# 활성화된 계측이 없으면 모든 함수가 아무 일도 하지 않습니다.
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+# 단계가 끝날 때마다 CloudWatch Embedded Metric Format(EMF) 로그 한 줄 출력 (로그에서 바로 지표로 집계됨)
+GENERATION_METRICS_LOG = os.getenv("GENERATION_METRICS_LOG", "true").lower() == "true"
+GENERATION_METRICS_NAMESPACE = os.getenv("GENERATION_METRICS_NAMESPACE", "ProblemGenerator")
+
+# 현재 요청의 계측 객체와 현재 단계 이름 (asyncio 태스크/LangChain 실행 스레드에도 전파됨)
+_current_metrics = contextvars.ContextVar("generation_metrics", default=None)
+_current_step = contextvars.ContextVar("generation_metrics_step", default=None)
+
+
+def _elapsed_ms(start):
+    return int((time.perf_counter() - start) * 1000)
+
+
+class StepMetrics:
+    """한 단계의 누적 값 (재시도/재질의 호출 포함)"""
+
+    def __init__(self, name):
+        self.name = name
+        self.wall_ms = 0
+        self.ttft_ms: Optional[int] = None  # 단계의 첫 LLM 호출 기준 (스트리밍이 아니면 응답 전체 시간)
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.llm_calls = 0
+        self.parse_ms = 0
+        self.retries = 0
+        self.failed = False
+
+    def to_dict(self) -> Dict[str, int]:
+        """DynamoDB에 저장할 간결한 형태 (정수만, 값이 없는 항목은 생략)"""
+        values = {
+            "ms": self.wall_ms,
+            "ttftMs": self.ttft_ms,
+            "in": self.input_tokens,
+            "out": self.output_tokens,
+            "calls": self.llm_calls,
+            "parseMs": self.parse_ms,
+            "retries": self.retries,
+        }
+        values = {key: value for key, value in values.items() if value}
+        if self.failed:
+            values["failed"] = 1
+        return values
+
+
+def _token_usage(response: LLMResult):
+    """응답 메타데이터에서 (입력, 출력) 토큰 수. 모델이 제공하지 않으면 (0, 0)"""
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    usage = (response.llm_output or {}).get("usage_metadata") or (response.llm_output or {}).get("token_usage") or {}
+    return (
+        usage.get("input_tokens", usage.get("prompt_tokens", 0)),
+        usage.get("output_tokens", usage.get("completion_tokens", 0)),
+    )
+
+
+class StepMetricsCallback(BaseCallbackHandler):
+    """한 단계의 LLM 호출 시작/첫 토큰/종료 시각과 토큰 사용량을 StepMetrics에 기록"""
+
+    def __init__(self, metrics: "GenerationMetrics", step: StepMetrics):
+        self.metrics = metrics
+        self.step = step
+        self._started: Dict[UUID, float] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs: Any):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, **kwargs: Any):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_new_token(self, token, *, run_id: UUID, **kwargs: Any):
+        self._first_token(run_id)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any):
+        self._first_token(run_id)  # 스트리밍하지 않은 호출은 응답 전체가 첫 토큰
+        input_tokens, output_tokens = _token_usage(response)
+        with self.metrics.lock:
+            self.step.llm_calls += 1
+            self.step.input_tokens += input_tokens or 0
+            self.step.output_tokens += output_tokens or 0
+        self._started.pop(run_id, None)
+
+    def on_llm_error(self, error, *, run_id: UUID, **kwargs: Any):
+        self._started.pop(run_id, None)
+
+    def _first_token(self, run_id):
+        start = self._started.get(run_id)
+        if start is None:
+            return
+        with self.metrics.lock:
+            if self.step.ttft_ms is None:
+                self.step.ttft_ms = _elapsed_ms(start)
+        self._started[run_id] = None  # 같은 호출의 이후 토큰은 무시
+
+
+class GenerationMetrics:
+    """생성 요청 하나의 단계별 계측 결과"""
+
+    def __init__(self, generator: str, run_id: Optional[str] = None):
+        self.generator = generator
+        self.run_id = run_id
+        self.lock = threading.Lock()
+        self.steps: Dict[str, StepMetrics] = {}
+        self._started = time.perf_counter()
+
+    def step(self, name) -> StepMetrics:
+        with self.lock:
+            if name not in self.steps:
+                self.steps[name] = StepMetrics(name)
+            return self.steps[name]
+
+    def summary(self) -> Dict[str, Any]:
+        """Problems 아이템의 generationMetrics 속성 값"""
+        steps = list(self.steps.values())
+        return {
+            "totalMs": _elapsed_ms(self._started),
+            "inputTokens": sum(step.input_tokens for step in steps),
+            "outputTokens": sum(step.output_tokens for step in steps),
+            "retries": sum(step.retries for step in steps),
+            "steps": {step.name: step.to_dict() for step in steps},
+        }
+
+    def timings(self) -> Dict[str, Any]:
+        """클라이언트에 보내는 단계별 소요 시간(ms)"""
+        return {
+            "totalMs": _elapsed_ms(self._started),
+            "steps": {step.name: step.wall_ms for step in self.steps.values()},
+        }
+
+    def log_step(self, step: StepMetrics):
+        """CloudWatch EMF 형식의 지표 로그 한 줄"""
+        if not GENERATION_METRICS_LOG:
+            return
+        values = {
+            "StepLatency": (step.wall_ms, "Milliseconds"),
+            "TimeToFirstToken": (step.ttft_ms, "Milliseconds"),
+            "InputTokens": (step.input_tokens, "Count"),
+            "OutputTokens": (step.output_tokens, "Count"),
+            "ParseTime": (step.parse_ms, "Milliseconds"),
+            "Retries": (step.retries, "Count"),
+        }
+        values = {name: value for name, value in values.items() if value[0] is not None}
+        record = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [
+                    {
+                        "Namespace": GENERATION_METRICS_NAMESPACE,
+                        "Dimensions": [["Generator", "Step"]],
+                        "Metrics": [{"Name": name, "Unit": unit} for name, (_, unit) in values.items()],
+                    }
+                ],
+            },
+            "Generator": self.generator,
+            "Step": step.name,
+            "runId": self.run_id,
+            "failed": step.failed,
+            **{name: value for name, (value, _) in values.items()},
+        }
+        print(json.dumps(record))
+
+
+@contextmanager
+def use_generation_metrics(metrics: Optional[GenerationMetrics]):
+    """이 컨텍스트 안의 measure_step() 단계들을 `metrics`에 기록"""
+    token = _current_metrics.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current_metrics.reset(token)
+
+
+@contextmanager
+def measure_step(name):
+    """단계 전체(재시도 포함)의 벽시계 시간을 재고, 끝나면 지표 로그를 출력합니다."""
+    metrics = _current_metrics.get()
+    if metrics is None:
+        yield None
+        return
+    step = metrics.step(name)
+    token = _current_step.set(step)
+    start = time.perf_counter()
+    try:
+        yield step
+    except BaseException:
+        step.failed = True
+        raise
+    finally:
+        step.wall_ms += _elapsed_ms(start)
+        _current_step.reset(token)
+        metrics.log_step(step)
+
+
+def metrics_callbacks() -> List[BaseCallbackHandler]:
+    """현재 단계의 LLM 호출에 넘길 콜백 목록 (config={"callbacks": ...}). 계측 중이 아니면 빈 목록"""
+    metrics, step = _current_metrics.get(), _current_step.get()
+    if metrics is None or step is None:
+        return []
+    return [StepMetricsCallback(metrics, step)]
+
+
+@contextmanager
+def measure_parse():
+    """현재 단계의 출력 파싱 시간 누적"""
+    step = _current_step.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if step is not None:
+            step.parse_ms += _elapsed_ms(start)
+
+
+def count_retry():
+    """현재 단계의 재시도(다른 모델로 재실행, 형식 오류 재질의) 횟수 증가"""
+    step = _current_step.get()
+    if step is not None:
+        step.retries += 1
@@ -0,0 +1,203 @@
+import contextvars
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Optional
+
+# LangChain 전역 LLM 캐시 훅을 사용하므로 모든 체인 호출(invoke/ainvoke)에 자동으로 적용됩니다.
+from langchain_core.caches import BaseCache
+from langchain_core.globals import get_llm_cache, set_llm_cache
+from langchain_core.load import dumps, loads
+
+# 캐시 설정 (환경 변수)
+LLM_CACHE_MODE = os.getenv("LLM_CACHE_MODE", "off").lower()  # off | disk | dynamodb
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(24 * 3600)))
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", "/tmp/llm-cache")
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+LLM_CACHE_TABLE_NAME = os.getenv("LLM_CACHE_TABLE_NAME", "")
+DYNAMODB_MAX_VALUE_BYTES = 350 * 1024  # DynamoDB 아이템 최대 크기(400KB) 이하로 유지
+
+# 요청 단위 캐시 우회 플래그 (asyncio 태스크에도 전파됨)
+_bypass_cache = contextvars.ContextVar("llm_cache_bypass", default=False)
+
+
+@contextmanager
+def bypass_llm_cache(enabled=True):
+    """이 컨텍스트 안의 LLM 호출은 캐시를 읽지도 쓰지도 않습니다 (재시도 등)."""
+    token = _bypass_cache.set(enabled)
+    try:
+        yield
+    finally:
+        _bypass_cache.reset(token)
+
+
+def make_cache_key(prompt: str, llm_string: str) -> str:
+    """모델 설정 문자열(모델 이름, temperature 등 포함)과 렌더링된 프롬프트 전체의 해시"""
+    return hashlib.sha256(json.dumps([llm_string, prompt]).encode("utf-8")).hexdigest()
+
+
+# --- 저장소 ---
+class DiskCacheBackend:
+    """로컬 디스크 저장소: 키 하나당 파일 하나, TTL 만료 + 전체 크기 초과 시 오래된 항목부터 삭제 (LRU)"""
+
+    def __init__(self, directory=LLM_CACHE_DIR, max_bytes=LLM_CACHE_MAX_BYTES):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return self.directory / key[:2] / f"{key}.json"
+
+    def get(self, key) -> Optional[str]:
+        path = self._path(key)
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if entry.get("expiresAt", 0) < time.time():
+            path.unlink(missing_ok=True)
+            return None
+        os.utime(path)  # LRU 순서 갱신
+        return entry["value"]
+
+    def set(self, key, value: str, ttl_seconds: int):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps({"expiresAt": time.time() + ttl_seconds, "value": value}), encoding="utf-8")
+        os.replace(tmp_path, path)
+        self._evict_if_needed()
+
+    def clear(self):
+        for path in self.directory.glob("*/*.json"):
+            path.unlink(missing_ok=True)
+
+    def _evict_if_needed(self):
+        with self._lock:
+            files = []
+            total = 0
+            for path in self.directory.glob("*/*.json"):
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+            if total <= self.max_bytes:
+                return
+            # 최대 크기의 90%까지 오래 사용되지 않은 항목부터 삭제
+            for _, size, path in sorted(files):
+                path.unlink(missing_ok=True)
+                total -= size
+                if total <= self.max_bytes * 0.9:
+                    break
+
+
+class DynamoDBCacheBackend:
+    """DynamoDB 저장소: 파티션 키 cacheKey, 만료는 expiresAt(테이블 TTL 속성)으로 처리"""
+
+    def __init__(self, table_name=LLM_CACHE_TABLE_NAME):
+        import boto3  # 디스크 캐시만 쓰는 로컬 환경에서는 불필요
+
+        if not table_name:
+            raise ValueError("LLM_CACHE_TABLE_NAME must be set for the dynamodb LLM cache.")
+        self.table = boto3.resource("dynamodb").Table(table_name)
+
+    def get(self, key) -> Optional[str]:
+        item = self.table.get_item(Key={"cacheKey": key}).get("Item")
+        # TTL 삭제는 지연될 수 있으므로 만료 여부를 직접 확인
+        if not item or int(item.get("expiresAt", 0)) < time.time():
+            return None
+        return item["value"]
+
+    def set(self, key, value: str, ttl_seconds: int):
+        if len(value.encode("utf-8")) > DYNAMODB_MAX_VALUE_BYTES:
+            print(f"[LLM cache] Response too large for DynamoDB ({len(value)} chars), not cached.")
+            return
+        self.table.put_item(Item={"cacheKey": key, "value": value, "expiresAt": int(time.time() + ttl_seconds)})
+
+    def clear(self):
+        """테이블의 모든 항목 삭제 (페이지 단위 Scan + 배치 삭제). 평소에는 TTL 만료에 맡깁니다."""
+        scan_kwargs = {"ProjectionExpression": "cacheKey"}
+        deleted = 0
+        with self.table.batch_writer() as batch:
+            while True:
+                response = self.table.scan(**scan_kwargs)
+                for item in response.get("Items", []):
+                    batch.delete_item(Key={"cacheKey": item["cacheKey"]})
+                    deleted += 1
+                if "LastEvaluatedKey" not in response:
+                    break
+                scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+        print(f"[LLM cache] Cleared {deleted} DynamoDB entries.")
+
+
+# --- LangChain 캐시 ---
+class PromptHashCache(BaseCache):
+    """LangChain BaseCache 구현. 저장소 오류는 캐시 미스로 취급하고 생성은 계속합니다."""
+
+    def __init__(self, backend, ttl_seconds=LLM_CACHE_TTL_SECONDS):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Any]:
+        if _bypass_cache.get():
+            self.bypassed += 1
+            return None
+        key = make_cache_key(prompt, llm_string)
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            print(f"[LLM cache] Lookup failed ({e}), treating as miss.")
+            value = None
+        if value is None:
+            self.misses += 1
+            print(f"[LLM cache] miss {key[:12]} (hits={self.hits}, misses={self.misses})")
+            return None
+        self.hits += 1
+        print(f"[LLM cache] hit {key[:12]} (hits={self.hits}, misses={self.misses})")
+        return loads(value)
+
+    def update(self, prompt: str, llm_string: str, return_val) -> None:
+        if _bypass_cache.get():
+            return
+        try:
+            self.backend.set(make_cache_key(prompt, llm_string), dumps(return_val), self.ttl_seconds)
+        except Exception as e:
+            print(f"[LLM cache] Store failed: {e}")
+
+    def clear(self, **kwargs) -> None:
+        self.backend.clear()
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "bypassed": self.bypassed}
+
+
+def configure_llm_cache(mode=None):
+    """
+    LLM_CACHE_MODE(또는 mode 인자)에 따라 전역 LLM 캐시를 설정하고 반환합니다.
+    이미 PromptHashCache가 설정되어 있으면 그대로 재사용합니다. 'off'이면 None을 반환합니다.
+    """
+    mode = (mode or LLM_CACHE_MODE).lower()
+    current = get_llm_cache()
+    if isinstance(current, PromptHashCache):
+        return current
+    if mode == "off":
+        return None
+    try:
+        backend = DynamoDBCacheBackend() if mode == "dynamodb" else DiskCacheBackend()
+    except Exception as e:
+        print(f"[LLM cache] Could not initialize '{mode}' cache, continuing without it: {e}")
+        return None
+    cache = PromptHashCache(backend)
+    set_llm_cache(cache)
+    print(f"[LLM cache] Enabled ({mode}, ttl={cache.ttl_seconds}s)")
+    return cache
@@ -10,6 +10,9 @@ from langchain_core.runnables import RunnablePassthrough, RunnableLambda
 from langchain_google_genai import ChatGoogleGenerativeAI
 from pydantic import BaseModel
 
+# LLM_REPLAY_FILE 설정 시 녹화된 응답을 재생하는 모델로 대체 (벤치마크/오프라인 테스트용)
+from utils.replay_llm import maybe_replay_llm
+
 # 향후 AWS Bedrock 지원을 위한 준비 
 # from langchain_aws import BedrockChat
 
@@ -40,14 +43,13 @@ def get_api_key(api_key=None):
 
 def _get_thinking_model(api_key=None, temperature=0.2):
     """[내부 함수] 추론 작업에 특화된 LLM 모델을 가져옴"""
-    api_key = get_api_key(api_key)
-    return ChatGoogleGenerativeAI(
+    return maybe_replay_llm(lambda: ChatGoogleGenerativeAI(
         model="gemini-2.0-flash-thinking-exp-01-21",
-        google_api_key=api_key,
+        google_api_key=get_api_key(api_key),
         temperature=temperature,
         convert_system_message_to_human=True,
         max_output_tokens=4096
-    )
+    ))
 
 def get_llm(api_key=None, model_name="gemini-flash", temperature=0.7, model_type=None):
     """일반 용도의 표준 LLM 모델이나 특화된 모델을 가져옴
@@ -68,16 +70,13 @@ def get_llm(api_key=None, model_name="gemini-flash", temperature=0.7, model_type
     # 모델 이름 매핑 적용
     full_model_name = MODEL_NAME_MAPPING.get(model_name, model_name)
     
-    # API 키 가져오기
-    api_key = get_api_key(api_key)
-    
-    # 일반 표준 모델 설정
-    return ChatGoogleGenerativeAI(
+    # 일반 표준 모델 설정 (API 키는 실제 모델을 만들 때만 필요)
+    return maybe_replay_llm(lambda: ChatGoogleGenerativeAI(
         model=full_model_name,
-        google_api_key=api_key,
+        google_api_key=get_api_key(api_key),
         temperature=temperature,
         convert_system_message_to_human=True
-    )
+    ))
 
 def create_chain(prompt_template, model=None):
     """LCEL 파이프라인 구문을 사용하여 텍스트 생성을 위한 간단한 체인 생성
@@ -0,0 +1,179 @@
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Iterable, Optional, Tuple
+
+# 미리 생성해 둔 문제 풀. (생성기, 알고리즘 유형, 난이도)별로 검증된 문제를 목표 개수만큼 유지하고,
+# 생성 요청은 먼저 풀에서 문제를 가져간 뒤(없으면) 실시간 생성으로 넘어갑니다.
+# 가져가기는 poolStatus 속성에 대한 조건부 업데이트라서 같은 문제를 두 요청이 받는 일은 없습니다.
+#
+# 테이블 구조: 파티션 키 poolKey ("<generator>#<algorithm_type>#<difficulty>"), 정렬 키 poolItemId,
+# poolStatus (available | claimed), problem (JSON 문자열), expiresAt (TTL, 가져간 항목 정리용)
+
+PROBLEM_POOL_TABLE_NAME = os.getenv("PROBLEM_POOL_TABLE_NAME", "")
+PROBLEM_POOL_TARGET = int(os.getenv("PROBLEM_POOL_TARGET", "3"))  # 키별 목표 재고
+PROBLEM_POOL_CONCURRENCY = int(os.getenv("PROBLEM_POOL_CONCURRENCY", "2"))
+PROBLEM_POOL_MIN_INTERVAL_SECONDS = float(os.getenv("PROBLEM_POOL_MIN_INTERVAL_SECONDS", "5"))  # 생성 시작 간 최소 간격
+CLAIMED_ITEM_TTL_SECONDS = 7 * 24 * 3600
+
+STATUS_AVAILABLE = "available"
+STATUS_CLAIMED = "claimed"
+
+
+def make_pool_key(generator: str, algorithm_type: str, difficulty: str) -> str:
+    return f"{generator}#{algorithm_type}#{difficulty}"
+
+
+class ProblemPool:
+    """DynamoDB 기반 문제 풀"""
+
+    def __init__(self, table_name=PROBLEM_POOL_TABLE_NAME):
+        import boto3  # 풀을 쓰지 않는 로컬 환경에서는 불필요
+
+        if not table_name:
+            raise ValueError("PROBLEM_POOL_TABLE_NAME must be set to use the problem pool.")
+        self.table = boto3.resource("dynamodb").Table(table_name)
+        self._conditional_check_failed = self.table.meta.client.exceptions.ConditionalCheckFailedException
+
+    def available_ids(self, pool_key) -> list:
+        """가져갈 수 있는 항목의 poolItemId 목록 (키별 재고는 작으므로 필터 쿼리로 충분)"""
+        ids = []
+        query_kwargs = {
+            "KeyConditionExpression": "poolKey = :key",
+            "FilterExpression": "poolStatus = :available",
+            "ExpressionAttributeValues": {":key": pool_key, ":available": STATUS_AVAILABLE},
+            "ProjectionExpression": "poolItemId",
+        }
+        while True:
+            response = self.table.query(**query_kwargs)
+            ids.extend(item["poolItemId"] for item in response.get("Items", []))
+            if "LastEvaluatedKey" not in response:
+                return ids
+            query_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    def count_available(self, pool_key) -> int:
+        return len(self.available_ids(pool_key))
+
+    def add(self, pool_key, problem: dict) -> str:
+        pool_item_id = str(uuid.uuid4())
+        self.table.put_item(
+            Item={
+                "poolKey": pool_key,
+                "poolItemId": pool_item_id,
+                "poolStatus": STATUS_AVAILABLE,
+                "problem": json.dumps(problem, ensure_ascii=False),
+                "createdAt": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            }
+        )
+        return pool_item_id
+
+    def claim(self, pool_key, claimed_by="") -> Optional[dict]:
+        """
+        풀에서 문제 하나를 원자적으로 가져옵니다. 없으면 None.
+        후보 순서를 섞어서 동시에 들어온 요청들이 같은 항목을 두고 경합하는 일을 줄입니다.
+        """
+        candidates = self.available_ids(pool_key)
+        random.shuffle(candidates)
+        for pool_item_id in candidates:
+            try:
+                response = self.table.update_item(
+                    Key={"poolKey": pool_key, "poolItemId": pool_item_id},
+                    UpdateExpression="SET poolStatus = :claimed, claimedAt = :now, claimedBy = :by, expiresAt = :exp",
+                    ConditionExpression="poolStatus = :available",
+                    ExpressionAttributeValues={
+                        ":claimed": STATUS_CLAIMED,
+                        ":available": STATUS_AVAILABLE,
+                        ":now": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                        ":by": claimed_by or "unknown",
+                        ":exp": int(time.time() + CLAIMED_ITEM_TTL_SECONDS),
+                    },
+                    ReturnValues="ALL_NEW",
+                )
+            except self._conditional_check_failed:
+                continue  # 다른 요청이 먼저 가져감
+            print(f"[Problem pool] Claimed {pool_key} / {pool_item_id}")
+            return json.loads(response["Attributes"]["problem"])
+        print(f"[Problem pool] Empty: {pool_key}")
+        return None
+
+
+def configure_problem_pool(table_name=None) -> Optional[ProblemPool]:
+    """PROBLEM_POOL_TABLE_NAME이 설정되어 있으면 ProblemPool을, 아니면(또는 초기화 실패 시) None을 반환합니다."""
+    table_name = table_name or PROBLEM_POOL_TABLE_NAME
+    if not table_name:
+        return None
+    try:
+        return ProblemPool(table_name)
+    except Exception as e:
+        print(f"[Problem pool] Could not initialize, continuing with live generation only: {e}")
+        return None
+
+
+class RateLimiter:
+    """생성 시작 사이에 최소 간격을 두는 스레드 안전 제한기 (LLM API 요청 한도 보호)"""
+
+    def __init__(self, min_interval_seconds=PROBLEM_POOL_MIN_INTERVAL_SECONDS):
+        self.min_interval_seconds = min_interval_seconds
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start_at = max(now, self._next_start)
+            self._next_start = start_at + self.min_interval_seconds
+        if start_at > now:
+            time.sleep(start_at - now)
+
+
+def fill_pool(
+    pool: ProblemPool,
+    generator: str,
+    targets: Iterable[Tuple[str, str]],
+    generate: Callable[[str, str], Optional[dict]],
+    target_count=PROBLEM_POOL_TARGET,
+    concurrency=PROBLEM_POOL_CONCURRENCY,
+    min_interval_seconds=PROBLEM_POOL_MIN_INTERVAL_SECONDS,
+) -> dict:
+    """
+    (알고리즘 유형, 난이도)별 재고를 target_count까지 채웁니다.
+    generate(algorithm_type, difficulty)는 검증을 통과한 문제 dict를, 실패하면 None을 반환해야 합니다.
+    재고는 시작 시점에 한 번 계산하므로 필러는 한 번에 하나만 실행하는 것을 전제로 합니다.
+    """
+    jobs = []
+    for algorithm_type, difficulty in targets:
+        pool_key = make_pool_key(generator, algorithm_type, difficulty)
+        deficit = target_count - pool.count_available(pool_key)
+        if deficit > 0:
+            print(f"[Problem pool] {pool_key}: generating {deficit}")
+            jobs.extend([(pool_key, algorithm_type, difficulty)] * deficit)
+
+    stats = {"requested": len(jobs), "added": 0, "failed": 0}
+    if not jobs:
+        return stats
+    limiter = RateLimiter(min_interval_seconds)
+
+    def run_job(job):
+        pool_key, algorithm_type, difficulty = job
+        limiter.wait()
+        problem = generate(algorithm_type, difficulty)
+        if problem is None:
+            return False
+        pool.add(pool_key, problem)
+        return True
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = {executor.submit(run_job, job): job for job in jobs}
+        for future in as_completed(futures):
+            try:
+                added = future.result()
+            except Exception as e:
+                print(f"[Problem pool] Generation for {futures[future][0]} failed: {e}")
+                added = False
+            stats["added" if added else "failed"] += 1
+    print(f"[Problem pool] Fill finished: {stats}")
+    return stats
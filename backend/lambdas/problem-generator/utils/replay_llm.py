@@ -0,0 +1,224 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+# 네트워크 없이 파이프라인을 실행하기 위한 LLM 대역(stand-in).
+# ChatGoogleGenerativeAI 자리에 그대로 끼워 넣을 수 있는 LangChain 채팅 모델로, 프롬프트 해시별로
+# 녹화된 응답을 재생합니다. 첫 토큰 지연과 토큰 속도를 설정할 수 있어 실제 호출과 비슷한 타이밍으로
+# 스트리밍/비스트리밍 경로를 모두 측정할 수 있습니다.
+#   replay: 녹화 파일의 응답만 사용 (없으면 responder, 그것도 없으면 오류)
+#   record: 녹화에 없는 프롬프트는 실제 모델(delegate)을 호출하고 응답을 파일에 추가
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# 기본 설정 (환경 변수). configure_replay()로 실행 중에 바꿀 수 있음
+_replay_config = {
+    "path": os.getenv("LLM_REPLAY_FILE", ""),
+    "mode": os.getenv("LLM_REPLAY_MODE", "replay").lower(),  # replay | record
+    "latency_seconds": float(os.getenv("LLM_REPLAY_LATENCY_SECONDS", "0")),  # 첫 토큰까지의 지연
+    "tokens_per_second": float(os.getenv("LLM_REPLAY_TOKENS_PER_SECOND", "0")),  # 0이면 지연 없이 출력
+    "responder": None,  # 녹화에 없는 프롬프트용 응답 함수 responder(prompt_text) -> str
+}
+CHARS_PER_TOKEN = 4  # 토큰 수 추정용
+STREAM_CHUNK_TOKENS = 8  # 스트리밍 시 청크 하나에 담을 토큰 수
+
+_file_lock = threading.Lock()  # 녹화 파일 읽기/쓰기 보호 (모든 인스턴스 공유)
+_loaded_recordings: Dict[str, Dict[str, dict]] = {}  # 파일 경로 -> 녹화 내용 (인스턴스 간 공유)
+
+
+def prompt_text(messages: List[BaseMessage]) -> str:
+    return "\n".join(f"{message.type}: {message.content}" for message in messages)
+
+
+def recording_key(messages: List[BaseMessage]) -> str:
+    return hashlib.sha256(prompt_text(messages).encode("utf-8")).hexdigest()
+
+
+def load_recordings(path) -> Dict[str, dict]:
+    """녹화 파일 형식: {"responses": {key: {"prompt": 미리보기, "response": 응답}}}"""
+    path = str(path)
+    with _file_lock:
+        if path not in _loaded_recordings:
+            try:
+                data = json.loads(Path(path).read_text(encoding="utf-8"))
+                _loaded_recordings[path] = data.get("responses", {})
+            except FileNotFoundError:
+                _loaded_recordings[path] = {}
+        return _loaded_recordings[path]
+
+
+def _save_recordings(path, responses):
+    target = Path(path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = target.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps({"responses": responses}, ensure_ascii=False, indent=1), encoding="utf-8")
+    os.replace(tmp_path, target)
+
+
+class ReplayChatModel(BaseChatModel):
+    """녹화된 응답을 재생하는 채팅 모델 (bind(generation_config=...) 등 추가 인자는 무시)"""
+
+    recordings_path: str = ""
+    mode: str = "replay"
+    latency_seconds: float = 0.0
+    tokens_per_second: float = 0.0
+    responder: Optional[Callable[[str], str]] = None
+    delegate: Optional[Any] = None  # record 모드에서 호출할 실제 모델
+    stats: Dict[str, float] = {}
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = {"calls": 0, "recorded": 0, "synthetic": 0, "simulated_seconds": 0.0, "output_tokens": 0}
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"recordings_path": self.recordings_path, "mode": self.mode}
+
+    # --- 응답 찾기 ---
+    def _lookup(self, messages) -> Optional[str]:
+        if not self.recordings_path:
+            return None
+        entry = load_recordings(self.recordings_path).get(recording_key(messages))
+        return entry["response"] if entry else None
+
+    def _store(self, messages, response: str):
+        if not self.recordings_path:
+            return
+        responses = load_recordings(self.recordings_path)
+        with _file_lock:
+            responses[recording_key(messages)] = {"prompt": prompt_text(messages)[:300], "response": response}
+            _save_recordings(self.recordings_path, responses)
+        self.stats["recorded"] += 1
+
+    def _fallback(self, messages) -> str:
+        if self.responder is None:
+            raise KeyError(
+                f"No recorded response for prompt {recording_key(messages)[:12]} in '{self.recordings_path}'. "
+                "Record it first (LLM_REPLAY_MODE=record) or configure a responder."
+            )
+        self.stats["synthetic"] += 1
+        return self.responder(prompt_text(messages))
+
+    def _response_for(self, messages, stop=None, **kwargs) -> str:
+        response = self._lookup(messages)
+        if response is not None:
+            return response
+        if self.mode == "record" and self.delegate is not None:
+            result = self.delegate.invoke(messages, stop=stop, **kwargs)
+            response = result.content if hasattr(result, "content") else str(result)
+            self._store(messages, response)
+            return response
+        return self._fallback(messages)
+
+    async def _aresponse_for(self, messages, stop=None, **kwargs) -> str:
+        response = self._lookup(messages)
+        if response is not None:
+            return response
+        if self.mode == "record" and self.delegate is not None:
+            result = await self.delegate.ainvoke(messages, stop=stop, **kwargs)
+            response = result.content if hasattr(result, "content") else str(result)
+            self._store(messages, response)
+            return response
+        return self._fallback(messages)
+
+    # --- 타이밍 ---
+    def _chunks(self, text: str) -> List[str]:
+        size = CHARS_PER_TOKEN * STREAM_CHUNK_TOKENS
+        return [text[i : i + size] for i in range(0, len(text), size)] or [""]
+
+    def _chunk_delay(self, chunk: str) -> float:
+        if self.tokens_per_second <= 0:
+            return 0.0
+        return (len(chunk) / CHARS_PER_TOKEN) / self.tokens_per_second
+
+    def _usage(self, messages, text: str) -> Dict[str, int]:
+        """실제 모델처럼 응답 메타데이터에 추정 토큰 사용량을 담음 (generation_metrics용)"""
+        input_tokens = len(prompt_text(messages)) // CHARS_PER_TOKEN
+        output_tokens = len(text) // CHARS_PER_TOKEN
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+
+    def _account(self, text: str):
+        self.stats["calls"] += 1
+        self.stats["output_tokens"] += len(text) // CHARS_PER_TOKEN
+        self.stats["simulated_seconds"] += self.latency_seconds + sum(self._chunk_delay(c) for c in self._chunks(text))
+
+    # --- BaseChatModel 구현 ---
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        text = self._response_for(messages, stop, **kwargs)
+        self._account(text)
+        time.sleep(self.latency_seconds + sum(self._chunk_delay(c) for c in self._chunks(text)))
+        message = AIMessage(content=text, usage_metadata=self._usage(messages, text))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        text = await self._aresponse_for(messages, stop, **kwargs)
+        self._account(text)
+        await asyncio.sleep(self.latency_seconds + sum(self._chunk_delay(c) for c in self._chunks(text)))
+        message = AIMessage(content=text, usage_metadata=self._usage(messages, text))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        text = self._response_for(messages, stop, **kwargs)
+        self._account(text)
+        time.sleep(self.latency_seconds)
+        pieces = self._chunks(text)
+        for index, piece in enumerate(pieces):
+            time.sleep(self._chunk_delay(piece))
+            usage = self._usage(messages, text) if index == len(pieces) - 1 else None
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=piece, usage_metadata=usage))
+            if run_manager:
+                run_manager.on_llm_new_token(piece, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        text = await self._aresponse_for(messages, stop, **kwargs)
+        self._account(text)
+        await asyncio.sleep(self.latency_seconds)
+        pieces = self._chunks(text)
+        for index, piece in enumerate(pieces):
+            await asyncio.sleep(self._chunk_delay(piece))
+            usage = self._usage(messages, text) if index == len(pieces) - 1 else None
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=piece, usage_metadata=usage))
+            if run_manager:
+                await run_manager.on_llm_new_token(piece, chunk=chunk)
+            yield chunk
+
+
+def configure_replay(**overrides):
+    """재생 설정 변경 (path, mode, latency_seconds, tokens_per_second, responder). 이후 생성되는 모델에 적용"""
+    unknown = set(overrides) - set(_replay_config)
+    if unknown:
+        raise ValueError(f"Unknown replay settings: {sorted(unknown)}")
+    _replay_config.update(overrides)
+
+
+def replay_enabled() -> bool:
+    return bool(_replay_config["path"] or _replay_config["responder"])
+
+
+def maybe_replay_llm(create_llm: Callable[[], Any]):
+    """
+    재생이 설정되지 않았으면 create_llm()의 실제 모델을 그대로 반환합니다.
+    설정되어 있으면 ReplayChatModel을 반환합니다 (record 모드에서만 실제 모델을 만들어 delegate로 사용).
+    """
+    if not replay_enabled():
+        return create_llm()
+    config = dict(_replay_config)
+    return ReplayChatModel(
+        recordings_path=config["path"],
+        mode=config["mode"],
+        latency_seconds=config["latency_seconds"],
+        tokens_per_second=config["tokens_per_second"],
+        responder=config["responder"],
+        delegate=create_llm() if config["mode"] == "record" else None,
+    )
@@ -0,0 +1,119 @@
+import asyncio
+import inspect
+import os
+import time
+from typing import Any, Callable, Dict, List
+
+# 응답 스트림 전송기: 토큰 단위 청크를 크기/시간 창 기준으로 모아 한 프레임(token 메시지 하나)으로
+# 보내고, 고정된 sleep 대신 응답 스트림 자체의 배압(drain/flush)을 기다립니다.
+# 전송한 프레임 수와 바이트 수를 집계해 stats()로 보고합니다.
+
+# 토큰 프레임 하나에 모을 최대 바이트 수 / 최대 대기 시간
+STREAM_FRAME_BYTES = int(os.getenv("STREAM_FRAME_BYTES", "512"))
+STREAM_FRAME_INTERVAL_SECONDS = float(os.getenv("STREAM_FRAME_INTERVAL_SECONDS", "0.05"))
+# 마지막 drain 이후 이만큼 쓰면 스트림이 비워질 때까지 기다림 (배압)
+STREAM_HIGH_WATER_BYTES = int(os.getenv("STREAM_HIGH_WATER_BYTES", "16384"))
+
+
+def _elapsed_ms(start):
+    return int((time.perf_counter() - start) * 1000)
+
+
+class StreamWriter:
+    """format_message(종류, 페이로드)로 만든 메시지를 response_stream에 쓰는 전송기"""
+
+    def __init__(
+        self,
+        response_stream,
+        format_message: Callable[[str, Any], str],
+        frame_bytes: int = STREAM_FRAME_BYTES,
+        frame_interval: float = STREAM_FRAME_INTERVAL_SECONDS,
+        high_water_bytes: int = STREAM_HIGH_WATER_BYTES,
+    ):
+        self.response_stream = response_stream
+        self.format_message = format_message
+        self.frame_bytes = frame_bytes
+        self.frame_interval = frame_interval
+        self.high_water_bytes = high_water_bytes
+        self.bytes_sent = 0
+        self.frames_sent = 0
+        self.tokens_in = 0
+        self.drain_ms = 0
+        self._tokens: List[str] = []
+        self._token_bytes = 0
+        self._frame_started = None  # 모으고 있는 토큰 프레임의 첫 토큰 시각
+        self._undrained_bytes = 0
+
+    def send(self, msg_type: str, payload: Any):
+        """메시지 하나를 바로 씁니다 (모아 둔 토큰을 먼저 내보내 순서 유지)."""
+        self.flush_tokens()
+        self._write(msg_type, payload)
+
+    async def send_and_drain(self, msg_type: str, payload: Any):
+        """상태 메시지처럼 클라이언트에 곧바로 보여야 하는 메시지: 쓰고 스트림이 비워질 때까지 대기"""
+        self.send(msg_type, payload)
+        await self.drain(force=True)
+
+    async def add_token(self, text: str):
+        """토큰 청크를 모으고, 크기/시간 창을 넘으면 프레임으로 내보냅니다."""
+        if not text:
+            return
+        self.tokens_in += 1
+        if self._frame_started is None:
+            self._frame_started = time.perf_counter()
+        self._tokens.append(text)
+        self._token_bytes += len(text.encode("utf-8"))
+        if self._token_bytes >= self.frame_bytes or time.perf_counter() - self._frame_started >= self.frame_interval:
+            self.flush_tokens()
+            await self.drain()
+
+    def flush_tokens(self):
+        if not self._tokens:
+            return
+        text = "".join(self._tokens)
+        self._tokens = []
+        self._token_bytes = 0
+        self._frame_started = None
+        self._write("token", text)
+
+    async def drain(self, force: bool = False):
+        """
+        쓴 데이터가 high water를 넘었거나 force이면 응답 스트림이 받아 갈 때까지 기다립니다.
+        drain()이 있으면 그것을, 없으면 flush()를 별도 스레드에서 호출합니다 (막혀 있는 동안에도
+        LLM 스트림을 계속 읽도록). 그 외에는 이벤트 루프에 한 번 양보만 합니다.
+        """
+        if not force and self._undrained_bytes < self.high_water_bytes:
+            return
+        self._undrained_bytes = 0
+        start = time.perf_counter()
+        drain = getattr(self.response_stream, "drain", None)
+        flush = getattr(self.response_stream, "flush", None)
+        if drain is not None:
+            result = drain()
+            if inspect.isawaitable(result):
+                await result
+        elif flush is not None:
+            await asyncio.to_thread(flush)
+        else:
+            await asyncio.sleep(0)
+        self.drain_ms += _elapsed_ms(start)
+
+    async def close(self):
+        """남은 토큰을 내보내고 스트림을 비웁니다 (스트림을 닫지는 않음)."""
+        self.flush_tokens()
+        await self.drain(force=True)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "bytes": self.bytes_sent,
+            "frames": self.frames_sent,
+            "tokens": self.tokens_in,
+            "drainMs": self.drain_ms,
+        }
+
+    def _write(self, msg_type, payload):
+        data = self.format_message(msg_type, payload).encode("utf-8")
+        self.response_stream.write(data)
+        self.bytes_sent += len(data)
+        self.frames_sent += 1
+        self._undrained_bytes += len(data)
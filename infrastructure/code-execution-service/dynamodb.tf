@@ -1,6 +1,7 @@
 locals {
   # submissions_table_name을 var에서 오버라이드 받거나 기본값 사용
   submissions_table_actual_name = var.submissions_table_name_override != "" ? var.submissions_table_name_override : "${var.project_name}-Submissions-${var.environment}"
+  stats_table_actual_name       = "${var.project_name}-SubmissionStats-${var.environment}"
 }
 
 resource "aws_dynamodb_table" "submissions_table" {
@@ -85,3 +86,17 @@ resource "aws_dynamodb_table" "submissions_table" {
 
   tags = var.common_tags
 }
+
+# 문제별 / 사용자별 제출 통계 (PROBLEM#<problemId>, USER#<userId>)
+resource "aws_dynamodb_table" "submission_stats_table" {
+  name         = local.stats_table_actual_name
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "statsId"
+
+  attribute {
+    name = "statsId"
+    type = "S"
+  }
+
+  tags = var.common_tags
+}
@@ -60,6 +60,14 @@ resource "aws_iam_policy" "code_grader_permissions_policy" {
           aws_dynamodb_table.submissions_table.arn # 여기서 생성할 테이블
         ]
       },
+      {
+        Sid    = "DynamoDBSubmissionStatsAccess"
+        Effect = "Allow"
+        Action = ["dynamodb:GetItem", "dynamodb:UpdateItem"]
+        Resource = [
+          aws_dynamodb_table.submission_stats_table.arn
+        ]
+      },
       {
         Sid    = "LambdaInvokeCodeExecutor"
         Effect = "Allow"
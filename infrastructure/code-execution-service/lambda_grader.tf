@@ -20,12 +20,17 @@ resource "aws_lambda_function" "code_grader" {
       PROBLEMS_TABLE_NAME    = local.problems_table_name_from_remote           # data.tf 에서 가져옴
       SUBMISSIONS_TABLE_NAME = aws_dynamodb_table.submissions_table.name       # 여기서 생성
       RUN_CODE_LAMBDA_NAME   = aws_lambda_function.code_executor.function_name # 의존성 주입!
+      STATS_TABLE_NAME       = aws_dynamodb_table.submission_stats_table.name
+      STATS_UPDATE_MODE      = "inline"
+      # minimize_tests.py 결과 사용 방식: reorder | early_exit | off
+      TEST_CASE_MINIMIZATION_MODE = "off"
       # PYTHONIOENCODING    = "utf-8" # Lambda Python 환경에서는 기본값으로 불필요할 수 있음
     }
   }
   tags = var.common_tags
   depends_on = [
     aws_lambda_function.code_executor,
-    aws_dynamodb_table.submissions_table
+    aws_dynamodb_table.submissions_table,
+    aws_dynamodb_table.submission_stats_table
   ]
 }
@@ -27,3 +27,8 @@ output "submissions_table_arn_output" {
   description = "The ARN of the DynamoDB table for storing submissions"
   value       = aws_dynamodb_table.submissions_table.arn
 }
+
+output "submission_stats_table_name_output" {
+  description = "The name of the DynamoDB table for aggregated submission statistics"
+  value       = aws_dynamodb_table.submission_stats_table.name
+}
@@ -14,6 +14,16 @@ resource "aws_dynamodb_table" "problems_table" {
     type = "S"
   }
 
+  attribute {
+    name = "promptKey"
+    type = "S"
+  }
+
+  attribute {
+    name = "createdAt"
+    type = "S"
+  }
+
   global_secondary_index {
     name               = "CreatorIdIndex"
     hash_key           = "creatorId"
@@ -22,5 +32,16 @@ resource "aws_dynamodb_table" "problems_table" {
     write_capacity     = 0
   }
 
+  # Exact prompt reuse: normalized prompt + difficulty (not set on pool problems), newest first
+  global_secondary_index {
+    name               = "PromptKeyIndex"
+    hash_key           = "promptKey"
+    range_key          = "createdAt"
+    projection_type    = "INCLUDE"
+    non_key_attributes = ["generationStatus"]
+    read_capacity      = 0
+    write_capacity     = 0
+  }
+
   tags = var.common_tags
 } 
\ No newline at end of file
@@ -75,7 +75,8 @@ resource "aws_iam_policy" "problems_dynamodb_policy" {
           "dynamodb:TransactWriteItems"
         ]
         Resource = [
-          aws_dynamodb_table.problems_table.arn
+          aws_dynamodb_table.problems_table.arn,
+          "${aws_dynamodb_table.problems_table.arn}/index/*"
         ]
       }
     ]